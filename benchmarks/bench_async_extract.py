@@ -0,0 +1,64 @@
+"""
+Measures `aextract_metadata` for a burst of concurrent uploads per executor size and
+concurrency limit: the throughput, and the worst delay of a timer ticking on the event
+loop meanwhile (how long other requests would have to wait).
+
+    python benchmarks/bench_async_extract.py [number of files]
+"""
+
+import asyncio
+import io
+import logging
+import sys
+import time
+
+from utils import setup_django
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from django.test import override_settings  # noqa: E402
+from fixtures import DENSE_IPTC_FIELDS, make_jpeg  # noqa: E402
+
+from wagtailimagecaptions.async_services import aextract_metadata  # noqa: E402
+
+# (workers, concurrency)
+LIMITS = ((1, 1), (2, 4), (4, 8), (8, 16), (8, 1000))
+TICK = 0.001
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        worst = max(worst, time.perf_counter() - start - TICK)
+    return worst
+
+
+async def burst(data: bytes, count: int) -> tuple:
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(ticker(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(aextract_metadata(io.BytesIO(data)) for _ in range(count)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    return seconds, await lag
+
+
+def main(count: int = 2000):
+    data = make_jpeg(640, 480, iptc_fields=DENSE_IPTC_FIELDS)
+    print(f"{count} files of {len(data)} bytes.")
+    print(f"{'workers':>7} {'limit':>6} {'files/s':>9} {'max lag ms':>11}")
+
+    for workers, concurrency in LIMITS:
+        with override_settings(
+            WAGTIALIMAGECAPTIONS_ASYNC_WORKERS=workers, WAGTIALIMAGECAPTIONS_ASYNC_CONCURRENCY=concurrency
+        ):
+            seconds, lag = asyncio.run(burst(data, count))
+        print(f"{workers:>7} {concurrency:>6} {count / seconds:>9.0f} {lag * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,68 @@
+"""
+Compares loading a page of 100 images, as the Wagtail image chooser does, with the meta
+data JSON fields deferred (the default manager) against loading them as well. Runs
+against a throw-away test database and media directory.
+
+    python benchmarks/bench_chooser_page.py
+"""
+
+import io
+import logging
+import tempfile
+
+from utils import setup_django, timeit
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from django.core.files.images import ImageFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from fixtures import DENSE_IPTC_FIELDS, make_jpeg  # noqa: E402
+from wagtail.images import get_image_model  # noqa: E402
+
+PAGE_SIZE = 100
+
+
+def payload_size(queryset) -> int:
+    """
+    Returns the number of bytes of text and binary values in the rows of a query.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return sum(len(value) for row in rows for value in row if isinstance(value, (str, bytes)))
+
+
+def render_page(queryset):
+    # What the chooser uses of each image.
+    for image in queryset:
+        image.title, image.file.name, image.width, image.height
+
+
+def main():
+    ImageModel = get_image_model()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            data = make_jpeg(320, 240, iptc_fields=DENSE_IPTC_FIELDS)
+            for i in range(PAGE_SIZE):
+                ImageModel(title=f"Image {i}", file=ImageFile(io.BytesIO(data), name=f"{i}.jpg")).save()
+
+            variants = {
+                "with_metadata()": lambda: ImageModel.objects.with_metadata().order_by("-created_at")[:PAGE_SIZE],
+                "deferred (default)": lambda: ImageModel.objects.order_by("-created_at")[:PAGE_SIZE],
+            }
+
+            print(f"{'variant':<20} {'payload bytes':>14} {'ms/page':>9}")
+            for name, queryset in variants.items():
+                ms = timeit(lambda: render_page(queryset()), repeat=50)
+                print(f"{name:<20} {payload_size(queryset()):>14} {ms:>9.3f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measures the throughput of converting raw EXIF values with the per-tag converters, one
+dict at a time (`convert_exif_values`) and in bulk (`convert_exif_batch`), against the
+previous implementation with a single `try` around all conversions.
+
+    python benchmarks/bench_exif_converters.py [number of dicts]
+"""
+
+import datetime
+import logging
+import random
+import sys
+import time
+from fractions import Fraction
+
+from utils import setup_django
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from PIL.TiffImagePlugin import IFDRational  # noqa: E402
+
+from wagtailimagecaptions import services  # noqa: E402
+
+
+def make_exif_dicts(count: int) -> list:
+    """
+    Returns raw EXIF dicts with the value distribution of a photo archive: a few cameras,
+    apertures and exposure settings, and distinct timestamps.
+    """
+    rng = random.Random(0)
+    start = datetime.datetime(2020, 1, 1)
+    dicts = []
+    for _ in range(count):
+        taken = (start + datetime.timedelta(seconds=rng.randrange(10**8))).strftime(services.EXIF_DATE_FORMAT)
+        dicts.append(
+            {
+                "DateTime": taken,
+                "DateTimeOriginal": taken,
+                "DateTimeDigitized": taken,
+                "FNumber": IFDRational(rng.choice((14, 18, 20, 28, 40, 56, 80)), 10),
+                "MaxApertureValue": IFDRational(rng.choice((297, 400)), 100),
+                "FocalLength": IFDRational(rng.choice((23, 35, 50, 85, 200)), 1),
+                "FocalLengthIn35mmFilm": rng.choice((35, 50, 85)),
+                "Orientation": rng.choice((1, 1, 1, 6, 8)),
+                "ResolutionUnit": 2,
+                "ExposureProgram": rng.choice((1, 2, 3)),
+                "MeteringMode": rng.choice((2, 5)),
+                "XResolution": IFDRational(72, 1),
+                "YResolution": IFDRational(72, 1),
+                "ExposureTime": IFDRational(1, rng.choice((30, 60, 125, 250, 500, 1000))),
+                "ExposureBiasValue": IFDRational(rng.choice((-10, 0, 0, 3, 7)), 10),
+            }
+        )
+    return dicts
+
+
+def legacy_process_exif_dict(exif_dict, date_format="%Y:%m:%d %H:%M:%S"):
+    lookups = services.LOOKUPS
+    derationalize = services._derationalize
+    try:
+        exif_dict["DateTime"] = datetime.datetime.strptime(exif_dict["DateTime"], date_format)
+        exif_dict["DateTimeOriginal"] = datetime.datetime.strptime(exif_dict["DateTimeOriginal"], date_format)
+        exif_dict["DateTimeDigitized"] = datetime.datetime.strptime(exif_dict["DateTimeDigitized"], date_format)
+        exif_dict["FNumber"] = "f{}".format(derationalize(exif_dict["FNumber"]))
+        exif_dict["MaxApertureValue"] = "f{:2.1f}".format(derationalize(exif_dict["MaxApertureValue"]))
+        exif_dict["FocalLength"] = "{}mm".format(derationalize(exif_dict["FocalLength"]))
+        exif_dict["FocalLengthIn35mmFilm"] = "{}mm".format(exif_dict["FocalLengthIn35mmFilm"])
+        exif_dict["Orientation"] = lookups["orientations"][exif_dict["Orientation"]]
+        exif_dict["ResolutionUnit"] = lookups["resolution_units"][exif_dict["ResolutionUnit"]]
+        exif_dict["ExposureProgram"] = lookups["exposure_programs"][exif_dict["ExposureProgram"]]
+        exif_dict["MeteringMode"] = lookups["metering_modes"][exif_dict["MeteringMode"]]
+        exif_dict["XResolution"] = int(derationalize(exif_dict["XResolution"]))
+        exif_dict["YResolution"] = int(derationalize(exif_dict["YResolution"]))
+        exif_dict["ExposureTime"] = str(Fraction(derationalize(exif_dict["ExposureTime"])).limit_denominator(8000))
+        exif_dict["ExposureBiasValue"] = "{} EV".format(derationalize(exif_dict["ExposureBiasValue"]))
+    except (KeyError, TypeError):
+        pass
+    return exif_dict
+
+
+def main(count: int = 20000):
+    variants = {
+        "legacy single try": lambda dicts: [legacy_process_exif_dict(d) for d in dicts],
+        "per dict": lambda dicts: [services.convert_exif_values(d) for d in dicts],
+        "batch": services.convert_exif_batch,
+    }
+
+    expected = None
+    print(f"{'variant':<18} {'dicts/s':>10}")
+    for name, convert in variants.items():
+        dicts = make_exif_dicts(count)
+        start = time.perf_counter()
+        convert(dicts)
+        seconds = time.perf_counter() - start
+        print(f"{name:<18} {count / seconds:>10.0f}")
+
+        # All variants convert the complete dicts alike.
+        expected = expected or dicts
+        assert dicts == expected
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
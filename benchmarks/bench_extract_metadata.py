@@ -0,0 +1,62 @@
+"""
+Compares reading the IPTC and EXIF data of an upload with `parse_iptc` + `parse_exif`
+against the single pass `extract_metadata`.
+
+    python benchmarks/bench_extract_metadata.py
+"""
+
+import logging
+
+from utils import CountingFile, setup_django, timeit
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from fixtures import make_jpeg  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+
+from wagtailimagecaptions import services  # noqa: E402
+
+
+def separate(data):
+    f = CountingFile(data)
+    services.parse_iptc(f)
+    services.parse_exif(f)
+    return f
+
+
+def single_pass(data):
+    f = CountingFile(data)
+    services.extract_metadata(f)
+    return f
+
+
+def count_opens(func, data):
+    opens = 0
+    original_open = PILImage.open
+
+    def counting_open(*args, **kwargs):
+        nonlocal opens
+        opens += 1
+        return original_open(*args, **kwargs)
+
+    services.PILImage.open = counting_open
+    try:
+        f = func(data)
+    finally:
+        services.PILImage.open = original_open
+    return opens, f
+
+
+def main():
+    data = make_jpeg()
+    print(f"{'variant':<12} {'opens':>6} {'reads':>6} {'bytes read':>11} {'ms/image':>9}")
+    for name, func in (("separate", separate), ("single pass", single_pass)):
+        opens, f = count_opens(func, data)
+        ms = timeit(lambda: func(data))
+        print(f"{name:<12} {opens:>6} {f.reads:>6} {f.bytes_read:>11} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Times bounding box and radius queries on located images: scanning every row and
+computing the distance, against `near()` and `within_bbox()`, which select candidates on
+the (latitude, longitude) index first, and geohash prefix lookups. Runs against a
+throw-away test database, filled with (by default) a million images.
+
+    python benchmarks/bench_geo_queries.py [rows]
+
+Creating the million images takes several minutes.
+"""
+
+import logging
+import random
+import sys
+import time
+
+from utils import setup_django
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from django.db import connection  # noqa: E402
+from wagtail.images import get_image_model  # noqa: E402
+from wagtail.models import Collection  # noqa: E402
+
+from wagtailimagecaptions.geo import encode_geohash  # noqa: E402
+from wagtailimagecaptions.importer import bulk_create_images  # noqa: E402
+
+# Photos cluster around cities, plus a uniform scattering worldwide.
+CITIES = [(38.9072, -77.0369), (40.7128, -74.0060), (51.5072, -0.1276), (35.6762, 139.6503), (-33.8688, 151.2093)]
+
+QUERY_POINT = (38.9072, -77.0369)
+RADIUS_KM = 5
+BATCH_SIZE = 10000
+
+
+def random_location(rng: random.Random) -> tuple:
+    if rng.random() < 0.2:
+        return rng.uniform(-80, 80), rng.uniform(-180, 180)
+    latitude, longitude = rng.choice(CITIES)
+    return latitude + rng.gauss(0, 0.5), longitude + rng.gauss(0, 0.5)
+
+
+def populate(rows: int):
+    ImageModel = get_image_model()
+    collection = Collection.get_first_root_node()
+    rng = random.Random(42)
+
+    for start in range(0, rows, BATCH_SIZE):
+        images = []
+        for i in range(start, min(rows, start + BATCH_SIZE)):
+            latitude, longitude = random_location(rng)
+            images.append(
+                ImageModel(
+                    title=f"Image {i}",
+                    file=f"original_images/{i}.jpg",
+                    width=1,
+                    height=1,
+                    collection=collection,
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=encode_geohash(latitude, longitude),
+                )
+            )
+        bulk_create_images(images, batch_size=1000)
+
+
+def measure(queryset, repeat: int = 5) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(list(queryset.values_list("pk", flat=True)))
+        timings.append((time.perf_counter() - start) * 1000)
+    return count, min(timings)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        start = time.perf_counter()
+        populate(rows)
+        print(f"Created {rows} images in {time.perf_counter() - start:.1f} s on {connection.vendor}.\n")
+
+        images = get_image_model().objects
+        latitude, longitude = QUERY_POINT
+        queries = {
+            "radius, full scan": images.with_distance(latitude, longitude).filter(distance__lte=RADIUS_KM),
+            "radius, near()": images.near(latitude, longitude, RADIUS_KM),
+            "bbox, within_bbox()": images.within_bbox(38.8, -77.2, 39.0, -76.9),
+            "geohash cell (~5 km)": images.in_geohash(encode_geohash(latitude, longitude, 5)),
+        }
+
+        print(f"{'query':<22} {'rows':>8} {'ms':>10}")
+        for name, queryset in queries.items():
+            count, ms = measure(queryset)
+            print(f"{name:<22} {count:>8} {ms:>10.2f}")
+
+        print("\nQuery plan of near():")
+        print(queries["radius, near()"].explain())
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
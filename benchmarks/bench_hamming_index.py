@@ -0,0 +1,48 @@
+"""
+Compares finding near-duplicates among random 64 bit perceptual hashes by brute force (a
+vectorised scan of all hashes per query) against `HammingIndex`, and times finding all
+pairs with `HammingIndex.pairs`.
+
+    python benchmarks/bench_hamming_index.py [number of hashes]
+"""
+
+import sys
+import time
+
+import numpy as np
+from utils import setup_django, timeit
+
+setup_django()
+
+from wagtailimagecaptions.perceptual import HammingIndex  # noqa: E402
+
+THRESHOLDS = (4, 6, 10)
+
+
+def main(size: int = 1_000_000):
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(-(2**63), 2**63 - 1, size=size, dtype=np.int64)
+    queries = [int(value) for value in hashes[:100]]
+
+    start = time.perf_counter()
+    index = HammingIndex(hashes)
+    print(f"Indexed {size} hashes in {time.perf_counter() - start:.2f}s.")
+
+    unsigned = hashes.view(np.uint64)
+    print(f"{'threshold':>9} {'brute ms/query':>15} {'index ms/query':>15} {'all pairs s':>12}")
+    for threshold in THRESHOLDS:
+        brute = timeit(
+            lambda: [
+                np.flatnonzero(np.bitwise_count(unsigned ^ np.uint64(q & (2**64 - 1))) <= threshold) for q in queries
+            ],
+            repeat=1,
+        )
+        indexed = timeit(lambda: [index.query(q, threshold) for q in queries], repeat=1)
+        start = time.perf_counter()
+        index.pairs(threshold)
+        pairs_s = time.perf_counter() - start
+        print(f"{threshold:>9} {brute / len(queries):>15.3f} {indexed / len(queries):>15.3f} {pairs_s:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
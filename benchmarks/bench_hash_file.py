@@ -0,0 +1,60 @@
+"""
+Compares the peak memory and time of hashing large originals in one read, as
+`imagefile_to_model` used to, against the chunked `hash_file`.
+
+    python benchmarks/bench_hash_file.py [size in MiB ...]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from utils import setup_django
+
+setup_django()
+
+from wagtailimagecaptions.services import hash_file  # noqa: E402
+
+
+def read_all(f):
+    return hashlib.sha1(f.read()).hexdigest()
+
+
+def chunked(f):
+    return hash_file(f)
+
+
+def measure(func, path):
+    with open(path, "rb") as f:
+        tracemalloc.start()
+        start = time.perf_counter()
+        digest = func(f)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return digest, peak, elapsed
+
+
+def main(sizes):
+    print(f"{'MiB':>6} {'variant':<10} {'peak MiB':>9} {'seconds':>8}")
+    for size in sizes:
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size):
+                tmp.write(block)
+        try:
+            digests = set()
+            for name, func in (("read all", read_all), ("chunked", chunked)):
+                digest, peak, elapsed = measure(func, tmp.name)
+                digests.add(digest)
+                print(f"{size:>6} {name:<10} {peak / 1024 / 1024:>9.2f} {elapsed:>8.3f}")
+            assert len(digests) == 1, "Digests differ"
+        finally:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [64, 256])
@@ -0,0 +1,163 @@
+"""
+Measures the per-image CPU time and allocations of converting raw EXIF tags with
+`_exif_to_dict`, against the implementation which walked all of `PIL.ExifTags.TAGS`.
+
+    python benchmarks/bench_parse_exif.py [directory of camera JPEGs]
+
+Without a directory, synthetic fixtures are used.
+"""
+
+import datetime
+import io
+import logging
+import os
+import sys
+import tracemalloc
+from fractions import Fraction
+
+from utils import setup_django, timeit
+
+setup_django()
+
+logging.disable(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+import PIL.ExifTags  # noqa: E402
+from fixtures import make_jpeg  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+from PIL.TiffImagePlugin import IFDRational  # noqa: E402
+
+from wagtailimagecaptions import services  # noqa: E402
+
+
+def legacy_exif_to_dict(exif_data_PIL):
+    def clean_up_exif_dict(exif_dict: dict) -> dict:
+        def cast(v):
+            if isinstance(v, IFDRational):
+                return float(v)
+            elif isinstance(v, str):
+                return v.rstrip("\x00")
+            elif isinstance(v, tuple):
+                return tuple(cast(t) for t in v)
+            elif isinstance(v, bytes):
+                return v.decode(errors="replace").rstrip("\x00")
+            elif isinstance(v, dict):
+                for kk, vv in v.items():
+                    v[kk] = cast(vv)
+                return v
+            return v
+
+        return {k: cast(v.get("processed")) for k, v in exif_dict.items() if v.get("processed")}
+
+    def get_lat_lon(exif_info):
+        "Credit/source: https://gist.github.com/maxbellec/dbb60d136565e3c4b805931f5aad2c6d"
+
+        def convert_to_degrees(value):
+            d = float(value[0])
+            m = float(value[1])
+            s = float(value[2])
+            return d + (m / 60.0) + (s / 3600.0)
+
+        try:
+            gps_latitude = exif_info[34853][2]
+            gps_latitude_ref = exif_info[34853][1]
+            gps_longitude = exif_info[34853][4]
+            gps_longitude_ref = exif_info[34853][3]
+            lat = convert_to_degrees(gps_latitude)
+            if gps_latitude_ref != "N":
+                lat *= -1
+
+            lon = convert_to_degrees(gps_longitude)
+            if gps_longitude_ref != "E":
+                lon *= -1
+            return lat, lon
+        except KeyError:
+            return None, None
+
+    try:
+        if not exif_data_PIL:
+            return {}
+
+        tags = {**PIL.ExifTags.TAGS}
+        exif_data = {}
+
+        for k, v in tags.items():
+            value = k in exif_data_PIL and exif_data_PIL[k]
+            if len(str(value)) > 64:
+                value = str(value)[:65] + "..."
+            exif_data[v] = {"tag": k, "raw": value, "processed": value}
+
+        lat, lon = get_lat_lon(exif_data_PIL)
+        exif_data.update({"latitude": {"processed": lat}, "longitude": {"processed": lon}})
+        exif_data = legacy_process_exif_dict(exif_data)
+        return clean_up_exif_dict(exif_data)
+    except IOError as ioe:
+        raise ioe
+
+
+def legacy_process_exif_dict(exif_dict, date_format="%Y:%m:%d %H:%M:%S"):
+    lookups = services._create_lookups()
+
+    try:
+        exif_dict["DateTime"]["processed"] = datetime.datetime.strptime(exif_dict["DateTime"]["raw"], date_format)
+        exif_dict["DateTimeOriginal"]["processed"] = datetime.datetime.strptime(
+            exif_dict["DateTimeOriginal"]["raw"], date_format
+        )
+        exif_dict["DateTimeDigitized"]["processed"] = datetime.datetime.strptime(
+            exif_dict["DateTimeDigitized"]["raw"], date_format
+        )
+        exif_dict["FNumber"]["processed"] = services._derationalize(exif_dict["FNumber"]["raw"])
+        exif_dict["FNumber"]["processed"] = "f{}".format(exif_dict["FNumber"]["processed"])
+        exif_dict["MaxApertureValue"]["processed"] = services._derationalize(exif_dict["MaxApertureValue"]["raw"])
+        exif_dict["MaxApertureValue"]["processed"] = "f{:2.1f}".format(exif_dict["MaxApertureValue"]["processed"])
+        exif_dict["FocalLength"]["processed"] = services._derationalize(exif_dict["FocalLength"]["raw"])
+        exif_dict["FocalLength"]["processed"] = "{}mm".format(exif_dict["FocalLength"]["processed"])
+        exif_dict["FocalLengthIn35mmFilm"]["processed"] = "{}mm".format(exif_dict["FocalLengthIn35mmFilm"]["raw"])
+        exif_dict["Orientation"]["processed"] = lookups["orientations"][exif_dict["Orientation"]["raw"]]
+        exif_dict["ResolutionUnit"]["processed"] = lookups["resolution_units"][exif_dict["ResolutionUnit"]["raw"]]
+        exif_dict["ExposureProgram"]["processed"] = lookups["exposure_programs"][exif_dict["ExposureProgram"]["raw"]]
+        exif_dict["MeteringMode"]["processed"] = lookups["metering_modes"][exif_dict["MeteringMode"]["raw"]]
+        exif_dict["XResolution"]["processed"] = int(services._derationalize(exif_dict["XResolution"]["raw"]))
+        exif_dict["YResolution"]["processed"] = int(services._derationalize(exif_dict["YResolution"]["raw"]))
+        exif_dict["ExposureTime"]["processed"] = services._derationalize(exif_dict["ExposureTime"]["raw"])
+        exif_dict["ExposureTime"]["processed"] = str(
+            Fraction(exif_dict["ExposureTime"]["processed"]).limit_denominator(8000)
+        )
+        exif_dict["ExposureBiasValue"]["processed"] = services._derationalize(exif_dict["ExposureBiasValue"]["raw"])
+        exif_dict["ExposureBiasValue"]["processed"] = "{} EV".format(exif_dict["ExposureBiasValue"]["processed"])
+    except TypeError as ex:
+        logger.warning(f"Error processing EXIF-data: {ex}")
+    return exif_dict
+
+
+def load_corpus(directory=None):
+    if directory:
+        paths = [
+            os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.lower().endswith((".jpg", ".jpeg"))
+        ]
+        files = [open(path, "rb").read() for path in paths]
+    else:
+        files = [make_jpeg(64, 64, gps=gps) for gps in (True, False)]
+    return [PILImage.open(io.BytesIO(data))._getexif() for data in files]
+
+
+def allocations(func, corpus):
+    tracemalloc.start()
+    for exif in corpus:
+        func(dict(exif))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(directory=None):
+    corpus = [exif for exif in load_corpus(directory) if exif]
+    print(f"{len(corpus)} images")
+    print(f"{'variant':<16} {'µs/image':>9} {'peak KiB':>9}")
+    for name, func in (("all TAGS", legacy_exif_to_dict), ("present tags", services._exif_to_dict)):
+        ms = timeit(lambda: [func(dict(exif)) for exif in corpus], repeat=500) / len(corpus)
+        print(f"{name:<16} {ms * 1000:>9.1f} {allocations(func, corpus) / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
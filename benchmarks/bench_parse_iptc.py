@@ -0,0 +1,95 @@
+"""
+Measures the per-image cost of mapping raw IPTC datasets to field names with the dataset
+registry, against the if/elif chain it replaced.
+
+    python benchmarks/bench_parse_iptc.py
+"""
+
+import io
+import logging
+
+from utils import setup_django, timeit
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from fixtures import make_jpeg  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+from PIL.IptcImagePlugin import getiptcinfo  # noqa: E402
+
+from wagtailimagecaptions import services  # noqa: E402
+
+
+def legacy_iptc_to_dict(iptc):
+    iptc_dict = {}
+
+    def decode(v):
+        if isinstance(v, bytes):
+            return bytes.decode(v)
+        elif isinstance(v, list):
+            return [decode(item) for item in v]
+        elif isinstance(v, str):
+            return v
+
+    # fmt: off
+    for k, v in iptc.items():
+        if k == (2, 5,):
+            iptc_dict["object_name"] = decode(v)
+        elif k == (2, 7,):
+            iptc_dict["edit_status"] = decode(v)
+        elif k == (2, 25,):
+            iptc_dict["keywords"] = decode(v)
+        elif k == (2, 30,):
+            iptc_dict["release_date"] = decode(v)
+        elif k == (2, 35,):
+            iptc_dict["release_time"] = decode(v)
+        elif k == (2, 37,):
+            iptc_dict["expiration_date"] = decode(v)
+        elif k == (2, 38,):
+            iptc_dict["expiration_time"] = decode(v)
+        elif k == (2, 40,):
+            iptc_dict["instructions"] = decode(v)
+        elif k == (2, 40,):
+            iptc_dict["instructions"] = decode(v)
+        elif k == (2, 42,):
+            iptc_dict["action_advised"] = decode(v)
+        elif k == (2, 80,):
+            iptc_dict["byline"] = decode(v)
+        elif k == (2, 85,):
+            iptc_dict["byline_title"] = decode(v)
+        elif k == (2, 90,):
+            iptc_dict["city"] = decode(v)
+        elif k == (2, 92,):
+            iptc_dict["sub_location"] = decode(v)
+        elif k == (2, 95,):
+            iptc_dict["province_state"] = decode(v)
+        elif k == (2, 100,):
+            iptc_dict["country"] = decode(v)
+        elif k == (2, 105,):
+            iptc_dict["headline"] = decode(v)
+        elif k == (2, 110,):
+            iptc_dict["credit"] = decode(v)
+        elif k == (2, 116,):
+            iptc_dict["copyright_notice"] = decode(v)
+        elif k == (2, 120,):
+            iptc_dict["caption"] = decode(v)
+        elif k == (2, 122,):
+            iptc_dict["writer_editor"] = decode(v)
+    # fmt: on
+
+    return {k: v for k, v in iptc_dict.items() if v}
+
+
+def main():
+    iptc = getiptcinfo(PILImage.open(io.BytesIO(make_jpeg(64, 64))))
+    assert legacy_iptc_to_dict(iptc) == services._iptc_to_dict(iptc)
+
+    repeat = 20000
+    for name, func in (("if/elif chain", legacy_iptc_to_dict), ("registry", services._iptc_to_dict)):
+        ms = timeit(lambda: func(iptc), repeat=repeat)
+        print(f"{name:<14} {ms * 1000:>8.2f} µs/image")
+
+
+if __name__ == "__main__":
+    main()
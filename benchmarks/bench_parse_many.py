@@ -0,0 +1,60 @@
+"""
+Measures how `parse_many` scales with the number of worker processes, against parsing
+the same files one after the other, for files on disk and for bytes.
+
+    python benchmarks/bench_parse_many.py [number of files]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from utils import setup_django
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from fixtures import DENSE_IPTC_FIELDS, make_jpeg  # noqa: E402
+
+from wagtailimagecaptions.services import extract_metadata, parse_many  # noqa: E402
+
+WORKERS = (1, 2, 4, 8, 16)
+
+
+def serial(paths: list):
+    for path in paths:
+        with open(path, "rb") as f:
+            extract_metadata(f)
+
+
+def main(count: int = 2000):
+    data = make_jpeg(640, 480, iptc_fields=DENSE_IPTC_FIELDS)
+    print(f"{os.cpu_count()} CPUs, {count} files of {len(data)} bytes.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(count):
+            paths.append(os.path.join(directory, f"{i}.jpg"))
+            with open(paths[-1], "wb") as f:
+                f.write(data)
+
+        start = time.perf_counter()
+        serial(paths)
+        baseline = time.perf_counter() - start
+        print(f"{'variant':<20} {'files/s':>9} {'speedup':>8}")
+        print(f"{'serial':<20} {count / baseline:>9.0f} {1:>8.2f}")
+
+        for workers in WORKERS:
+            for name, files in (("paths", paths), ("bytes", [data] * count)):
+                start = time.perf_counter()
+                results = parse_many(files, workers=workers)
+                seconds = time.perf_counter() - start
+                assert not any(result.error for result in results)
+                print(f"{f'{workers} workers, {name}':<20} {count / seconds:>9.0f} {baseline / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
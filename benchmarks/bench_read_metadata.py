@@ -0,0 +1,54 @@
+"""
+Compares the bytes read, peak memory and time of reading the raw EXIF and IPTC data
+from large files with Pillow against the header-only reader behind `read_metadata`.
+
+    python benchmarks/bench_read_metadata.py
+"""
+
+import io
+import logging
+import tracemalloc
+
+from utils import CountingFile, setup_django, timeit
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+from fixtures import make_jpeg, make_tiff  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+from PIL.IptcImagePlugin import getiptcinfo  # noqa: E402
+
+from wagtailimagecaptions.headers import read_headers  # noqa: E402
+
+
+def with_pillow(f):
+    image = PILImage.open(f)
+    image.getexif().get_ifd(0x8769)
+    getiptcinfo(image)
+
+
+def header_only(f):
+    read_headers(f)
+
+
+def main():
+    fixtures = {
+        "jpeg 6000x4000": make_jpeg(6000, 4000),
+        "tiff 6000x4000": make_tiff(6000, 4000),
+    }
+    print(f"{'file':<16} {'size':>11} {'variant':<12} {'bytes read':>11} {'peak KiB':>9} {'ms':>8}")
+    for name, data in fixtures.items():
+        for variant, func in (("pillow", with_pillow), ("header-only", header_only)):
+            func(io.BytesIO(data))  # warm up lazy imports and caches
+            f = CountingFile(data)
+            tracemalloc.start()
+            func(f)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            ms = timeit(lambda: func(io.BytesIO(data)), repeat=20)
+            print(f"{name:<16} {len(data):>11} {variant:<12} {f.bytes_read:>11} {peak / 1024:>9.1f} {ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Times resolving the upload paths of originals and renditions with each sharding strategy
+of `wagtailimagecaptions.uploads`. No files are written.
+
+    python benchmarks/bench_upload_paths.py
+"""
+
+from utils import setup_django, timeit
+
+setup_django()
+
+from django.test.utils import override_settings  # noqa: E402
+from wagtail.images import get_image_model  # noqa: E402
+
+STRATEGIES = {
+    "none": {"WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING": None},
+    "date": {"WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING": "date"},
+    "hash": {"WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING": "hash"},
+    "id": {"WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING": "id"},
+}
+
+
+def main():
+    ImageModel = get_image_model()
+    image = ImageModel(pk=12345, title="Benchmark")
+    rendition = ImageModel.get_rendition_model()(image=image, filter_spec="fill-300x200")
+
+    print(f"{'strategy':<10} {'original us':>12} {'rendition us':>13}")
+    for name, overrides in STRATEGIES.items():
+        with override_settings(**overrides):
+            original_ms = timeit(lambda: image.get_upload_to("Photo of Café Ørsted.jpg"), repeat=20000)
+            rendition_ms = timeit(
+                lambda: rendition.get_upload_to("Photo_of_Cafe_Orsted.fill-300x200.jpg"), repeat=20000
+            )
+        print(f"{name:<10} {original_ms * 1000:>12.2f} {rendition_ms * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
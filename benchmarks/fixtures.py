@@ -0,0 +1,148 @@
+"""
+Synthetic image fixtures for the benchmarks, generated with Pillow so no binary test
+images need to be checked in.
+"""
+
+import io
+import struct
+
+from PIL import Image as PILImage
+from PIL.TiffImagePlugin import IPTC_NAA_CHUNK, IFDRational
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+
+IPTC_FIELDS = {
+    (2, 5): "Benchmark object",
+    (2, 25): ["news", "politics", "benchmark"],
+    (2, 80): "Jane Photographer",
+    (2, 90): "Arlington",
+    (2, 95): "Virginia",
+    (2, 100): "United States",
+    (2, 105): "A synthetic headline for benchmarking",
+    (2, 110): "Benchmark Wire",
+    (2, 116): "(c) Benchmark Wire",
+    (2, 120): "A synthetic caption.\n\nIt has two paragraphs.",
+}
+
+# A heavily tagged image, as produced by picture desks and archives.
+DENSE_IPTC_FIELDS = {
+    **IPTC_FIELDS,
+    (2, 25): [f"keyword {i}" for i in range(200)],
+    (2, 120): "A long synthetic caption. " * 80,
+}
+
+
+def build_exif(gps: bool = True) -> PILImage.Exif:
+    """
+    Builds an EXIF block resembling the output of a modern mirrorless camera.
+    """
+    exif = PILImage.Exif()
+    exif[0x010F] = "Fujifilm"  # Make
+    exif[0x0110] = "X100V"  # Model
+    exif[0x0112] = 1  # Orientation
+    exif[0x011A] = IFDRational(72, 1)  # XResolution
+    exif[0x011B] = IFDRational(72, 1)  # YResolution
+    exif[0x0128] = 2  # ResolutionUnit
+    exif[0x0132] = "2023:03:14 15:09:26"  # DateTime
+
+    exif_ifd = {}
+    exif_ifd[0x829A] = IFDRational(1, 250)  # ExposureTime
+    exif_ifd[0x829D] = IFDRational(28, 10)  # FNumber
+    exif_ifd[0x8822] = 3  # ExposureProgram
+    exif_ifd[0x8827] = 400  # ISOSpeedRatings
+    exif_ifd[0x9003] = "2023:03:14 15:09:26"  # DateTimeOriginal
+    exif_ifd[0x9004] = "2023:03:14 15:09:26"  # DateTimeDigitized
+    exif_ifd[0x9011] = "-05:00"  # OffsetTimeOriginal
+    exif_ifd[0x9202] = IFDRational(297, 100)  # ApertureValue
+    exif_ifd[0x9204] = IFDRational(0, 1)  # ExposureBiasValue
+    exif_ifd[0x9205] = IFDRational(297, 100)  # MaxApertureValue
+    exif_ifd[0x9207] = 5  # MeteringMode
+    exif_ifd[0x920A] = IFDRational(23, 1)  # FocalLength
+    exif_ifd[0x927C] = b"FUJIFILM" + bytes(range(256)) * 4  # MakerNote
+    exif_ifd[0xA405] = 35  # FocalLengthIn35mmFilm
+    exif_ifd[0xA433] = "Fujifilm"  # LensMake
+    exif_ifd[0xA434] = "23mm f/2"  # LensModel
+    exif[EXIF_IFD] = exif_ifd
+
+    if gps:
+        gps_ifd = {}
+        gps_ifd[1] = "N"
+        gps_ifd[2] = (IFDRational(38, 1), IFDRational(53, 1), IFDRational(2334, 100))
+        gps_ifd[3] = "W"
+        gps_ifd[4] = (IFDRational(77, 1), IFDRational(2, 1), IFDRational(1612, 100))
+        exif[GPS_IFD] = gps_ifd
+
+    return exif
+
+
+def build_iptc_records(fields: dict = None) -> bytes:
+    """
+    Encodes IPTC-IIM datasets as raw records, as stored in the TIFF IPTC-NAA tag.
+    """
+    records = b""
+    for (record, dataset), values in (fields or IPTC_FIELDS).items():
+        for value in values if isinstance(values, list) else [values]:
+            data = value.encode()
+            records += struct.pack(">BBBH", 0x1C, record, dataset, len(data)) + data
+
+    if len(records) % 2:
+        records += b"\x00"
+
+    return records
+
+
+def build_iptc(fields: dict = None) -> bytes:
+    """
+    Encodes IPTC-IIM datasets as a Photoshop "8BIM" image resource block (APP13 payload).
+    """
+    records = build_iptc_records(fields)
+    resource = b"8BIM" + struct.pack(">H", 0x0404) + b"\x00\x00" + struct.pack(">I", len(records)) + records
+    return b"Photoshop 3.0\x00" + resource
+
+
+def make_jpeg(
+    width: int = 1024,
+    height: int = 768,
+    exif: bool = True,
+    iptc: bool = True,
+    gps: bool = True,
+    iptc_fields: dict = None,
+) -> bytes:
+    """
+    Returns the bytes of a JPEG with (optionally) EXIF, GPS and IPTC meta data.
+    """
+    image = PILImage.new("RGB", (width, height), (120, 140, 160))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90, exif=build_exif(gps=gps) if exif else b"")
+    data = buffer.getvalue()
+
+    if iptc:
+        payload = build_iptc(iptc_fields)
+        app13 = b"\xff\xed" + struct.pack(">H", len(payload) + 2) + payload
+        data = data[:2] + app13 + data[2:]
+
+    return data
+
+
+def make_tiff(
+    width: int = 1024,
+    height: int = 768,
+    exif: bool = True,
+    iptc: bool = True,
+    gps: bool = True,
+    iptc_fields: dict = None,
+) -> bytes:
+    """
+    Returns the bytes of an uncompressed TIFF with (optionally) EXIF and IPTC meta data.
+    """
+    image = PILImage.new("RGB", (width, height), (120, 140, 160))
+    buffer = io.BytesIO()
+    # TIFF stores EXIF and IPTC tags in the same IFD, so both go into one Exif block.
+    info = PILImage.Exif()
+    if exif:
+        info.load(build_exif(gps=gps).tobytes())
+    if iptc:
+        info[IPTC_NAA_CHUNK] = build_iptc_records(iptc_fields)
+    image.save(buffer, "TIFF", exif=info)
+    return buffer.getvalue()
@@ -0,0 +1,198 @@
+"""
+Times each stage of getting an upload into the image model, for synthetic JPEG and TIFF
+fixtures in a range of sizes and meta data densities, and writes the results as JSON so
+runs can be compared over time:
+
+    python benchmarks/run.py --output results/main.json
+    python benchmarks/run.py --output results/branch.json --compare results/main.json
+
+The stages saving images run against a throw-away test database and media directory.
+"""
+
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from utils import ROOT, setup_django
+
+setup_django()
+
+logging.disable(logging.WARNING)
+
+import django  # noqa: E402
+import PIL  # noqa: E402
+import wagtail  # noqa: E402
+from django.core.files.images import ImageFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from fixtures import DENSE_IPTC_FIELDS, make_jpeg, make_tiff  # noqa: E402
+from wagtail.images import get_image_model  # noqa: E402
+
+from wagtailimagecaptions import services, signals  # noqa: E402
+
+SIZES = {
+    "small": (640, 480),
+    "medium": (2048, 1536),
+    "large": (6000, 4000),
+}
+
+DENSITIES = {
+    "none": dict(exif=False, iptc=False),
+    "exif": dict(exif=True, iptc=False, gps=False),
+    "full": dict(exif=True, iptc=True, gps=True),
+    "dense": dict(exif=True, iptc=True, gps=True, iptc_fields=DENSE_IPTC_FIELDS),
+}
+
+FORMATS = {
+    "jpeg": (make_jpeg, "jpg"),
+    "tiff": (make_tiff, "tif"),
+}
+
+
+def upload(data: bytes, extension: str) -> ImageFile:
+    return ImageFile(io.BytesIO(data), name=f"benchmark.{extension}")
+
+
+def delete_images():
+    get_image_model().objects.all().delete()
+
+
+def stage_pre_save(data, extension):
+    ImageModel = get_image_model()
+    signals.parse_image_meta(ImageModel, instance=ImageModel(title="benchmark", file=upload(data, extension)))
+
+
+def stage_save(data, extension):
+    get_image_model()(title="benchmark", file=upload(data, extension)).save()
+
+
+# Stage name -> (function called with the fixture bytes and file extension, teardown or None)
+STAGES = {
+    "hash_file": (lambda data, ext: services.hash_file(io.BytesIO(data)), None),
+    "parse_iptc": (lambda data, ext: services.parse_iptc(io.BytesIO(data)), None),
+    "parse_exif": (lambda data, ext: services.parse_exif(io.BytesIO(data)), None),
+    "read_metadata": (lambda data, ext: services.read_metadata(io.BytesIO(data)), None),
+    "extract_metadata": (lambda data, ext: services.extract_metadata(io.BytesIO(data)), None),
+    "pre_save": (stage_pre_save, None),
+    "imagefile_to_model": (lambda data, ext: services.imagefile_to_model(upload(data, ext)), delete_images),
+    "save": (stage_save, delete_images),
+}
+
+
+def measure(func, repeat: int, teardown=None) -> dict:
+    """
+    Calls `func` `repeat` times (after one warm-up call) and returns timing statistics in
+    milliseconds. `teardown` runs after every call, outside of the timed section.
+    """
+    timings = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i:
+            timings.append(elapsed)
+        if teardown:
+            teardown()
+
+    return {
+        "mean_ms": statistics.mean(timings),
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "stdev_ms": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(sizes, densities, formats, stages, repeat: int) -> dict:
+    results = []
+    for format_name in formats:
+        make, extension = FORMATS[format_name]
+        for size in sizes:
+            width, height = SIZES[size]
+            for density in densities:
+                data = make(width, height, **DENSITIES[density])
+                for stage in stages:
+                    func, teardown = STAGES[stage]
+                    timings = measure(lambda: func(data, extension), repeat, teardown)
+                    result = dict(
+                        stage=stage, format=format_name, size=size, density=density, bytes=len(data), **timings
+                    )
+                    results.append(result)
+                    print(f"{stage:<18} {format_name:<5} {size:<7} {density:<6} {timings['median_ms']:>10.3f} ms")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "wagtail": wagtail.__version__,
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Prints the change of the median time of every result also found in `baseline`.
+    """
+
+    def key(result):
+        return result["stage"], result["format"], result["size"], result["density"]
+
+    previous = {key(result): result for result in baseline["results"]}
+    print(f"\nCompared to {baseline['meta']['revision'][:10] or 'baseline'} ({baseline['meta']['timestamp']}):")
+    for result in report["results"]:
+        if (before := previous.get(key(result))) is None:
+            continue
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100
+        print(
+            f"{' '.join(key(result)):<40} {before['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms ({change:+.1f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="A JSON file of an earlier run to compare against.")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed calls per stage and fixture.")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--densities", nargs="+", choices=DENSITIES, default=list(DENSITIES))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            report = run(args.sizes, args.densities, args.formats, args.stages, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """
+    Makes the app importable from the source tree and configures the test project.
+    """
+    for path in (ROOT, ROOT / "src"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "test_project.settings")
+
+    import django
+
+    django.setup()
+
+
+class CountingFile(io.BytesIO):
+    """
+    An in-memory file which keeps track of how often, and how much, it was read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.reads += 1
+        self.bytes_read += len(data)
+        return data
+
+
+def timeit(func, repeat: int = 200) -> float:
+    """
+    Returns the mean time in milliseconds of calling `func`.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
@@ -10,7 +10,7 @@ class Migration(migrations.Migration):
 
     dependencies = [
         ("wagtailcore", "0091_remove_revision_submitted_for_moderation"),
-        ("wagtailimagecaptions", "0007_captionedexifimage_date_time_original_and_more"),
+        ("wagtailimagecaptions", "0007_alter_captionedexifimage_aperture_and_more"),
     ]
 
     operations = [
@@ -0,0 +1,145 @@
+"""
+Async counterparts of the meta data functions of `services`, for async (ASGI) upload views
+and ingest services:
+
+    from wagtailimagecaptions.async_services import aimagefile_to_model
+
+    async def upload(request):
+        image = await aimagefile_to_model(ImageFile(request.FILES["file"]))
+
+Reading and parsing files is blocking, so it runs on a thread pool of
+`WAGTIALIMAGECAPTIONS_ASYNC_WORKERS` threads (default 4), and at most
+`WAGTIALIMAGECAPTIONS_ASYNC_CONCURRENCY` files (default: twice the workers) are handed to
+it at a time per event loop. The other calls wait for a slot, so a bulk upload can't tie up
+all threads or queue unbounded work. Database access uses Django's async ORM.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from os.path import basename
+
+from django.conf import settings
+from django.core.files.images import ImageFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+
+from .services import ImageMetadata, build_image, extract_metadata, parse_exif, parse_iptc
+
+# Event loop -> the semaphore limiting the files in flight on that loop.
+_semaphores = weakref.WeakKeyDictionary()
+# Event loop -> file hash -> the task creating the image of that file.
+_pending_images = weakref.WeakKeyDictionary()
+
+# The size up to which the copies of uploads made by `aimagefile_to_model` are kept in memory.
+SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+
+def get_async_workers() -> int:
+    return getattr(settings, "WAGTIALIMAGECAPTIONS_ASYNC_WORKERS", 4)
+
+
+def get_async_concurrency() -> int:
+    return getattr(settings, "WAGTIALIMAGECAPTIONS_ASYNC_CONCURRENCY", None) or get_async_workers() * 2
+
+
+@lru_cache(maxsize=None)
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=get_async_workers(), thread_name_prefix="wagtailimagecaptions")
+
+
+@receiver(setting_changed)
+def reset_async_limits(setting, **kwargs):
+    if setting in ("WAGTIALIMAGECAPTIONS_ASYNC_WORKERS", "WAGTIALIMAGECAPTIONS_ASYNC_CONCURRENCY"):
+        get_executor.cache_clear()
+        _semaphores.clear()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function on the executor, once one of the concurrency slots of the
+    running event loop is free. Context variables, like the current instrumentation
+    report, are passed along.
+    """
+    loop = asyncio.get_running_loop()
+    if (semaphore := _semaphores.get(loop)) is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(get_async_concurrency())
+
+    async with semaphore:
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(get_executor(), partial(context.run, func, *args, **kwargs))
+
+
+async def aparse_iptc(image_file: ImageFile) -> dict:
+    return await run_blocking(parse_iptc, image_file)
+
+
+async def aparse_exif(image_file: ImageFile) -> dict:
+    return await run_blocking(parse_exif, image_file)
+
+
+async def aextract_metadata(image_file: ImageFile, exif: bool = True, file_hash: str = None) -> ImageMetadata:
+    return await run_blocking(extract_metadata, image_file, exif=exif, file_hash=file_hash)
+
+
+async def aimagefile_to_model(image_file: ImageFile):
+    """
+    Converts an ImageFile to our image model, like `services.imagefile_to_model`. An
+    existing image with the same file hash is returned, otherwise one is created with its
+    meta data extracted up front, off the event loop. Concurrent calls for the same file
+    on an event loop share the creation of its image.
+    """
+    try:
+        file_hash, copy = await run_blocking(_copy_image_file, image_file)
+    finally:
+        image_file.close()
+
+    # The creation works on its own copy of the file, so it isn't affected by a caller
+    # closing its file, e.g. when it's cancelled while the others wait for the image.
+    pending = _pending_images.setdefault(asyncio.get_running_loop(), {})
+    if (task := pending.get(file_hash)) is None:
+        task = pending[file_hash] = asyncio.ensure_future(_aget_or_create_image(copy, file_hash))
+        task.add_done_callback(lambda task: pending.pop(file_hash, None))
+    else:
+        copy.close()
+    # Cancelling one of the callers mustn't cancel the creation for the others.
+    return await asyncio.shield(task)
+
+
+def _copy_image_file(image_file: ImageFile) -> tuple:
+    """
+    Returns the hash of a file and a copy of it, kept in memory up to `SPOOL_MAX_SIZE`
+    bytes and in a temporary file beyond, hashed and copied in a single read.
+    """
+    sha1 = hashlib.sha1()
+    copy = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    image_file.open(mode="rb")
+    image_file.seek(0)
+    for chunk in image_file.chunks():
+        sha1.update(chunk)
+        copy.write(chunk)
+    copy.seek(0)
+    return sha1.hexdigest(), ImageFile(copy, name=basename(image_file.name))
+
+
+async def _aget_or_create_image(image_file: ImageFile, file_hash: str):
+    ImageModel = get_image_model()
+    try:
+        if image := await ImageModel.objects.filter(file_hash=file_hash).order_by("pk").afirst():
+            return image
+
+        # Instantiating the model may query the database (for the default collection), so it
+        # runs on the executor along with the extraction.
+        image = await run_blocking(build_image, image_file, file_hash)
+        # The extraction takes a while, another process may have created the image since.
+        if existing := await ImageModel.objects.filter(file_hash=file_hash).order_by("pk").afirst():
+            return existing
+        await image.asave()
+        return image
+    finally:
+        image_file.close()
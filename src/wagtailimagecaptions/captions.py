@@ -0,0 +1,67 @@
+"""
+Cached rendering of image captions.
+
+Captions are stored as rich text, which the `richtext` template filter expands (resolving
+links to pages and documents) on every request. `CaptionedImage.rendered_caption` caches
+the expanded caption in the cache set by `WAGTIALIMAGECAPTIONS_CAPTION_CACHE` (default
+"default"), keyed on the image ID and a hash of the caption, for
+`WAGTIALIMAGECAPTIONS_CAPTION_CACHE_TIMEOUT` seconds (default: the cache's timeout).
+"""
+
+import hashlib
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from wagtail.templatetags.wagtailcore_tags import richtext
+
+
+def get_caption_cache():
+    return caches[getattr(settings, "WAGTIALIMAGECAPTIONS_CAPTION_CACHE", DEFAULT_CACHE_ALIAS)]
+
+
+def get_caption_timeout():
+    return getattr(settings, "WAGTIALIMAGECAPTIONS_CAPTION_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+
+
+def caption_cache_key(image) -> str:
+    digest = hashlib.sha1((image.caption or "").encode()).hexdigest()[:16]
+    return f"wagtailimagecaptions:caption:{image.pk}:{digest}"
+
+
+def render_caption(image) -> str:
+    """
+    Returns the caption of an image rendered like `{{ image.caption|richtext }}`, from the
+    cache where possible.
+    """
+    if not image.caption:
+        return ""
+    if image.pk is None:
+        return richtext(image.caption)
+
+    cache = get_caption_cache()
+    key = caption_cache_key(image)
+    if (rendered := cache.get(key)) is None:
+        rendered = richtext(image.caption)
+        cache.set(key, rendered, get_caption_timeout())
+    return rendered
+
+
+def invalidate_caption(image):
+    get_caption_cache().delete(caption_cache_key(image))
+
+
+def warm_captions(images: Iterable, force: bool = False) -> int:
+    """
+    Renders the captions of `images` into the cache, skipping those already cached unless
+    `force` is set, and returns the number of captions rendered.
+    """
+    keys = {caption_cache_key(image): image for image in images if image.caption and image.pk is not None}
+    cache = get_caption_cache()
+    if not force:
+        for key in cache.get_many(keys):
+            del keys[key]
+
+    cache.set_many({key: richtext(image.caption) for key, image in keys.items()}, get_caption_timeout())
+    return len(keys)
@@ -0,0 +1,163 @@
+"""
+Deferred meta data extraction.
+
+By default the meta data of an image is extracted in the `pre_save` signal, inside the
+upload request. When `WAGTIALIMAGECAPTIONS_METADATA_BACKEND` is set, new images are
+saved right away with `metadata_pending` set, and the extraction is handed to the
+configured backend:
+
+    # Extract in a thread pool of the web process.
+    WAGTIALIMAGECAPTIONS_METADATA_BACKEND = "wagtailimagecaptions.deferred.ThreadPoolBackend"
+
+    # Queue the extraction in the database, run `manage.py process_metadata_queue` to
+    # work through the queue.
+    WAGTIALIMAGECAPTIONS_METADATA_BACKEND = "wagtailimagecaptions.deferred.DatabaseQueueBackend"
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from wagtail.images import get_image_model
+
+from . import instrumentation
+from .perceptual import set_perceptual_hash
+from .services import EDITORIAL_FIELDS, apply_metadata, extract_metadata, keep_editorial_fields
+
+logger = logging.getLogger(__name__)
+
+
+class BaseMetadataBackend:
+    def enqueue(self, image_id: int):
+        raise NotImplementedError
+
+
+class ThreadPoolBackend(BaseMetadataBackend):
+    """
+    Extracts the meta data in a thread pool once the transaction saving the image has been
+    committed. The pool size is set with `WAGTIALIMAGECAPTIONS_METADATA_WORKERS`.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "WAGTIALIMAGECAPTIONS_METADATA_WORKERS", 2),
+            thread_name_prefix="wagtailimagecaptions",
+        )
+
+    def enqueue(self, image_id: int):
+        transaction.on_commit(partial(self.executor.submit, self.run, image_id))
+
+    def run(self, image_id: int):
+        try:
+            process_image(image_id)
+        except Exception:
+            logger.exception("Could not extract the meta data of image %s.", image_id)
+        finally:
+            connection.close()
+
+
+class DatabaseQueueBackend(BaseMetadataBackend):
+    """
+    Queues the extraction as a `MetadataExtractionTask`, in the same transaction as the
+    image. The queue is processed by the `process_metadata_queue` management command.
+    """
+
+    def enqueue(self, image_id: int):
+        from .models import MetadataExtractionTask
+
+        MetadataExtractionTask.objects.create(image_id=image_id)
+
+
+@lru_cache(maxsize=None)
+def get_metadata_backend():
+    """
+    Returns the configured backend, or None if meta data is extracted on save.
+    """
+    if backend := getattr(settings, "WAGTIALIMAGECAPTIONS_METADATA_BACKEND", None):
+        return import_string(backend)()
+    return None
+
+
+@receiver(setting_changed)
+def reset_metadata_backend(setting, **kwargs):
+    if setting == "WAGTIALIMAGECAPTIONS_METADATA_BACKEND":
+        get_metadata_backend.cache_clear()
+
+
+def process_image(image_id: int) -> list:
+    """
+    Extracts the meta data (and the perceptual hash, if enabled and missing) of a saved image
+    and writes the extracted fields (only) to the database. Returns the names of the updated
+    fields.
+
+    Editors may have changed the image since the upload, so the `EDITORIAL_FIELDS` (title,
+    caption, credit etc.) are only written while they're blank (or the title is still the
+    file name), and only if they haven't changed while the file was parsed.
+    """
+    ImageModel = get_image_model()
+    image = ImageModel.objects.get(pk=image_id)
+    before = {name: getattr(image, name) for name in EDITORIAL_FIELDS}
+
+    with instrumentation.record(image.file.name):
+        with image.open_file() as f:
+            metadata = extract_metadata(f, exif=hasattr(image, "exif_data"), file_hash=image.file_hash)
+            # Hashing decodes the whole image, so it's deferred along with the meta data.
+            hash_fields = set_perceptual_hash(image, f) if image.perceptual_hash is None else []
+        with instrumentation.stage("apply"):
+            fields = apply_metadata(image, metadata) + hash_fields
+
+    fields = keep_editorial_fields(image, before, fields, curated_only=True)
+    updated = [name for name in fields if name not in EDITORIAL_FIELDS]
+    ImageModel.objects.filter(pk=image_id).update(
+        metadata_pending=False, **{name: getattr(image, name) for name in updated}
+    )
+
+    # Only fill in the editorial fields still holding the value read above.
+    for name in fields:
+        if name in EDITORIAL_FIELDS:
+            unchanged = ImageModel.objects.filter(pk=image_id, **{name: before[name]})
+            if unchanged.update(**{name: getattr(image, name)}):
+                updated.append(name)
+    return updated
+
+
+def process_queue(limit: int = None, max_attempts: int = 3) -> int:
+    """
+    Works through the queued `MetadataExtractionTask`s, least failed and oldest first, and
+    returns the number of tasks processed. Each task is locked while it is processed (where
+    the database supports it), so several workers can process the queue at once. Failed
+    tasks are kept for a retry until they have failed `max_attempts` times.
+    """
+    from .models import MetadataExtractionTask
+
+    processed = 0
+    while limit is None or processed < limit:
+        with transaction.atomic():
+            task = (
+                MetadataExtractionTask.objects.select_for_update(skip_locked=True)
+                .filter(attempts__lt=max_attempts)
+                .order_by("attempts", "pk")
+                .first()
+            )
+            if task is None:
+                break
+
+            try:
+                with transaction.atomic():
+                    process_image(task.image_id)
+            except Exception as e:
+                logger.warning("Could not extract the meta data of image %s: %s", task.image_id, e)
+                task.attempts += 1
+                task.last_error = f"{type(e).__name__}: {e}"
+                task.save(update_fields=["attempts", "last_error"])
+            else:
+                task.delete()
+
+        processed += 1
+
+    return processed
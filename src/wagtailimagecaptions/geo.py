@@ -0,0 +1,80 @@
+"""
+Geohash encoding and bounding box helpers for the location of `CaptionedExifImage`s,
+which don't need PostGIS or any other spatial database extension.
+"""
+
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Returns the geohash of a location. Locations sharing a prefix are in the same cell,
+    e.g. "dqcjp" is a cell of roughly 5 x 5 km in Washington, D.C.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude.
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+
+    return "".join(geohash)
+
+
+def geohash_range(prefix: str) -> tuple:
+    """
+    Returns the (lowest, highest) bounds of the geohashes within a cell, the highest
+    exclusive and None for the last cell. Unlike a LIKE 'prefix%' lookup, a range can use
+    the index of the column on every database.
+    """
+    upper = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not upper:
+        return prefix, None
+    return prefix, upper[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(upper[-1]) + 1]
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> tuple:
+    """
+    Returns the (south, west, north, east) box enclosing a circle on the earth. Where the
+    box crosses the antimeridian, west is larger than east. Near the poles, the box spans
+    all longitudes.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south = latitude - delta_lat
+    north = latitude + delta_lat
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+
+    delta_lon = math.degrees(math.asin(ratio))
+    west = longitude - delta_lon
+    east = longitude + delta_lon
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
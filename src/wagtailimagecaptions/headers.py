@@ -0,0 +1,282 @@
+"""
+A header-only reader for the meta data of JPEG and TIFF files.
+
+Only the JPEG APP1 (EXIF) and APP13 (IPTC) segments and the TIFF IFDs holding EXIF,
+GPS and IPTC tags are read, so pixel data is never decoded nor loaded into memory. The
+values returned mirror what Pillow's `Image._getexif()` and `getiptcinfo()` return, so
+the results can be fed through the same post-processing as the Pillow based parsers.
+"""
+
+import io
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL.TiffImagePlugin import IFDRational
+
+# Values larger than this (strip offsets, embedded previews etc.) are skipped, which keeps
+# the memory used bounded regardless of the size of the file.
+MAX_VALUE_SIZE = 64 * 1024
+
+EXIF_IFD_TAG = 0x8769
+GPS_IFD_TAG = 0x8825
+IPTC_NAA_TAG = 0x83BB
+IMAGE_WIDTH_TAG = 0x0100
+IMAGE_LENGTH_TAG = 0x0101
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+JPEG_APP1 = 0xE1
+JPEG_APP13 = 0xED
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+EXIF_HEADER = b"Exif\x00\x00"
+PHOTOSHOP_HEADER = b"Photoshop 3.0\x00"
+PHOTOSHOP_IPTC_RESOURCE = 0x0404
+
+# TIFF field type -> (struct format character, size in bytes)
+TIFF_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("L", 4),  # LONG
+    5: ("L", 8),  # RATIONAL
+    6: ("b", 1),  # SBYTE
+    7: ("s", 1),  # UNDEFINED
+    8: ("h", 2),  # SSHORT
+    9: ("l", 4),  # SLONG
+    10: ("l", 8),  # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+    13: ("L", 4),  # IFD
+}
+
+
+class UnsupportedFormat(ValueError):
+    """Raised when a file is not a JPEG or TIFF, or its headers can not be parsed."""
+
+
+@dataclass
+class RawHeaders:
+    exif: Optional[dict] = None
+    iptc: Optional[dict] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+def read_headers(fp, exif: bool = True, iptc: bool = True) -> RawHeaders:
+    """
+    Reads the raw EXIF and IPTC data from a seekable binary stream (a file, a Django
+    `File` or an `mmap`). The stream position is restored afterwards.
+    """
+    position = fp.tell()
+    try:
+        fp.seek(0)
+        signature = fp.read(4)
+        fp.seek(0)
+
+        if signature[:2] == JPEG_SOI:
+            return _read_jpeg(fp, exif, iptc)
+        if signature in (b"II*\x00", b"MM\x00*"):
+            return _read_tiff(fp, exif, iptc)
+    except (struct.error, EOFError, ValueError) as e:
+        raise UnsupportedFormat(f"Could not parse image headers: {e}") from e
+    finally:
+        fp.seek(position)
+
+    raise UnsupportedFormat("Not a JPEG or TIFF file.")
+
+
+def _read_exact(fp, size: int) -> bytes:
+    data = fp.read(size)
+    if len(data) != size:
+        raise EOFError("Unexpected end of file.")
+    return data
+
+
+def _read_jpeg(fp, exif: bool, iptc: bool) -> RawHeaders:
+    headers = RawHeaders()
+    fp.seek(2)
+
+    while True:
+        # Markers may be preceded by any number of 0xFF fill bytes.
+        if _read_exact(fp, 1) != b"\xff":
+            raise ValueError("Invalid JPEG marker.")
+        marker = _read_exact(fp, 1)[0]
+        while marker == 0xFF:
+            marker = _read_exact(fp, 1)[0]
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            break
+
+        (length,) = struct.unpack(">H", _read_exact(fp, 2))
+        size = length - 2
+
+        if marker == JPEG_APP1 and exif and headers.exif is None:
+            payload = _read_exact(fp, size)
+            if payload.startswith(EXIF_HEADER):
+                reader = _TiffReader(io.BytesIO(payload[len(EXIF_HEADER) :]))
+                headers.exif = reader.read_exif()
+        elif marker == JPEG_APP13 and iptc:
+            payload = _read_exact(fp, size)
+            if payload.startswith(PHOTOSHOP_HEADER):
+                records = _photoshop_iptc_records(payload[len(PHOTOSHOP_HEADER) :])
+                if records:
+                    headers.iptc = _parse_iim(records, headers.iptc)
+        elif marker in JPEG_SOF_MARKERS:
+            # The meta data segments precede the frame header, so we're done.
+            headers.height, headers.width = struct.unpack(">HH", _read_exact(fp, 5)[1:])
+            break
+        else:
+            fp.seek(size, io.SEEK_CUR)
+
+    return headers
+
+
+def _read_tiff(fp, exif: bool, iptc: bool) -> RawHeaders:
+    reader = _TiffReader(fp)
+    ifd0 = reader.read_ifd(reader.first_ifd, raw_tags={IPTC_NAA_TAG})
+
+    headers = RawHeaders(width=ifd0.get(IMAGE_WIDTH_TAG), height=ifd0.get(IMAGE_LENGTH_TAG))
+
+    iptc_records = ifd0.get(IPTC_NAA_TAG)
+    if iptc and iptc_records:
+        headers.iptc = _parse_iim(iptc_records)
+
+    if exif:
+        headers.exif = reader.merge_sub_ifds(ifd0)
+
+    return headers
+
+
+class _TiffReader:
+    """
+    Reads IFDs from a TIFF structure. Offsets are relative to the current stream position
+    at creation, which is where the byte order mark is.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.base = fp.tell()
+        byte_order = _read_exact(fp, 2)
+        if byte_order == b"II":
+            self.endian = "<"
+        elif byte_order == b"MM":
+            self.endian = ">"
+        else:
+            raise ValueError("Invalid TIFF byte order.")
+        magic, self.first_ifd = struct.unpack(self.endian + "HL", _read_exact(fp, 6))
+        if magic != 42:
+            raise ValueError("Invalid TIFF header.")
+
+    def read_exif(self) -> dict:
+        return self.merge_sub_ifds(self.read_ifd(self.first_ifd))
+
+    def merge_sub_ifds(self, ifd0: dict) -> dict:
+        """
+        Merges the EXIF sub-IFD into IFD0 and adds the GPS IFD as a nested dict, the same
+        way Pillow's `Image._getexif()` does.
+        """
+        merged = dict(ifd0)
+        if isinstance(exif_offset := ifd0.get(EXIF_IFD_TAG), int):
+            merged.update(self.read_ifd(exif_offset))
+        if isinstance(gps_offset := ifd0.get(GPS_IFD_TAG), int):
+            merged[GPS_IFD_TAG] = self.read_ifd(gps_offset)
+        return merged
+
+    def read_ifd(self, offset: int, raw_tags: set = frozenset()) -> dict:
+        fp, endian = self.fp, self.endian
+        fp.seek(self.base + offset)
+        (count,) = struct.unpack(endian + "H", _read_exact(fp, 2))
+        entries = _read_exact(fp, count * 12)
+
+        ifd = {}
+        for i in range(count):
+            tag, field_type, value_count, value = struct.unpack(endian + "HHL4s", entries[i * 12 : i * 12 + 12])
+            if field_type not in TIFF_TYPES:
+                continue
+
+            fmt, unit_size = TIFF_TYPES[field_type]
+            size = unit_size * value_count
+            if size > MAX_VALUE_SIZE:
+                continue
+            if size > 4:
+                (value_offset,) = struct.unpack(endian + "L", value)
+                fp.seek(self.base + value_offset)
+                data = _read_exact(fp, size)
+            else:
+                data = value[:size]
+
+            ifd[tag] = data if tag in raw_tags else self._decode(field_type, fmt, value_count, data)
+
+        return ifd
+
+    def _decode(self, field_type: int, fmt: str, count: int, data: bytes):
+        if field_type in (1, 7):
+            return data
+        if field_type == 2:
+            if data.endswith(b"\x00"):
+                data = data[:-1]
+            return data.decode("latin-1", "replace")
+
+        if field_type in (5, 10):
+            numbers = struct.unpack(f"{self.endian}{count * 2}{fmt}", data)
+            values = tuple(IFDRational(numbers[i], numbers[i + 1]) for i in range(0, len(numbers), 2))
+        else:
+            values = struct.unpack(f"{self.endian}{count}{fmt}", data)
+
+        return values[0] if count == 1 else values
+
+
+def _photoshop_iptc_records(data: bytes) -> Optional[bytes]:
+    """
+    Returns the IPTC-NAA resource from a block of Photoshop "8BIM" image resources.
+    """
+    offset = 0
+    while offset + 12 <= len(data) and data[offset : offset + 4] == b"8BIM":
+        (resource_id,) = struct.unpack(">H", data[offset + 4 : offset + 6])
+        # The resource name is a Pascal string padded to an even length.
+        name_length = data[offset + 6]
+        offset += 6 + name_length + 1 + ((name_length + 1) % 2)
+        (size,) = struct.unpack(">L", data[offset : offset + 4])
+        offset += 4
+        if resource_id == PHOTOSHOP_IPTC_RESOURCE:
+            return data[offset : offset + size]
+        offset += size + (size % 2)
+    return None
+
+
+def _parse_iim(data: bytes, iptc: dict = None) -> dict:
+    """
+    Parses IPTC-IIM records into a dict keyed by (record, dataset), where repeated datasets
+    are collected into a list, like `PIL.IptcImagePlugin.getiptcinfo()` does.
+    """
+    iptc = {} if iptc is None else iptc
+    offset = 0
+    while offset + 5 <= len(data):
+        if data[offset] != 0x1C:
+            break
+        record, dataset, size = struct.unpack(">BBH", data[offset + 1 : offset + 5])
+        offset += 5
+        if size & 0x8000:
+            # Extended dataset: the length is stored in the following `size & 0x7FFF` bytes.
+            length_size = size & 0x7FFF
+            size = int.from_bytes(data[offset : offset + length_size], "big")
+            offset += length_size
+
+        key = (record, dataset)
+        value = data[offset : offset + size]
+        offset += size
+
+        if key not in iptc:
+            iptc[key] = value
+        elif isinstance(iptc[key], list):
+            iptc[key].append(value)
+        else:
+            iptc[key] = [iptc[key], value]
+
+    return iptc
@@ -0,0 +1,299 @@
+"""
+Bulk import of image files into the image model.
+
+Hashing and meta data extraction run in a process pool, duplicates are resolved with one
+query per batch and the images are written with `bulk_create`, so the `pre_save` signal
+isn't involved. For example:
+
+    from wagtailimagecaptions.importer import find_image_files, import_images
+
+    import_images(find_image_files("/archive/photos"), workers=8)
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import chain
+from os.path import basename
+from typing import Callable, Iterable, Optional
+
+from django.core.files import File
+from django.db import connections, router, transaction
+from wagtail.images import get_image_model
+from wagtail.models import Collection
+from wagtail.search import index
+
+from .perceptual import get_hash_algorithm, perceptual_hash_or_none
+from .services import ImageMetadata, apply_metadata, exif_conversion_batch, extract_metadata, hash_file
+from .workers import setup_worker
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".tif", ".tiff", ".png", ".gif", ".webp")
+
+
+@dataclass
+class ScannedFile:
+    path: str
+    file_hash: str = ""
+    file_size: int = 0
+    metadata: Optional[ImageMetadata] = None
+    perceptual_hash: Optional[int] = None
+    perceptual_hash_algorithm: str = ""
+    error: str = ""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    failed: list = field(default_factory=list)
+    # Files whose meta data was found in the meta data cache.
+    cache_hits: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.created + self.skipped + len(self.failed)
+
+
+def find_image_files(source: str, extensions: Iterable[str] = IMAGE_EXTENSIONS) -> list:
+    """
+    Returns the image files to import from `source`, which is either a directory (walked
+    recursively) or a manifest file listing one path per line. Relative paths in a
+    manifest are resolved against the directory of the manifest.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            paths += [os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(tuple(extensions))]
+        return paths
+
+    root = os.path.dirname(os.path.abspath(source))
+    with open(source) as manifest:
+        return [os.path.join(root, line.strip()) for line in manifest if line.strip() and not line.startswith("#")]
+
+
+def scan_file(path: str) -> ScannedFile:
+    """
+    Hashes a file and extracts its meta data. Runs in the worker processes, so errors are
+    returned instead of raised.
+    """
+    try:
+        with open(path, "rb") as f:
+            file_hash = hash_file(f)
+            scanned_file = ScannedFile(
+                path=path,
+                file_hash=file_hash,
+                file_size=os.fstat(f.fileno()).st_size,
+                metadata=extract_metadata(f, exif=_has_exif_fields(), file_hash=file_hash),
+            )
+            if algorithm := get_hash_algorithm():
+                if (value := perceptual_hash_or_none(f, algorithm)) is not None:
+                    scanned_file.perceptual_hash, scanned_file.perceptual_hash_algorithm = value, algorithm
+            return scanned_file
+    except Exception as e:
+        return ScannedFile(path=path, error=f"{type(e).__name__}: {e}")
+
+
+def scan_files(paths: list) -> list:
+    """
+    Scans a chunk of files, sharing the conversion of their EXIF values.
+    """
+    with exif_conversion_batch():
+        return [scan_file(path) for path in paths]
+
+
+def _has_exif_fields() -> bool:
+    return hasattr(get_image_model(), "exif_data")
+
+
+def bulk_create_images(images: list, batch_size: int = None) -> list:
+    """
+    Like `bulk_create`, but also for multi-table inherited image models such as
+    `CaptionedExifImage`, which Django's `bulk_create` refuses: the rows of the root model
+    are bulk created first and the rows of each child table inserted afterwards.
+
+    The child rows need the primary keys of the root rows. On databases which don't return
+    them from bulk inserts (e.g. MySQL), the root rows are inserted one by one instead.
+    """
+    if not images:
+        return images
+
+    ImageModel = type(images[0])
+    db = router.db_for_write(ImageModel)
+    parents = ImageModel._meta.get_parent_list()
+    if not parents:
+        return ImageModel.objects.using(db).bulk_create(images, batch_size=batch_size)
+
+    root = parents[-1]
+    if connections[db].features.can_return_rows_from_bulk_insert:
+        root._base_manager.using(db).bulk_create(images, batch_size=batch_size)
+    else:
+        _insert_one_by_one(root, images, db)
+
+    # Walk down from the root, linking each table to its parent and inserting its rows.
+    for model in [*reversed(parents[:-1]), ImageModel]:
+        for parent, link in model._meta.parents.items():
+            for image in images:
+                setattr(image, link.attname, getattr(image, parent._meta.pk.attname))
+
+        fields = model._meta.local_concrete_fields
+        step = batch_size or len(images)
+        for i in range(0, len(images), step):
+            model._base_manager._insert(images[i : i + step], fields=fields, using=db)
+
+    return images
+
+
+def _insert_one_by_one(model, images: list, db: str):
+    """
+    Inserts the rows of `model` (the root of the image model) one at a time, setting the
+    primary keys, like `Model.save` does.
+    """
+    meta = model._meta
+    fields = [f for f in meta.local_concrete_fields if f is not meta.auto_field]
+    returning_fields = meta.db_returning_fields
+    for image in images:
+        image._prepare_related_fields_for_save(operation_name="bulk_create")
+        row = model._base_manager._insert([image], fields=fields, returning_fields=returning_fields, using=db)[0]
+        for value, returning_field in zip(row, returning_fields):
+            setattr(image, returning_field.attname, value)
+        image._state.adding = False
+        image._state.db = db
+
+
+class ImageImporter:
+    """
+    Imports image files in batches. Each batch is scanned in a process pool, checked for
+    duplicates (by `file_hash`) with a single query and saved with `bulk_create`.
+
+    If a `state_file` is given, the paths of every completed batch are appended to it, and
+    these paths are skipped when the import is started again.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        batch_size: int = 500,
+        state_file: str = None,
+        collection: Collection = None,
+        progress: Callable[[ImportResult, int], None] = None,
+    ):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.state_file = state_file
+        self.collection = collection
+        self.progress = progress
+        self.seen_hashes = set()
+
+    def completed_paths(self) -> set:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return set()
+        with open(self.state_file) as f:
+            return {line.rstrip("\n") for line in f}
+
+    def run(self, paths: Iterable[str]) -> ImportResult:
+        completed = self.completed_paths()
+        paths = [p for p in paths if p not in completed]
+        result = ImportResult()
+
+        # Don't share database connections with the forked workers.
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=setup_worker) as executor:
+            for i in range(0, len(paths), self.batch_size):
+                batch = paths[i : i + self.batch_size]
+                chunksize = max(1, len(batch) // (self.workers * 4))
+                chunks = [batch[j : j + chunksize] for j in range(0, len(batch), chunksize)]
+                self.import_batch(list(chain.from_iterable(executor.map(scan_files, chunks))), result)
+
+                if self.progress:
+                    self.progress(result, len(paths))
+
+        return result
+
+    def import_batch(self, scanned_files: list, result: ImportResult):
+        ImageModel = get_image_model()
+        if self.collection is None:
+            self.collection = Collection.get_first_root_node()
+
+        scanned = []
+        for scanned_file in scanned_files:
+            if scanned_file.error:
+                logger.warning("Could not import %s: %s", scanned_file.path, scanned_file.error)
+                result.failed.append(scanned_file.path)
+            else:
+                scanned.append(scanned_file)
+                result.cache_hits += scanned_file.metadata.cached
+
+        existing = set(
+            ImageModel.objects.filter(file_hash__in={s.file_hash for s in scanned}).values_list("file_hash", flat=True)
+        )
+
+        new_files = []
+        skipped = 0
+        for scanned_file in scanned:
+            if scanned_file.file_hash in existing or scanned_file.file_hash in self.seen_hashes:
+                skipped += 1
+            else:
+                self.seen_hashes.add(scanned_file.file_hash)
+                new_files.append(scanned_file)
+
+        # The files are stored before their rows are created, so remove them again should
+        # the batch fail, instead of leaving them behind (and storing them again, under
+        # another name, when the import is resumed).
+        images = []
+        try:
+            for scanned_file in new_files:
+                images.append(self.build_image(ImageModel, scanned_file))
+
+            with transaction.atomic():
+                bulk_create_images(images)
+                for image in images:
+                    index.insert_or_update_object(image)
+        except Exception:
+            self.seen_hashes.difference_update(scanned_file.file_hash for scanned_file in new_files)
+            delete_stored_files(images)
+            raise
+
+        result.skipped += skipped
+        result.created += len(images)
+        self.mark_completed([scanned_file.path for scanned_file in scanned])
+
+    def build_image(self, ImageModel, scanned_file: ScannedFile):
+        image = ImageModel(
+            title=basename(scanned_file.path),
+            file_hash=scanned_file.file_hash,
+            file_size=scanned_file.file_size,
+            perceptual_hash=scanned_file.perceptual_hash,
+            perceptual_hash_algorithm=scanned_file.perceptual_hash_algorithm,
+            collection=self.collection,
+        )
+        apply_metadata(image, scanned_file.metadata)
+
+        with open(scanned_file.path, "rb") as f:
+            image.file.save(basename(scanned_file.path), File(f), save=False)
+
+        return image
+
+    def mark_completed(self, paths: list):
+        if self.state_file and paths:
+            with open(self.state_file, "a") as f:
+                f.writelines(f"{path}\n" for path in paths)
+
+
+def delete_stored_files(images: list):
+    for image in images:
+        try:
+            image.file.storage.delete(image.file.name)
+        except Exception as e:
+            logger.warning("Could not delete %s: %s", image.file.name, e)
+
+
+def import_images(paths: Iterable[str], **kwargs) -> ImportResult:
+    """
+    Imports the image files at `paths`. See `ImageImporter` for the keyword arguments.
+    """
+    return ImageImporter(**kwargs).run(paths)
@@ -0,0 +1,230 @@
+"""
+Timing and failure reports for the meta data extraction of uploaded images.
+
+For every image whose meta data is extracted (in the `pre_save` signal, or by a deferred
+backend) an `ExtractionReport` is built, holding the time spent per stage, the bytes read,
+the number of tags found, whether the meta data cache had it and the reason of a failure.
+Reports are handed to the emitters listed in `WAGTIALIMAGECAPTIONS_INSTRUMENTATION_EMITTERS`
+and sent with the `metadata_extracted` signal:
+
+    WAGTIALIMAGECAPTIONS_INSTRUMENTATION_EMITTERS = [
+        "wagtailimagecaptions.instrumentation.LoggingEmitter",
+        "wagtailimagecaptions.instrumentation.StatsdEmitter",
+    ]
+
+Without emitters or signal receivers, no report is built and no timings are taken.
+"""
+
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import Signal, receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Sent with the `report` of every extraction while instrumentation is enabled.
+metadata_extracted = Signal()
+
+_current_report = ContextVar("wagtailimagecaptions_report", default=None)
+_null_stage = nullcontext()
+
+
+@dataclass
+class ExtractionReport:
+    name: str
+    # Stage name -> duration in seconds
+    timings: dict = field(default_factory=dict)
+    bytes_read: int = 0
+    iptc_tags: int = 0
+    exif_tags: int = 0
+    # "hit" or "miss" with a meta data cache configured.
+    cache: str = ""
+    # EXIF tag name -> error of the tags whose values couldn't be converted.
+    conversion_errors: dict = field(default_factory=dict)
+    error: str = ""
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error)
+
+
+class BaseEmitter:
+    def emit(self, report: ExtractionReport):
+        raise NotImplementedError
+
+
+class LoggingEmitter(BaseEmitter):
+    """
+    Logs a line per image to the `wagtailimagecaptions.instrumentation` logger, at INFO
+    level, or WARNING if the extraction failed.
+    """
+
+    def emit(self, report: ExtractionReport):
+        timings = ", ".join(f"{name}={seconds * 1000:.2f}ms" for name, seconds in report.timings.items())
+        if report.failed:
+            logger.warning("Meta data extraction of %s failed: %s (%s)", report.name, report.error, timings)
+        else:
+            logger.info(
+                "Extracted meta data of %s: %s, %d bytes read, %d IPTC tags, %d EXIF tags%s",
+                report.name,
+                timings,
+                report.bytes_read,
+                report.iptc_tags,
+                report.exif_tags,
+                f", cache {report.cache}" if report.cache else "",
+            )
+
+
+class StatsdEmitter(BaseEmitter):
+    """
+    Sends the stage timings, bytes read and tag counts to statsd, using the `statsd` package
+    (`pip install wagtailimagecaptions[statsd]`). The client is configured with
+    `WAGTIALIMAGECAPTIONS_STATSD`, a dict of `StatsClient` arguments.
+    """
+
+    def __init__(self):
+        try:
+            from statsd import StatsClient
+        except ImportError as e:
+            raise ImproperlyConfigured("StatsdEmitter requires the statsd package.") from e
+
+        options = {"prefix": "wagtailimagecaptions", **getattr(settings, "WAGTIALIMAGECAPTIONS_STATSD", {})}
+        self.client = StatsClient(**options)
+
+    def emit(self, report: ExtractionReport):
+        with self.client.pipeline() as pipe:
+            for name, seconds in report.timings.items():
+                pipe.timing(f"metadata.{name}", seconds * 1000)
+            if report.failed:
+                pipe.incr("metadata.failed")
+            else:
+                pipe.incr("metadata.extracted")
+                pipe.incr("metadata.bytes_read", report.bytes_read)
+                pipe.incr("metadata.iptc_tags", report.iptc_tags)
+                pipe.incr("metadata.exif_tags", report.exif_tags)
+                if report.cache:
+                    pipe.incr(f"metadata.cache_{report.cache}")
+                if report.conversion_errors:
+                    pipe.incr("metadata.conversion_errors", len(report.conversion_errors))
+
+
+@lru_cache(maxsize=None)
+def get_emitters() -> tuple:
+    return tuple(
+        import_string(path)() for path in getattr(settings, "WAGTIALIMAGECAPTIONS_INSTRUMENTATION_EMITTERS", [])
+    )
+
+
+@receiver(setting_changed)
+def reset_emitters(setting, **kwargs):
+    if setting in ("WAGTIALIMAGECAPTIONS_INSTRUMENTATION_EMITTERS", "WAGTIALIMAGECAPTIONS_STATSD"):
+        get_emitters.cache_clear()
+
+
+@contextmanager
+def record(name: str):
+    """
+    Builds an `ExtractionReport` for the extraction run in the block, which is emitted when
+    the block exits. Yields None (and does nothing) when instrumentation is disabled.
+    """
+    emitters = get_emitters()
+    if not emitters and not metadata_extracted.has_listeners():
+        yield None
+        return
+
+    report = ExtractionReport(name=name)
+    token = _current_report.set(report)
+    start = time.perf_counter()
+    try:
+        yield report
+    except Exception as e:
+        report.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        report.timings["total"] = time.perf_counter() - start
+        _current_report.reset(token)
+        emit(report, emitters)
+
+
+def emit(report: ExtractionReport, emitters):
+    for emitter in emitters:
+        try:
+            emitter.emit(report)
+        except Exception:
+            logger.exception("Could not emit the meta data extraction report with %s.", type(emitter).__name__)
+    metadata_extracted.send_robust(sender=ExtractionReport, report=report)
+
+
+def current_report():
+    """
+    Returns the report of the extraction in progress, or None if not instrumented.
+    """
+    return _current_report.get()
+
+
+class _Stage:
+    __slots__ = ("report", "name", "start")
+
+    def __init__(self, report: ExtractionReport, name: str):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        timings = self.report.timings
+        timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def stage(name: str):
+    """
+    Returns a context manager adding the time spent in its block to the current report.
+    """
+    report = _current_report.get()
+    return _null_stage if report is None else _Stage(report, name)
+
+
+def failure(reason: str):
+    """
+    Records the reason of a failure that was handled, rather than raised.
+    """
+    if (report := _current_report.get()) is not None:
+        report.error = reason
+
+
+class _CountingReader:
+    """
+    Wraps a binary stream, counting the bytes read into the current report.
+    """
+
+    def __init__(self, fp, report: ExtractionReport):
+        self._fp = fp
+        self._report = report
+
+    def read(self, *args):
+        data = self._fp.read(*args)
+        self._report.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+    def __repr__(self):
+        return repr(self._fp)
+
+
+def count_reads(fp):
+    """
+    Returns `fp` wrapped to count the bytes read when instrumented, else `fp` itself.
+    """
+    report = _current_report.get()
+    return fp if report is None else _CountingReader(fp, report)
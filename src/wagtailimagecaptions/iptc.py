@@ -0,0 +1,105 @@
+"""
+The registry of IPTC-IIM datasets extracted from images. For more information see:
+    https://www.iptc.org/std/IIM/4.2/specification/IIMV4.2.pdf
+
+Additional datasets can be registered with the `WAGTIALIMAGECAPTIONS_IPTC_DATASETS`
+setting, which maps a (record, dataset) tuple to either a field name or a dict of
+`IptcDataset` arguments (where the decoder may be given as a dotted path):
+
+    WAGTIALIMAGECAPTIONS_IPTC_DATASETS = {
+        (2, 15): "category",
+        (2, 20): {"name": "supplemental_categories", "repeatable": True},
+        (2, 101): "country_code",
+    }
+"""
+
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+def decode_text(value):
+    if isinstance(value, bytes):
+        return bytes.decode(value)
+    elif isinstance(value, str):
+        return value
+
+
+@dataclass(frozen=True)
+class IptcDataset:
+    name: str
+    decoder: Callable = decode_text
+    # Repeatable datasets are always returned as a list. For other datasets only the
+    # first value is used, should a file contain more than one.
+    repeatable: bool = False
+
+
+IPTC_DATASETS = {
+    (2, 5): IptcDataset("object_name"),
+    (2, 7): IptcDataset("edit_status"),
+    (2, 25): IptcDataset("keywords", repeatable=True),
+    (2, 30): IptcDataset("release_date"),
+    (2, 35): IptcDataset("release_time"),
+    (2, 37): IptcDataset("expiration_date"),
+    (2, 38): IptcDataset("expiration_time"),
+    (2, 40): IptcDataset("instructions"),
+    (2, 42): IptcDataset("action_advised"),
+    (2, 80): IptcDataset("byline"),
+    (2, 85): IptcDataset("byline_title"),
+    (2, 90): IptcDataset("city"),
+    (2, 92): IptcDataset("sub_location"),
+    (2, 95): IptcDataset("province_state"),
+    (2, 100): IptcDataset("country"),
+    (2, 105): IptcDataset("headline"),
+    (2, 110): IptcDataset("credit"),
+    (2, 116): IptcDataset("copyright_notice"),
+    (2, 120): IptcDataset("caption"),
+    (2, 122): IptcDataset("writer_editor"),
+}
+
+
+@lru_cache(maxsize=None)
+def get_iptc_datasets() -> dict:
+    """
+    Returns the built-in datasets merged with those from `WAGTIALIMAGECAPTIONS_IPTC_DATASETS`.
+    """
+    datasets = dict(IPTC_DATASETS)
+
+    for key, options in getattr(settings, "WAGTIALIMAGECAPTIONS_IPTC_DATASETS", {}).items():
+        if isinstance(options, str):
+            options = {"name": options}
+        if isinstance(decoder := options.get("decoder"), str):
+            options = {**options, "decoder": import_string(decoder)}
+        datasets[tuple(key)] = IptcDataset(**options)
+
+    return datasets
+
+
+@lru_cache(maxsize=None)
+def get_iptc_fingerprint() -> str:
+    """
+    Returns a short digest of the datasets in `get_iptc_datasets`, which is the same across
+    processes and changes when a dataset is added or its name, decoder (including its code)
+    or repetition changes. Part of the meta data cache keys, so results extracted with
+    another registry aren't used.
+    """
+    from .services import _callable_fingerprint
+
+    sha1 = hashlib.sha1()
+    for key, dataset in sorted(get_iptc_datasets().items()):
+        decoder = _callable_fingerprint(dataset.decoder)
+        sha1.update(f"{key}:{dataset.name}:{decoder}:{dataset.repeatable};".encode())
+    return sha1.hexdigest()[:12]
+
+
+@receiver(setting_changed)
+def reset_iptc_datasets(setting, **kwargs):
+    if setting == "WAGTIALIMAGECAPTIONS_IPTC_DATASETS":
+        get_iptc_datasets.cache_clear()
+        get_iptc_fingerprint.cache_clear()
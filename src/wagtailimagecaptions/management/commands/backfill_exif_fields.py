@@ -0,0 +1,90 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.geo import encode_geohash
+from wagtailimagecaptions.models import CaptionedExifImageQuerySet
+from wagtailimagecaptions.services import exif_datetime_original, exif_numeric_values
+
+NUMERIC_FIELDS = CaptionedExifImageQuerySet.numeric_fields
+
+
+class Command(BaseCommand):
+    help = "Fills the numeric EXIF fields, date taken and geohash of existing images from their stored EXIF data and location."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="The number of images processed per chunk.")
+        parser.add_argument(
+            "--only-missing", action="store_true", help="Only process images missing any of the fields."
+        )
+
+    def handle(self, *args, **options):
+        ImageModel = get_image_model()
+        if not hasattr(ImageModel, "exif_data"):
+            raise CommandError(f"{ImageModel.__name__} has no EXIF fields.")
+
+        chunk_size = options["chunk_size"]
+        queryset = ImageModel.objects.with_metadata().only(
+            "pk",
+            "exif_data",
+            "shutter_speed",
+            "focal_length",
+            "iso_rating",
+            "latitude",
+            "longitude",
+            "geohash",
+            "date_time_original",
+            *NUMERIC_FIELDS,
+        )
+        if options["only_missing"]:
+            missing = [(f"{name}__isnull", True) for name in NUMERIC_FIELDS]
+            missing.append(Q(geohash="", latitude__isnull=False, longitude__isnull=False))
+            missing.append(Q(date_time_original__isnull=True, exif_data__has_key="DateTimeOriginal"))
+            queryset = queryset.filter(Q(*missing, _connector=Q.OR))
+
+        processed = updated = 0
+        images = queryset.order_by("pk").iterator(chunk_size=chunk_size)
+        while chunk := list(islice(images, chunk_size)):
+            changed_images = []
+            changed_fields = set()
+            for image in chunk:
+                fields = self.update_image(image)
+                if fields:
+                    changed_images.append(image)
+                    changed_fields.update(fields)
+
+            if changed_images:
+                ImageModel.objects.bulk_update(changed_images, sorted(changed_fields))
+
+            processed += len(chunk)
+            updated += len(changed_images)
+            self.stdout.write(f"Processed {processed} (updated: {updated})")
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} of {processed} images."))
+
+    def update_image(self, image) -> list:
+        """
+        Sets the fields derived from the stored EXIF data and location and returns the
+        fields whose values changed.
+        """
+        # Fall back to the formatted fields, e.g. if the tags aren't kept in exif_data.
+        exif_data = {
+            "ExposureTime": image.shutter_speed,
+            "FocalLength": image.focal_length,
+            "ISOSpeedRatings": image.iso_rating,
+            **(image.exif_data or {}),
+        }
+
+        values = exif_numeric_values(exif_data)
+        values["date_time_original"] = exif_datetime_original(exif_data)
+        if image.latitude is not None and image.longitude is not None:
+            values["geohash"] = encode_geohash(image.latitude, image.longitude)
+
+        changed = []
+        for name, value in values.items():
+            if value is not None and getattr(image, name) != value:
+                setattr(image, name, value)
+                changed.append(name)
+        return changed
@@ -0,0 +1,58 @@
+import json
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.services import filter_exif_data
+
+
+class Command(BaseCommand):
+    help = "Drops the EXIF tags excluded by the EXIF/GPS tag settings from the stored exif_data of existing images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="The number of images processed per chunk.")
+        parser.add_argument("--dry-run", action="store_true", help="Report the bytes saved without writing anything.")
+
+    def handle(self, *args, **options):
+        ImageModel = get_image_model()
+        if not hasattr(ImageModel, "exif_data"):
+            raise CommandError(f"{ImageModel.__name__} has no exif_data field.")
+
+        chunk_size = options["chunk_size"]
+        encoder = ImageModel._meta.get_field("exif_data").encoder
+
+        queryset = (
+            ImageModel.objects.with_metadata().filter(exif_data__isnull=False).only("pk", "exif_data").order_by("pk")
+        )
+        processed = compacted = bytes_before = bytes_after = 0
+
+        images = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(images, chunk_size)):
+            changed_images = []
+            for image in chunk:
+                exif_data = filter_exif_data(image.exif_data)
+                size_before = len(json.dumps(image.exif_data, cls=encoder))
+                size_after = len(json.dumps(exif_data, cls=encoder))
+                bytes_before += size_before
+                bytes_after += size_after
+
+                if exif_data != image.exif_data:
+                    self.stdout.write(f"Image {image.pk}: {size_before} -> {size_after} bytes", self.style.NOTICE)
+                    image.exif_data = exif_data
+                    changed_images.append(image)
+
+            if changed_images and not options["dry_run"]:
+                ImageModel.objects.bulk_update(changed_images, ["exif_data"])
+
+            processed += len(chunk)
+            compacted += len(changed_images)
+
+        saved = bytes_before - bytes_after
+        average = saved // compacted if compacted else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Would compact' if options['dry_run'] else 'Compacted'} {compacted} of {processed} images: "
+                f"{bytes_before} -> {bytes_after} bytes of exif_data ({saved} bytes saved, {average} per compacted image)."
+            )
+        )
@@ -0,0 +1,135 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.perceptual import (
+    ALGORITHMS,
+    HammingIndex,
+    get_hash_algorithm,
+    group_duplicates,
+    perceptual_hash,
+)
+from wagtailimagecaptions.workers import setup_worker, start_workers
+
+
+def hash_stored_image(name: str, algorithm: str):
+    """
+    Returns the perceptual hash of a stored original. Runs in the worker processes, so
+    errors are returned instead of raised.
+    """
+    storage = get_image_model()._meta.get_field("file").storage
+    try:
+        with storage.open(name, "rb") as f:
+            return perceptual_hash(f, algorithm), ""
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+class Command(BaseCommand):
+    help = "Finds groups of near-duplicate images by the Hamming distance of their perceptual hashes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold", type=int, default=6, help="The maximum number of differing bits of near-duplicates."
+        )
+        parser.add_argument(
+            "--compute-missing",
+            action="store_true",
+            help="Hash the images without a perceptual hash (or without a recorded algorithm) first.",
+        )
+        parser.add_argument(
+            "--recompute",
+            action="store_true",
+            help="Hash the images hashed with another algorithm again, with --algorithm.",
+        )
+        parser.add_argument(
+            "--algorithm",
+            choices=ALGORITHMS,
+            default=None,
+            help="The algorithm of the hashes compared (default: WAGTIALIMAGECAPTIONS_PERCEPTUAL_HASH or dhash).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="The number of images hashed per chunk.")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="The number of worker processes (default: CPU count)."
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Write the groups as a JSON list of lists of image IDs."
+        )
+
+    def handle(self, *args, **options):
+        ImageModel = get_image_model()
+        algorithm = options["algorithm"] or get_hash_algorithm() or "dhash"
+
+        # Hashes of different algorithms aren't comparable, so only those of `algorithm` are.
+        missing = Q(perceptual_hash__isnull=True) | Q(perceptual_hash_algorithm="")
+        other = Q(perceptual_hash__isnull=False) & ~Q(perceptual_hash_algorithm__in=["", algorithm])
+        if options["compute_missing"]:
+            self.compute_hashes(ImageModel.objects.filter(missing), algorithm, options)
+        if options["recompute"]:
+            self.compute_hashes(ImageModel.objects.filter(other), algorithm, options)
+
+        if not options["recompute"] and (count := ImageModel.objects.filter(other).count()):
+            self.stderr.write(
+                f"Left out {count} images hashed with another algorithm than {algorithm}, run with --recompute."
+            )
+
+        rows = ImageModel.objects.filter(perceptual_hash_algorithm=algorithm, perceptual_hash__isnull=False)
+        index = HammingIndex.from_rows(rows.values_list("pk", "perceptual_hash").iterator(chunk_size=10000))
+        if not len(index):
+            raise CommandError(f"No images have a {algorithm} perceptual hash, run with --compute-missing.")
+
+        first, second, _ = index.pairs(options["threshold"])
+        groups = group_duplicates(first.tolist(), second.tolist())
+
+        if options["json"]:
+            self.stdout.write(json.dumps(groups))
+            return
+
+        for group in groups:
+            self.stdout.write(", ".join(str(pk) for pk in group))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Found {len(groups)} groups of near-duplicates ({sum(len(group) for group in groups)} images) "
+                f"among {len(index)} images."
+            )
+        )
+
+    def compute_hashes(self, queryset, algorithm: str, options):
+        ImageModel = get_image_model()
+        chunk_size = options["chunk_size"]
+        workers = options["workers"] or os.cpu_count()
+
+        queryset = queryset.only("pk", "file").order_by("pk")
+        hashed = failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as executor:
+            # Fork the workers before the query below opens a connection they'd inherit.
+            start_workers(executor)
+            images = queryset.iterator(chunk_size=chunk_size)
+            while chunk := list(islice(images, chunk_size)):
+                results = executor.map(
+                    partial(hash_stored_image, algorithm=algorithm),
+                    [image.file.name for image in chunk],
+                    chunksize=max(1, len(chunk) // (workers * 4)),
+                )
+
+                changed_images = []
+                for image, (value, error) in zip(chunk, results):
+                    if error:
+                        self.stderr.write(f"Image {image.pk} ({image.file.name}): {error}")
+                        failed += 1
+                    else:
+                        image.perceptual_hash = value
+                        image.perceptual_hash_algorithm = algorithm
+                        changed_images.append(image)
+
+                ImageModel.objects.bulk_update(changed_images, ["perceptual_hash", "perceptual_hash_algorithm"])
+                hashed += len(changed_images)
+
+        self.stderr.write(f"Hashed {hashed} images with {algorithm} ({failed} failed).")
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from wagtail.models import Collection
+
+from wagtailimagecaptions.importer import ImageImporter, find_image_files
+
+
+class Command(BaseCommand):
+    help = "Imports the images in a directory, or listed in a manifest file, into the image model."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source", help="A directory to import recursively, or a manifest file with one path per line."
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None, help="The number of worker processes (default: CPU count)."
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="The number of files saved per batch.")
+        parser.add_argument(
+            "--state-file",
+            default=None,
+            help="A file recording the imported paths. Re-running with the same file resumes the import.",
+        )
+        parser.add_argument("--collection", type=int, default=None, help="The ID of the collection to import into.")
+
+    def handle(self, *args, **options):
+        collection = None
+        if options["collection"]:
+            try:
+                collection = Collection.objects.get(pk=options["collection"])
+            except Collection.DoesNotExist:
+                raise CommandError(f"Collection {options['collection']} does not exist.")
+
+        paths = find_image_files(options["source"])
+        self.stdout.write(f"Found {len(paths)} files.")
+
+        def progress(result, total):
+            self.stdout.write(
+                f"Processed {result.processed}/{total} "
+                f"(created: {result.created}, duplicates: {result.skipped}, failed: {len(result.failed)}, "
+                f"cache hits: {result.cache_hits})"
+            )
+
+        importer = ImageImporter(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            state_file=options["state_file"],
+            collection=collection,
+            progress=progress,
+        )
+        result = importer.run(paths)
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.created} images."))
+        for path in result.failed:
+            self.stderr.write(f"Failed: {path}")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wagtailimagecaptions.deferred import process_queue
+
+
+class Command(BaseCommand):
+    help = "Extracts the meta data of images queued by the deferred DatabaseQueueBackend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="The maximum number of queued images to process.")
+        parser.add_argument(
+            "--max-attempts", type=int, default=3, help="The number of times a failing image is retried."
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling the queue instead of exiting when it's empty."
+        )
+        parser.add_argument("--sleep", type=float, default=5.0, help="The seconds to wait between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_queue(limit=options["limit"], max_attempts=options["max_attempts"])
+            if processed:
+                self.stdout.write(f"Processed {processed} queued images.")
+
+            if not options["loop"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
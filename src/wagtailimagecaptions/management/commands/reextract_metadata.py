@@ -0,0 +1,153 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
+
+from django.core.management.base import BaseCommand
+from django.db import models
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.services import apply_metadata, exif_conversion_batch, extract_metadata, keep_editorial_fields
+from wagtailimagecaptions.workers import setup_worker, start_workers
+
+
+def extract_stored_metadata(name: str, file_hash: str, use_cache: bool = True):
+    """
+    Extracts the meta data of a stored original. Runs in the worker processes, so errors
+    are returned instead of raised.
+    """
+    ImageModel = get_image_model()
+    storage = ImageModel._meta.get_field("file").storage
+    try:
+        with storage.open(name, "rb") as f:
+            exif = hasattr(ImageModel, "exif_data")
+            return extract_metadata(f, exif=exif, file_hash=file_hash, use_cache=use_cache), ""
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def extract_stored_metadata_chunk(names_and_hashes: list, use_cache: bool = True) -> list:
+    """
+    Extracts the meta data of a chunk of stored originals, sharing the conversion of their
+    EXIF values.
+    """
+    with exif_conversion_batch():
+        return [extract_stored_metadata(name, file_hash, use_cache) for name, file_hash in names_and_hashes]
+
+
+class Command(BaseCommand):
+    help = "Extracts the meta data of existing images again, e.g. after a parser fix or when switching image models."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="The number of images processed per chunk.")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="The number of worker processes (default: CPU count)."
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            default=None,
+            help="A file recording the last processed image ID. Re-running with the same file resumes from there.",
+        )
+        parser.add_argument(
+            "--only-missing", action="store_true", help="Only process images without extracted meta data."
+        )
+        parser.add_argument(
+            "--skip-cache", action="store_true", help="Parse all files, instead of using the meta data cache first."
+        )
+        parser.add_argument(
+            "--overwrite-editorial",
+            action="store_true",
+            help="Also overwrite the fields editors curate (title, alt text, caption, credit, ...) with the meta data.",
+        )
+
+    def handle(self, *args, **options):
+        ImageModel = get_image_model()
+        chunk_size = options["chunk_size"]
+        workers = options["workers"] or os.cpu_count()
+        checkpoint_file = options["checkpoint_file"]
+        self.overwrite_editorial = options["overwrite_editorial"]
+
+        queryset = ImageModel.objects.with_metadata().order_by("pk")
+        if options["only_missing"]:
+            if hasattr(ImageModel, "exif_data"):
+                queryset = queryset.filter(exif_data__isnull=True)
+            else:
+                queryset = queryset.filter(iptc_data__isnull=True)
+
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            with open(checkpoint_file) as f:
+                last_pk = int(f.read().strip() or 0)
+            queryset = queryset.filter(pk__gt=last_pk)
+            self.stdout.write(f"Resuming after image {last_pk}.")
+
+        total = queryset.count()
+        processed = updated = failed = cache_hits = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as executor:
+            # Fork the workers before the query below opens a connection they'd inherit.
+            start_workers(executor)
+            images = queryset.iterator(chunk_size=chunk_size)
+            while chunk := list(islice(images, chunk_size)):
+                # An empty hash lets extract_metadata hash the file.
+                names_and_hashes = [(image.file.name, image.file_hash or None) for image in chunk]
+                step = max(1, len(chunk) // (workers * 4))
+                results = chain.from_iterable(
+                    executor.map(
+                        partial(extract_stored_metadata_chunk, use_cache=not options["skip_cache"]),
+                        [names_and_hashes[i : i + step] for i in range(0, len(names_and_hashes), step)],
+                    )
+                )
+
+                changed_images = []
+                changed_fields = set()
+                for image, (metadata, error) in zip(chunk, results):
+                    if error:
+                        self.stderr.write(f"Image {image.pk} ({image.file.name}): {error}")
+                        failed += 1
+                        continue
+                    cache_hits += metadata.cached
+
+                    fields = self.update_image(image, metadata)
+                    if fields:
+                        changed_images.append(image)
+                        changed_fields.update(fields)
+
+                if changed_images:
+                    ImageModel.objects.bulk_update(changed_images, sorted(changed_fields))
+
+                processed += len(chunk)
+                updated += len(changed_images)
+                if checkpoint_file:
+                    with open(checkpoint_file, "w") as f:
+                        f.write(str(chunk[-1].pk))
+
+                self.stdout.write(
+                    f"Processed {processed}/{total} (updated: {updated}, failed: {failed}, cache hits: {cache_hits})"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} of {processed} images."))
+
+    def update_image(self, image, metadata) -> list:
+        """
+        Applies the extracted meta data to the image and returns the fields whose values
+        changed. The fields editors may have curated since the upload are kept, unless
+        --overwrite-editorial is given.
+        """
+        before = {field.attname: getattr(image, field.attname) for field in image._meta.concrete_fields}
+        image.metadata_pending = False
+        fields = ["metadata_pending", *apply_metadata(image, metadata)]
+        if not self.overwrite_editorial:
+            fields = keep_editorial_fields(image, before, fields)
+        return [name for name in fields if self.db_value(image, name) != before[name]]
+
+    def db_value(self, image, name: str):
+        """
+        Returns the value of a field as it would be read back from the database, so that
+        e.g. datetimes in JSON fields compare equal to their stored ISO strings.
+        """
+        field = image._meta.get_field(name)
+        value = getattr(image, name)
+        if isinstance(field, models.JSONField):
+            return json.loads(json.dumps(value, cls=field.encoder))
+        return value
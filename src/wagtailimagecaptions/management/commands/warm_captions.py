@@ -0,0 +1,34 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.captions import warm_captions
+
+
+class Command(BaseCommand):
+    help = "Renders the captions of images into the cache, e.g. after a deploy or cache flush."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="The IDs of the images to render (default: all).")
+        parser.add_argument("--recent", type=int, default=None, help="Only render the captions of the N newest images.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="The number of images rendered per chunk.")
+        parser.add_argument("--force", action="store_true", help="Render captions again, even if cached.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        queryset = get_image_model().objects.exclude(caption__isnull=True).exclude(caption="").only("pk", "caption")
+        if options["ids"]:
+            queryset = queryset.filter(pk__in=options["ids"])
+        queryset = queryset.order_by("-created_at")
+        if options["recent"]:
+            queryset = queryset[: options["recent"]]
+
+        processed = rendered = 0
+        images = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(images, chunk_size)):
+            rendered += warm_captions(chunk, force=options["force"])
+            processed += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} of {processed} captions."))
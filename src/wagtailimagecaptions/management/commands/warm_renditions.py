@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from wagtail.images import get_image_model
+from wagtail.images.exceptions import InvalidFilterSpecError
+from wagtail.images.models import Filter
+
+from wagtailimagecaptions.renditions import find_missing_renditions, generate_renditions, get_prewarm_specs
+from wagtailimagecaptions.workers import setup_worker
+
+
+class Command(BaseCommand):
+    help = "Generates the missing renditions of images in parallel, skipping the ones that already exist."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="The IDs of the images (default: all).")
+        parser.add_argument(
+            "--spec",
+            action="append",
+            dest="specs",
+            help="A filter spec to generate, e.g. fill-300x200 (repeatable, default: WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS).",
+        )
+        parser.add_argument("--recent", type=int, default=None, help="Only generate renditions of the N newest images.")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="The number of worker processes (default: CPU count)."
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="The number of images checked per query.")
+
+    def handle(self, *args, **options):
+        specs = options["specs"] or get_prewarm_specs()
+        if not specs:
+            raise CommandError("No filter specs given and WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS is empty.")
+        for spec in specs:
+            try:
+                Filter(spec=spec).operations
+            except InvalidFilterSpecError as e:
+                raise CommandError(f"Invalid filter spec {spec!r}: {e}")
+        chunk_size = options["chunk_size"]
+
+        queryset = get_image_model().objects.order_by("-created_at")
+        if options["ids"]:
+            queryset = queryset.filter(pk__in=options["ids"])
+        if options["recent"]:
+            queryset = queryset[: options["recent"]]
+
+        # Find the missing renditions up front, so the workers only get images with work to do.
+        processed = 0
+        missing = {}
+        images = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(images, chunk_size)):
+            missing.update(find_missing_renditions(chunk, specs))
+            processed += len(chunk)
+
+        # Don't share database connections with the forked workers.
+        connections.close_all()
+
+        generated = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=setup_worker) as executor:
+            results = executor.map(generate_renditions, missing, missing.values())
+            for image_id, (count, error) in zip(missing, results):
+                generated += count
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Image {image_id}: {error}")
+
+        skipped = processed * len(specs) - sum(len(image_specs) for image_specs in missing.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {generated} renditions of {len(missing)} images, {skipped} already existed, {failed} images failed."
+            )
+        )
@@ -0,0 +1,199 @@
+"""
+A cache of extracted meta data, keyed by the content hash of the file.
+
+Re-uploading a file, reprocessing it in another environment or re-extracting the meta data
+of existing images parses the same bytes again. With a cache configured,
+`services.extract_metadata` looks the file's `file_hash` (and the parser version, see
+`services.PARSER_VERSION`) up first:
+
+    # A Django cache, by alias (OPTIONS: alias, timeout).
+    WAGTIALIMAGECAPTIONS_METADATA_CACHE = "wagtailimagecaptions.metadata_cache.DjangoCacheBackend"
+
+    # A local SQLite file, shared by the processes of a host (OPTIONS: path, required).
+    WAGTIALIMAGECAPTIONS_METADATA_CACHE = "wagtailimagecaptions.metadata_cache.SQLiteBackend"
+    WAGTIALIMAGECAPTIONS_METADATA_CACHE_OPTIONS = {"path": "/var/cache/wagtail/metadata.sqlite3"}
+
+    # The memory of each process, evicting the least recently used entries beyond
+    # `max_bytes` (OPTIONS: max_bytes, default 64 MB).
+    WAGTIALIMAGECAPTIONS_METADATA_CACHE = "wagtailimagecaptions.metadata_cache.LRUBackend"
+
+The cache is best-effort: a backend which fails (e.g. an unreachable cache server or an
+unwritable file) is logged and counted in `stats.errors`, and the file is parsed as if
+nothing were cached. Each backend counts its hits and misses in `stats` as well.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class BaseMetadataCache:
+    """
+    Backends implement `_get` and `_set`, which may raise: `get` and `set` log and count
+    the errors instead.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        """
+        Returns the meta data cached under `key`, or None (also if the lookup failed).
+        """
+        try:
+            metadata = self._get(key)
+        except Exception:
+            logger.warning("Could not look up %s in the %s meta data cache.", key, type(self).__name__, exc_info=True)
+            self.stats.errors += 1
+            return None
+
+        if metadata is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return metadata
+
+    def set(self, key: str, metadata):
+        """
+        Caches the meta data under `key`, if the backend can.
+        """
+        try:
+            self._set(key, metadata)
+        except Exception:
+            logger.warning("Could not store %s in the %s meta data cache.", key, type(self).__name__, exc_info=True)
+            self.stats.errors += 1
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    def _set(self, key: str, metadata):
+        raise NotImplementedError
+
+
+class DjangoCacheBackend(BaseMetadataCache):
+    def __init__(self, alias: str = DEFAULT_CACHE_ALIAS, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.alias = alias
+        self.timeout = timeout
+
+    def _get(self, key: str):
+        return caches[self.alias].get(key)
+
+    def _set(self, key: str, metadata):
+        caches[self.alias].set(key, metadata, self.timeout)
+
+
+class SQLiteBackend(BaseMetadataCache):
+    """
+    Stores the meta data pickled in a table of an SQLite file. Connections are opened per
+    thread and process, so the backend can be used by thread and process pools alike.
+
+    The `path` is required: a default relative to the working directory would put the file
+    wherever the web server or worker happens to be started.
+    """
+
+    def __init__(self, path: str = None):
+        super().__init__()
+        if not path:
+            raise ImproperlyConfigured(
+                "The SQLiteBackend metadata cache requires a path in WAGTIALIMAGECAPTIONS_METADATA_CACHE_OPTIONS."
+            )
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # A connection inherited by a forked process mustn't be used there.
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def _get(self, key: str):
+        row = self.connection.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _set(self, key: str, metadata):
+        value = pickle.dumps(metadata, pickle.HIGHEST_PROTOCOL)
+        self.connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, value))
+
+
+class LRUBackend(BaseMetadataCache):
+    """
+    Keeps the meta data pickled in memory, so its size is known and callers can't change
+    the cached values, and evicts the least recently used entries beyond `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str):
+        with self._lock:
+            if (value := self._entries.get(key)) is None:
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def _set(self, key: str, metadata):
+        value = pickle.dumps(metadata, pickle.HIGHEST_PROTOCOL)
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            if (previous := self._entries.pop(key, None)) is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+@lru_cache(maxsize=None)
+def get_metadata_cache() -> Optional[BaseMetadataCache]:
+    """
+    Returns the configured cache, or None if extracted meta data isn't cached.
+    """
+    if backend := getattr(settings, "WAGTIALIMAGECAPTIONS_METADATA_CACHE", None):
+        return import_string(backend)(**getattr(settings, "WAGTIALIMAGECAPTIONS_METADATA_CACHE_OPTIONS", {}))
+    return None
+
+
+@receiver(setting_changed)
+def reset_metadata_cache(setting, **kwargs):
+    if setting.startswith("WAGTIALIMAGECAPTIONS_METADATA_CACHE"):
+        get_metadata_cache.cache_clear()
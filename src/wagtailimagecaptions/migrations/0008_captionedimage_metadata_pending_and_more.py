@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0007_alter_captionedexifimage_aperture_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captionedimage",
+            name="metadata_pending",
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text="Whether the meta data of the image still has to be extracted."),
+        ),
+        migrations.CreateModel(
+            name="MetadataExtractionTask",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("image", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="wagtailimagecaptions.captionedimage")),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0008_captionedimage_metadata_pending_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captionedexifimage",
+            name="exposure_time",
+            field=models.FloatField(blank=True, db_index=True, editable=False, help_text="The shutter speed in seconds (e.g. 0.001, 0.0667).", null=True),
+        ),
+        migrations.AddField(
+            model_name="captionedexifimage",
+            name="f_number",
+            field=models.FloatField(blank=True, db_index=True, editable=False, help_text="The aperture as an f-number (e.g. 1.8, 4).", null=True),
+        ),
+        migrations.AddField(
+            model_name="captionedexifimage",
+            name="focal_length_mm",
+            field=models.FloatField(blank=True, db_index=True, editable=False, help_text="The focal length in millimeters (e.g. 33, 200).", null=True),
+        ),
+        migrations.AddField(
+            model_name="captionedexifimage",
+            name="iso",
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, help_text="The ISO rating (e.g. 400, 800).", null=True),
+        ),
+    ]
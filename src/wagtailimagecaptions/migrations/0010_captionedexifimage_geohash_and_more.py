@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0009_captionedexifimage_exposure_time_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captionedexifimage",
+            name="geohash",
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text="The geohash of the latitude and longitude.", max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name="captionedexifimage",
+            index=models.Index(fields=["latitude", "longitude"], name="captionedexifimage_location"),
+        ),
+    ]
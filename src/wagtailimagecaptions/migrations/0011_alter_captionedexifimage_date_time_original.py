@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0010_captionedexifimage_geohash_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="captionedexifimage",
+            name="date_time_original",
+            field=models.DateTimeField(blank=True, db_index=True, help_text="The date and time of creation of the image (EXIF DateTimeOriginal)", null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0011_alter_captionedexifimage_date_time_original"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captionedimage",
+            name="perceptual_hash",
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, help_text="A fingerprint of the image content for finding near-duplicates, see `wagtailimagecaptions.perceptual`.", null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0012_captionedimage_perceptual_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captionedimage",
+            name="perceptual_hash_algorithm",
+            field=models.CharField(blank=True, editable=False, help_text="The algorithm of the perceptual hash.", max_length=10),
+        ),
+    ]
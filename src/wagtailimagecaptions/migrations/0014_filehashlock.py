@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+def create_lock_rows(apps, schema_editor):
+    FileHashLock = apps.get_model("wagtailimagecaptions", "FileHashLock")
+    FileHashLock.objects.bulk_create([FileHashLock(bucket=f"{i:02x}") for i in range(256)], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wagtailimagecaptions", "0013_captionedimage_perceptual_hash_algorithm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileHashLock",
+            fields=[
+                ("bucket", models.CharField(max_length=2, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunPython(create_lock_rows, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,20 @@
 import json
-import os
+import math
 import uuid
 from datetime import datetime
 
 from django.conf import settings
 from django.db import models
-from django.utils import timezone
-from wagtail.coreutils import string_to_ascii
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt, Substr, Trunc
 from wagtail.fields import RichTextField
-from wagtail.images.models import AbstractImage, AbstractRendition, Image
+from wagtail.images.models import AbstractImage, AbstractRendition, Image, ImageQuerySet
 from wagtail.search import index
 
+from .geo import EARTH_RADIUS_KM, GEOHASH_PRECISION, bounding_box, geohash_range
+from .services import hash_file
+from .uploads import get_image_upload_to, get_rendition_upload_to
+
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, o):
@@ -21,6 +25,30 @@ class DateTimeEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
+class CaptionedImageQuerySet(ImageQuerySet):
+    def with_metadata(self):
+        """
+        Loads the `iptc_data` and `exif_data` fields, which are deferred by default.
+        """
+        return self.defer(None)
+
+
+class CaptionedImageManager(models.Manager.from_queryset(CaptionedImageQuerySet)):
+    """
+    Defers the meta data JSON fields, which listings and templates don't use, unless
+    `WAGTIALIMAGECAPTIONS_DEFER_METADATA` is set to False. Deferred fields are still loaded
+    (with a query per image) when accessed, so use `with_metadata()` when they are needed.
+    """
+
+    metadata_fields = ("iptc_data", "exif_data")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(settings, "WAGTIALIMAGECAPTIONS_DEFER_METADATA", True):
+            queryset = queryset.defer(*[name for name in self.metadata_fields if hasattr(self.model, name)])
+        return queryset
+
+
 class CaptionedImage(AbstractImage):
     uuid = models.UUIDField(db_index=True, default=uuid.uuid4, editable=False)
     alt = models.CharField(
@@ -50,6 +78,27 @@ class CaptionedImage(AbstractImage):
         help_text="Any necessary copyright notice(s).",
     )
     iptc_data = models.JSONField(null=True, blank=True)
+    metadata_pending = models.BooleanField(
+        default=False,
+        db_index=True,
+        editable=False,
+        help_text="Whether the meta data of the image still has to be extracted.",
+    )
+    perceptual_hash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="A fingerprint of the image content for finding near-duplicates, see `wagtailimagecaptions.perceptual`.",
+    )
+    perceptual_hash_algorithm = models.CharField(
+        max_length=10,
+        blank=True,
+        editable=False,
+        help_text="The algorithm of the perceptual hash.",
+    )
+
+    objects = CaptionedImageManager()
 
     admin_form_fields = Image.admin_form_fields + (
         "credit",
@@ -65,38 +114,37 @@ class CaptionedImage(AbstractImage):
         index.SearchField("caption"),
     ]
 
+    @property
+    def rendered_caption(self) -> str:
+        """The caption rendered like `{{ image.caption|richtext }}`, cached."""
+        from .captions import render_caption
+
+        return render_caption(self)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # Render the caption again on its next use, e.g. when links in it have changed.
+        if "caption" not in self.get_deferred_fields():
+            from .captions import invalidate_caption
+
+            invalidate_caption(self)
+
+    @property
     def default_alt_text(self):
         """Return our stored alt value, otherwise Wagtail defaults to the title."""
         if self.alt:
             return self.alt
         return super().default_alt_text
 
-    def get_upload_to(self, filename):
-        """Overrides the `get_upload_to` method to include set date paths."""
-        folder_name = "original_images"
-
-        if hasattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH") and settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH:
-            now = timezone.now()
-            date_path = now.strftime(settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH)
-            folder_name = os.path.join(folder_name, date_path)
-
-        # ...now continue with Wagtail source.
-        filename = self.file.field.storage.get_valid_name(filename)
+    def _set_file_hash(self):
+        """Hashes the file in chunks, see `wagtailimagecaptions.services.hash_file`."""
+        with self.open_file() as f:
+            self.file_hash = hash_file(f)
 
-        # convert the filename to simple ascii characters and then
-        # replace non-ascii characters in filename with _ , to sidestep issues with filesystem encoding
-        filename = "".join((i if ord(i) < 128 else "_") for i in string_to_ascii(filename))
-
-        # Truncate filename so it fits in the 100 character limit
-        # https://code.djangoproject.com/ticket/9893
-        full_path = os.path.join(folder_name, filename)
-        if len(full_path) >= 95:
-            chars_to_trim = len(full_path) - 94
-            prefix, extension = os.path.splitext(filename)
-            filename = prefix[:-chars_to_trim] + extension
-            full_path = os.path.join(folder_name, filename)
-
-        return full_path
+    def get_upload_to(self, filename):
+        """Overrides the `get_upload_to` method to shard uploads, see `wagtailimagecaptions.uploads`."""
+        return get_image_upload_to(self, filename)
 
 
 class CaptionedRendition(AbstractRendition):
@@ -106,16 +154,141 @@ class CaptionedRendition(AbstractRendition):
         unique_together = (("image", "filter_spec", "focal_point_key"),)
 
     def get_upload_to(self, filename):
-        """Overrides the `get_upload_to` method to include set date paths."""
-        if hasattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH") and settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH:
-            now = timezone.now()
-            date_path = now.strftime(settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH)
-            filename = self.file.field.storage.get_valid_name(filename)
-
-            # Setting 'images' here to remain consistent with the Wagtail method.
-            return os.path.join("images", date_path, filename)
-
-        return super().get_upload_to(filename)
+        """Overrides the `get_upload_to` method to shard uploads, see `wagtailimagecaptions.uploads`."""
+        return get_rendition_upload_to(self, filename)
+
+
+class CaptionedExifImageQuerySet(CaptionedImageQuerySet):
+    # The indexed numeric EXIF fields, which can be filtered on ranges and bucketed.
+    numeric_fields = ("f_number", "exposure_time", "iso", "focal_length_mm")
+
+    def exif_range(self, **ranges):
+        """
+        Filters on ranges of the numeric EXIF fields, given as (min, max) tuples, where
+        either end may be None. Both ends are inclusive. For example:
+
+            CaptionedExifImage.objects.exif_range(iso=(1600, None), f_number=(None, 2))
+        """
+        filters = {}
+        for name, (low, high) in ranges.items():
+            if name not in self.numeric_fields:
+                raise ValueError(f"{name} is not one of {', '.join(self.numeric_fields)}.")
+            if low is not None:
+                filters[f"{name}__gte"] = low
+            if high is not None:
+                filters[f"{name}__lte"] = high
+        return self.filter(**filters)
+
+    def exif_facets(self, field_name: str, buckets: list = None) -> list:
+        """
+        Returns the number of images per value of a field, as a list of (value, count)
+        tuples, leaving out images without a value. With `buckets`, a sorted list of
+        boundaries, the images are counted per [lower, upper) range instead, in a single
+        query, as a list of ((lower, upper), count) tuples.
+        """
+        if buckets is None:
+            queryset = self.exclude(**{f"{field_name}__isnull": True})
+            if isinstance(self.model._meta.get_field(field_name), models.CharField):
+                queryset = queryset.exclude(**{field_name: ""})
+            counts = queryset.order_by(field_name).values_list(field_name).annotate(count=Count("pk"))
+            return list(counts)
+
+        ranges = list(zip(buckets, buckets[1:]))
+        counts = self.aggregate(
+            **{
+                f"bucket_{i}": Count("pk", filter=Q(**{f"{field_name}__gte": low, f"{field_name}__lt": high}))
+                for i, (low, high) in enumerate(ranges)
+            }
+        )
+        return [(bucket, counts[f"bucket_{i}"]) for i, bucket in enumerate(ranges)]
+
+    def within_bbox(self, south: float, west: float, north: float, east: float):
+        """
+        Filters on images located within a bounding box. A box crossing the antimeridian
+        has a west larger than its east.
+        """
+        queryset = self.filter(latitude__gte=south, latitude__lte=north)
+        if west <= east:
+            return queryset.filter(longitude__gte=west, longitude__lte=east)
+        return queryset.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+
+    def near(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Filters on images located within `radius_km` of a location, annotated with their
+        `distance` (in km) and ordered by it. Candidates are selected on the bounding box
+        of the circle first, so the (latitude, longitude) index can be used.
+        """
+        return (
+            self.within_bbox(*bounding_box(latitude, longitude, radius_km))
+            .with_distance(latitude, longitude)
+            .filter(distance__lte=radius_km)
+            .order_by("distance")
+        )
+
+    def with_distance(self, latitude: float, longitude: float):
+        """
+        Annotates the images with their great-circle `distance` (in km) to a location.
+        """
+        latitude_rad = math.radians(latitude)
+        delta_lat = Radians(F("latitude")) - Value(latitude_rad)
+        delta_lon = Radians(F("longitude")) - Value(math.radians(longitude))
+
+        # The haversine formula.
+        a = Power(Sin(delta_lat / 2), 2) + Value(math.cos(latitude_rad)) * Cos(Radians(F("latitude"))) * Power(
+            Sin(delta_lon / 2), 2
+        )
+        return self.annotate(distance=Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0))))
+
+    def taken_between(self, start: datetime = None, end: datetime = None):
+        """
+        Filters on images taken from `start` (inclusive) until `end` (exclusive), where
+        either end may be None. For example, the photos taken in March 2023:
+
+            CaptionedExifImage.objects.taken_between(datetime(2023, 3, 1), datetime(2023, 4, 1))
+        """
+        queryset = self.all()
+        if start is not None:
+            queryset = queryset.filter(date_time_original__gte=start)
+        if end is not None:
+            queryset = queryset.filter(date_time_original__lt=end)
+        return queryset
+
+    def taken_histogram(self, kind: str = "month") -> list:
+        """
+        Returns the number of images taken per "year", "month" or "day" (in the current time
+        zone), as a list of (date, count) tuples, leaving out images without a date.
+        """
+        counts = (
+            self.filter(date_time_original__isnull=False)
+            .annotate(period=Trunc("date_time_original", kind, output_field=models.DateField()))
+            .order_by("period")
+            .values_list("period")
+            # Counting the dates rather than the rows lets the date index cover the query.
+            .annotate(count=Count("date_time_original"))
+        )
+        return list(counts)
+
+    def in_geohash(self, prefix: str):
+        """
+        Filters on images located within a geohash cell.
+        """
+        lowest, highest = geohash_range(prefix)
+        queryset = self.filter(geohash__gte=lowest)
+        return queryset if highest is None else queryset.filter(geohash__lt=highest)
+
+    def geohash_facets(self, precision: int = 5) -> list:
+        """
+        Returns the number of located images per geohash cell of `precision` characters, as
+        a list of (cell, count) tuples, e.g. for clustering markers on a map.
+        """
+        counts = (
+            self.exclude(geohash="")
+            .annotate(cell=Substr("geohash", 1, precision))
+            .order_by("cell")
+            .values_list("cell")
+            .annotate(count=Count("pk"))
+        )
+        return list(counts)
 
 
 class CaptionedExifImage(CaptionedImage):
@@ -125,7 +298,12 @@ class CaptionedExifImage(CaptionedImage):
     """
 
     exif_data = models.JSONField(null=True, blank=True, encoder=DateTimeEncoder)
-    date_time_original = models.DateTimeField(null=True, blank=True, help_text="The date and time of creation of the image (EXIF DateTimeOriginal)")
+    date_time_original = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="The date and time of creation of the image (EXIF DateTimeOriginal)",
+    )
 
     camera_make = models.CharField(
         max_length=255,
@@ -175,6 +353,39 @@ class CaptionedExifImage(CaptionedImage):
         help_text="The ISO rating (e.g. 400 ISO, 800 ISO).",
     )
 
+    # Numeric copies of the exposure settings above, for filtering and faceting.
+    f_number = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="The aperture as an f-number (e.g. 1.8, 4).",
+    )
+
+    exposure_time = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="The shutter speed in seconds (e.g. 0.001, 0.0667).",
+    )
+
+    iso = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="The ISO rating (e.g. 400, 800).",
+    )
+
+    focal_length_mm = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="The focal length in millimeters (e.g. 33, 200).",
+    )
+
     latitude = models.FloatField(
         null=True,
         blank=True,
@@ -187,6 +398,21 @@ class CaptionedExifImage(CaptionedImage):
         help_text="The longitude (e.g. ?).",
     )
 
+    geohash = models.CharField(
+        max_length=GEOHASH_PRECISION,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="The geohash of the latitude and longitude.",
+    )
+
+    objects = CaptionedImageManager.from_queryset(CaptionedExifImageQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="captionedexifimage_location"),
+        ]
+
 
 class CaptionedExifRendition(AbstractRendition):
     "Specialized redition for the CaptionExifImage model"
@@ -197,13 +423,27 @@ class CaptionedExifRendition(AbstractRendition):
         unique_together = (("image", "filter_spec", "focal_point_key"),)
 
     def get_upload_to(self, filename):
-        """Overrides the `get_upload_to` method to include set date paths."""
-        if hasattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH") and settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH:
-            now = timezone.now()
-            date_path = now.strftime(settings.WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH)
-            filename = self.file.field.storage.get_valid_name(filename)
+        """Overrides the `get_upload_to` method to shard uploads, see `wagtailimagecaptions.uploads`."""
+        return get_rendition_upload_to(self, filename)
+
 
-            # Setting 'images' here to remain consistent with the Wagtail method.
-            return os.path.join("images", date_path, filename)
+class MetadataExtractionTask(models.Model):
+    """
+    A queued meta data extraction, used by the database queue backend for deferred
+    extraction. See `wagtailimagecaptions.deferred`.
+    """
+
+    image = models.ForeignKey(CaptionedImage, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+
+class FileHashLock(models.Model):
+    """
+    A lock row per leading byte of the file hashes, locked by `services.imagefiles_to_models`
+    on databases without advisory locks, so concurrent importers can't both create an image
+    of the same file. The rows are created by the migration adding the model.
+    """
 
-        return super().get_upload_to(filename)
+    bucket = models.CharField(max_length=2, primary_key=True)
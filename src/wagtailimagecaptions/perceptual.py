@@ -0,0 +1,325 @@
+"""
+Perceptual hashes for finding near-duplicate images.
+
+The SHA1 `file_hash` only matches identical files. The same photo saved at a different
+JPEG quality or size has a different file hash, but (almost) the same perceptual hash: a
+64 bit fingerprint of a small grey scale thumbnail. Near-duplicates are images whose
+perceptual hashes differ in only a few bits.
+
+Hashing needs NumPy (`pip install wagtailimagecaptions[perceptual]`) and is enabled by
+setting the algorithm, one of "ahash", "dhash" (the default of `perceptual_hash`) and
+"phash":
+
+    WAGTIALIMAGECAPTIONS_PERCEPTUAL_HASH = "dhash"
+
+New images are then hashed on upload and import, and the `find_duplicates` command
+groups near-duplicates. In Python, `HammingIndex` finds the images near a hash:
+
+    index = HammingIndex(hashes, ids)
+    index.query(perceptual_hash(f), threshold=6)  # [(id, distance), ...]
+
+Hashes are stored as signed 64 bit integers, so they fit a `BigIntegerField`, next to the
+algorithm that computed them: hashes of different algorithms are never compared.
+"""
+
+import logging
+from functools import lru_cache
+from itertools import combinations
+from typing import Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image as PILImage
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+ALGORITHMS = ("ahash", "dhash", "phash")
+
+# The maximum number of candidate pairs compared at once by `HammingIndex.pairs`.
+PAIR_BLOCK_SIZE = 1 << 22
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImproperlyConfigured("Perceptual hashing requires the numpy package.") from e
+    return numpy
+
+
+def get_hash_algorithm() -> Optional[str]:
+    return getattr(settings, "WAGTIALIMAGECAPTIONS_PERCEPTUAL_HASH", None)
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & HASH_MASK).count("1")
+
+
+def _thumbnail(file, width: int, height: int):
+    np = _numpy()
+    # Leave the file where it was, for the meta data extraction reading it as well.
+    position = file.tell()
+    file.seek(0)
+    try:
+        image = PILImage.open(file)
+        # Let JPEGs decode at a fraction of their size, which is plenty for a thumbnail.
+        image.draft("L", (width * 4, height * 4))
+        image = image.convert("L").resize((width, height), PILImage.Resampling.LANCZOS)
+    finally:
+        file.seek(position)
+    return np.asarray(image, dtype=np.float64)
+
+
+def _bits_to_int(bits) -> int:
+    np = _numpy()
+    return to_signed(int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big"))
+
+
+def ahash(file) -> int:
+    """Whether each pixel of an 8x8 thumbnail is brighter than the mean."""
+    pixels = _thumbnail(file, 8, 8)
+    return _bits_to_int(pixels > pixels.mean())
+
+
+def dhash(file) -> int:
+    """Whether each pixel of a 9x8 thumbnail is brighter than its left neighbour."""
+    pixels = _thumbnail(file, 9, 8)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size: int):
+    np = _numpy()
+    k = np.arange(size)
+    return np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+
+
+def phash(file) -> int:
+    """Whether each of the 8x8 lowest frequencies of a 32x32 thumbnail is above their median."""
+    np = _numpy()
+    dct = _dct_matrix(32)
+    frequencies = (dct @ _thumbnail(file, 32, 32) @ dct.T)[:8, :8]
+    return _bits_to_int(frequencies > np.median(frequencies))
+
+
+def perceptual_hash(file, algorithm: str = "dhash") -> int:
+    """
+    Returns the perceptual hash of an image file, as a signed 64 bit integer.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown perceptual hash algorithm {algorithm!r}, expected one of {ALGORITHMS}.")
+    return globals()[algorithm](file)
+
+
+def perceptual_hash_or_none(file, algorithm: str) -> Optional[int]:
+    """
+    Like `perceptual_hash`, but returns None (and logs why) for files which can't be
+    decoded, so a broken image doesn't fail its upload or import.
+    """
+    try:
+        return perceptual_hash(file, algorithm)
+    except ImproperlyConfigured:
+        raise
+    except Exception as e:
+        logger.warning(
+            "Could not compute the perceptual hash of %s: %s: %s", getattr(file, "name", file), type(e).__name__, e
+        )
+        return None
+
+
+def set_perceptual_hash(image, file=None) -> list:
+    """
+    Sets the perceptual hash of an image, and the algorithm used, if enabled by
+    WAGTIALIMAGECAPTIONS_PERCEPTUAL_HASH. Returns the names of the fields that were set.
+    """
+    if not (algorithm := get_hash_algorithm()):
+        return []
+    if (value := perceptual_hash_or_none(file or image.file, algorithm)) is None:
+        return []
+    image.perceptual_hash = value
+    image.perceptual_hash_algorithm = algorithm
+    return ["perceptual_hash", "perceptual_hash_algorithm"]
+
+
+@lru_cache(maxsize=None)
+def _byte_bit_counts():
+    np = _numpy()
+    return np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int, radius: int) -> tuple:
+    """All values of `bits` bits with at most `radius` bits set."""
+    return tuple(
+        sum(1 << bit for bit in flipped) for count in range(radius + 1) for flipped in combinations(range(bits), count)
+    )
+
+
+class HammingIndex:
+    """
+    Finds hashes within a Hamming distance of each other, with multi-index hashing: the 64
+    bit hashes are split into `chunks` parts, and two hashes within distance `r` have at
+    least one part within distance `r // chunks`. Each part is kept sorted, so candidates
+    are found by looking up the part and its variants with up to `r // chunks` bits
+    flipped, and only the candidates are compared in full.
+
+    Everything is kept in NumPy arrays, about 40 bytes per hash with the default of 4
+    parts (plus 2 MB of lookup tables), so millions of hashes fit in memory. Lookups are
+    fastest for the thresholds of near-duplicates (up to about 8 bits); the number of
+    variants to look up grows quickly beyond that.
+    """
+
+    def __init__(self, hashes: Sequence[int], ids: Sequence[int] = None, chunks: int = 4):
+        np = _numpy()
+        if HASH_BITS % chunks:
+            raise ValueError(f"The number of chunks must divide {HASH_BITS}.")
+
+        self.hashes = np.ascontiguousarray(np.asarray(hashes, dtype=np.int64)).view(np.uint64)
+        self.ids = np.arange(len(self.hashes)) if ids is None else np.asarray(ids, dtype=np.int64)
+        if len(self.ids) != len(self.hashes):
+            raise ValueError("The number of hashes and IDs differ.")
+
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        dtype = np.min_scalar_type((1 << self.chunk_bits) - 1)
+        index_dtype = np.int32 if len(self.hashes) < 2**31 else np.int64
+
+        # Per part: its values sorted, and the positions of the hashes in that order.
+        self.parts = []
+        # Per part of up to 16 bits: where each possible value starts in the sorted values,
+        # so lookups are a gather instead of a binary search.
+        self.bounds = []
+        for chunk in range(chunks):
+            values = self._part(self.hashes, chunk).astype(dtype)
+            order = np.argsort(values, kind="stable").astype(index_dtype)
+            self.parts.append((values[order], order))
+            if self.chunk_bits <= 16:
+                self.bounds.append(np.searchsorted(values[order], np.arange((1 << self.chunk_bits) + 1)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], **kwargs):
+        """
+        Builds an index from `(id, hash)` rows, e.g. a `values_list("pk", "perceptual_hash")`
+        iterator, without a Python object per row.
+        """
+        np = _numpy()
+        array = np.fromiter(rows, dtype=[("id", np.int64), ("hash", np.int64)])
+        return cls(array["hash"], array["id"], **kwargs)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _part(self, values, chunk: int):
+        np = _numpy()
+        shift = np.uint64(chunk * self.chunk_bits)
+        return (values >> shift) & np.uint64((1 << self.chunk_bits) - 1)
+
+    def _ranges(self, chunk: int, keys) -> tuple:
+        """The start and end positions of `keys` in the sorted values of a part."""
+        np = _numpy()
+        if self.bounds:
+            bounds = self.bounds[chunk]
+            return bounds[keys], bounds[keys.astype(np.int64) + 1]
+        values = self.parts[chunk][0]
+        return np.searchsorted(values, keys, "left"), np.searchsorted(values, keys, "right")
+
+    def _distances(self, a, b):
+        np = _numpy()
+        differing = np.atleast_1d(np.bitwise_xor(a, b))
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(differing)
+        # NumPy < 2.0: count the bits per byte.
+        return _byte_bit_counts()[np.ascontiguousarray(differing).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+    def query(self, value: int, threshold: int) -> list:
+        """
+        Returns the `(id, distance)` of the hashes within `threshold` bits of `value`,
+        closest first.
+        """
+        np = _numpy()
+        value = value & HASH_MASK
+        masks = _flip_masks(self.chunk_bits, threshold // self.chunks)
+
+        candidates = []
+        for chunk, (values, order) in enumerate(self.parts):
+            part = (value >> (chunk * self.chunk_bits)) & ((1 << self.chunk_bits) - 1)
+            keys = np.array([part ^ mask for mask in masks], dtype=values.dtype)
+            starts, ends = self._ranges(chunk, keys)
+            candidates += [order[start:end] for start, end in zip(starts, ends) if end > start]
+        if not candidates:
+            return []
+
+        positions = np.unique(np.concatenate(candidates))
+        distances = self._distances(self.hashes[positions], np.uint64(value))
+        close = distances <= threshold
+        positions, distances = positions[close], distances[close]
+        by_distance = np.argsort(distances, kind="stable")
+        return list(zip(self.ids[positions[by_distance]].tolist(), distances[by_distance].tolist()))
+
+    def pairs(self, threshold: int) -> tuple:
+        """
+        Returns all pairs of hashes within `threshold` bits of each other as three arrays:
+        the IDs of the first and second images and their distance.
+        """
+        np = _numpy()
+        found = []
+        for chunk, (values, order) in enumerate(self.parts):
+            for mask in _flip_masks(self.chunk_bits, threshold // self.chunks):
+                # The range of sorted positions with the part of each position flipped by `mask`.
+                starts, ends = self._ranges(chunk, values ^ np.array(mask, dtype=values.dtype))
+                counts = (ends - starts).astype(np.int64)
+
+                # Expand the ranges to candidate pairs, in blocks to bound the memory used.
+                cumulative = np.cumsum(counts)
+                block_start = 0
+                while block_start < len(values):
+                    limit = (cumulative[block_start - 1] if block_start else 0) + PAIR_BLOCK_SIZE
+                    block_end = max(block_start + 1, int(np.searchsorted(cumulative, limit, "right")))
+                    block = slice(block_start, block_end)
+                    block_counts = counts[block]
+                    total = int(block_counts.sum())
+                    if total:
+                        offsets = np.arange(total) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+                        first = order[np.repeat(np.arange(block_start, block_end), block_counts)]
+                        second = order[np.repeat(starts[block], block_counts) + offsets]
+                        keep = first < second
+                        first, second = first[keep], second[keep]
+                        distances = self._distances(self.hashes[first], self.hashes[second])
+                        close = distances <= threshold
+                        found.append(first[close].astype(np.int64) * len(self) + second[close])
+                    block_start = block_end
+
+        pairs = np.unique(np.concatenate(found)) if found else np.array([], dtype=np.int64)
+        first, second = pairs // len(self), pairs % len(self)
+        return self.ids[first], self.ids[second], self._distances(self.hashes[first], self.hashes[second])
+
+
+def group_duplicates(first: Sequence[int], second: Sequence[int]) -> list:
+    """
+    Joins pairs of near-duplicate IDs into groups (transitively), returning the groups of
+    two or more sorted IDs, largest first.
+    """
+    parents = {}
+
+    def find(x):
+        parents.setdefault(x, x)
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    for a, b in zip(first, second):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for x in parents:
+        groups.setdefault(find(x), []).append(x)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
@@ -0,0 +1,246 @@
+"""
+Renditions and captions of many images at once, for pages rendering lists of images.
+
+`get_image_bundles` fetches the renditions of all images in one query, instead of a query
+per image and filter spec, creates the missing ones and returns an `ImageBundle` per image
+with its renditions and caption meta data:
+
+    bundles = get_image_bundles(images, "fill-300x200", large="width-1200")
+    bundles[0].renditions["fill-300x200"].url, bundles[0].renditions["large"].url
+    bundles[0].alt, bundles[0].rendered_caption, bundles[0].credit, bundles[0].byline
+
+The same is available in templates with the `image_bundles` tag of
+`wagtailimagecaptions_tags`.
+
+Renditions can also be generated ahead of the first page view: those listed in
+`WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS` are generated right after an image is uploaded,
+in the web process by default, or in a pool of `WAGTIALIMAGECAPTIONS_RENDITION_WORKERS`
+processes. The `warm_renditions` command generates the missing renditions of existing
+images.
+"""
+
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Iterable
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+
+from .workers import setup_worker
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImageBundle:
+    image: object
+    # Name (or filter spec) -> rendition
+    renditions: dict = field(default_factory=dict)
+
+    @property
+    def rendition(self):
+        """The rendition of the first filter spec."""
+        return next(iter(self.renditions.values()), None)
+
+    @property
+    def alt(self) -> str:
+        return getattr(self.image, "alt", "") or self.image.title
+
+    @property
+    def caption(self) -> str:
+        return getattr(self.image, "caption", "") or ""
+
+    @property
+    def rendered_caption(self) -> str:
+        return getattr(self.image, "rendered_caption", "")
+
+    @property
+    def credit(self) -> str:
+        return getattr(self.image, "credit", "")
+
+    @property
+    def byline(self) -> str:
+        return getattr(self.image, "byline", "")
+
+
+def get_image_bundles(images: Iterable, *filter_specs: str, **named_specs: str) -> list:
+    """
+    Returns an `ImageBundle` for each image (skipping empty values), with the renditions of
+    `filter_specs` keyed by spec and those of `named_specs` keyed by name. The existing
+    renditions of all images are fetched with a single query and the missing ones created
+    (in bulk per image).
+    """
+    images = [image for image in images if image]
+    specs = {**{spec: spec for spec in filter_specs}, **named_specs}
+    if not images or not specs:
+        return [ImageBundle(image) for image in images]
+
+    filters = {spec: Filter(spec=spec) for spec in dict.fromkeys(specs.values())}
+    Rendition = images[0].get_rendition_model()
+
+    # Find the existing renditions of all images at once.
+    existing = defaultdict(list)
+    image_ids = {image.pk for image in images}
+    for rendition in Rendition.objects.filter(image_id__in=image_ids, filter_spec__in=list(filters)):
+        existing[rendition.image_id].append(rendition)
+
+    bundles = []
+    found_by_image = {}
+    cache_additions = {}
+    for image in images:
+        if image.pk not in found_by_image:
+            found = {}
+            for rendition in existing[image.pk]:
+                filter = filters[rendition.filter_spec]
+                if rendition.focal_point_key == filter.get_cache_key(image):
+                    # Saves a query per rendition when its image is accessed, e.g. for the alt text.
+                    rendition.image = image
+                    found[rendition.filter_spec] = rendition
+
+            missing = [filter for spec, filter in filters.items() if spec not in found]
+            for filter, rendition in image.create_renditions(*missing).items():
+                found[filter.spec] = rendition
+                cache_additions[Rendition.construct_cache_key(image, filter.get_cache_key(image), filter.spec)] = (
+                    rendition
+                )
+
+            found_by_image[image.pk] = found
+
+        found = found_by_image[image.pk]
+        # Let later `{% image %}` tags for these specs find the renditions as well.
+        if image._get_prefetched_renditions() is None:
+            image.prefetched_renditions = list(found.values())
+
+        bundles.append(ImageBundle(image, {name: found[spec] for name, spec in specs.items()}))
+
+    if cache_additions:
+        Rendition.cache_backend.set_many(cache_additions)
+
+    return bundles
+
+
+def find_missing_renditions(images: Iterable, filter_specs: list) -> dict:
+    """
+    Returns the filter specs of the renditions `images` don't have yet, by image ID, with a
+    single query for the existing renditions. Images with all renditions are left out.
+    """
+    images = list(images)
+    if not images:
+        return {}
+    filters = {spec: Filter(spec=spec) for spec in filter_specs}
+
+    existing = defaultdict(set)
+    Rendition = images[0].get_rendition_model()
+    renditions = Rendition.objects.filter(image_id__in=[image.pk for image in images], filter_spec__in=list(filters))
+    for image_id, spec, focal_point_key in renditions.values_list("image_id", "filter_spec", "focal_point_key"):
+        existing[image_id].add((spec, focal_point_key))
+
+    missing = {}
+    for image in images:
+        specs = [
+            spec for spec, filter in filters.items() if (spec, filter.get_cache_key(image)) not in existing[image.pk]
+        ]
+        if specs:
+            missing[image.pk] = specs
+    return missing
+
+
+def generate_renditions(image_id: int, filter_specs: list) -> tuple:
+    """
+    Generates the missing renditions of an image and returns the number generated and an
+    error message. Runs in the worker processes, so errors are returned instead of raised.
+    """
+    close_old_connections()
+    try:
+        image = get_image_model().objects.get(pk=image_id)
+        filters = [Filter(spec=spec) for spec in filter_specs]
+        missing = [filter for filter in filters if filter not in image.find_existing_renditions(*filters)]
+        image.create_renditions(*missing)
+        return len(missing), ""
+    except Exception as e:
+        return 0, f"{type(e).__name__}: {e}"
+
+
+def get_prewarm_specs() -> list:
+    return list(getattr(settings, "WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS", []))
+
+
+@lru_cache(maxsize=None)
+def get_rendition_pool():
+    """
+    Returns the pool generating renditions of uploaded images, or None if they're generated
+    in the web process (the default). Workers are started (with "spawn", so they don't
+    inherit the connections and threads of the web process) on first use.
+
+    Each web process starts a pool of its own, and each worker imports Django and the
+    project and holds a database connection: size `WAGTIALIMAGECAPTIONS_RENDITION_WORKERS`
+    with the number of web processes in mind.
+    """
+    workers = getattr(settings, "WAGTIALIMAGECAPTIONS_RENDITION_WORKERS", 0)
+    if not workers:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=setup_worker
+    )
+
+
+@receiver(setting_changed)
+def reset_rendition_pool(setting, **kwargs):
+    if setting == "WAGTIALIMAGECAPTIONS_RENDITION_WORKERS":
+        get_rendition_pool.cache_clear()
+
+
+def prewarm_renditions(image_id: int, filter_specs: list = None):
+    """
+    Generates the renditions to pre-warm for an image once the current transaction has been
+    committed.
+    """
+    filter_specs = filter_specs or get_prewarm_specs()
+    if filter_specs:
+        transaction.on_commit(partial(_submit_renditions, image_id, filter_specs))
+
+
+def _submit_renditions(image_id: int, filter_specs: list):
+    # Runs after the image has been committed, so pre-warming must never raise to the caller.
+    if (pool := get_rendition_pool()) is None:
+        _log_result(image_id, generate_renditions(image_id, filter_specs))
+        return
+
+    try:
+        future = pool.submit(generate_renditions, image_id, filter_specs)
+    except (BrokenProcessPool, RuntimeError) as e:
+        # A worker died (or the pool was shut down): start a new pool for the next image.
+        _reset_broken_pool(pool)
+        _log_result(image_id, (0, f"{type(e).__name__}: {e}"))
+    else:
+        future.add_done_callback(partial(_log_future, image_id, pool))
+
+
+def _reset_broken_pool(pool):
+    # Only clear the cached pool if it's still the broken one, not a replacement.
+    if get_rendition_pool.cache_info().currsize and get_rendition_pool() is pool:
+        get_rendition_pool.cache_clear()
+        pool.shutdown(wait=False)
+
+
+def _log_future(image_id: int, pool, future):
+    if (error := future.exception()) is None:
+        _log_result(image_id, future.result())
+        return
+    if isinstance(error, BrokenProcessPool):
+        _reset_broken_pool(pool)
+    _log_result(image_id, (0, f"{type(error).__name__}: {error}"))
+
+
+def _log_result(image_id: int, result: tuple):
+    if error := result[1]:
+        logger.warning("Could not generate the renditions of image %s: %s", image_id, error)
@@ -1,41 +1,645 @@
+import contextvars
 import datetime
 import hashlib
+import io
 import logging
+import os
+import re
+import types
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
 from fractions import Fraction
+from functools import lru_cache, partial
+from itertools import chain
 from os.path import basename
+from typing import Iterable, Optional, Union
 
 import PIL.ExifTags
+from django.conf import settings
+from django.core.files import File
 from django.core.files.images import ImageFile
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
 from PIL import Image as PILImage
 from PIL import TiffImagePlugin
 from PIL.IptcImagePlugin import getiptcinfo
 from wagtail.images import get_image_model
 
+from . import instrumentation
+from .geo import encode_geohash
+from .headers import UnsupportedFormat, read_headers
+from .iptc import get_iptc_datasets, get_iptc_fingerprint
+from .metadata_cache import get_metadata_cache
+from .perceptual import set_perceptual_hash
+from .workers import setup_worker
+
 logger = logging.getLogger(__name__)
 
+# The default number of bytes read at a time when hashing files.
+HASH_BLOCK_SIZE = 64 * 1024
+
+# Part of the meta data cache keys: bump when the output of the parsers changes, so
+# previously cached results aren't used anymore.
+PARSER_VERSION = 2
+
+# How often `imagefiles_to_models` tries to insert images while SQLite is locked.
+INSERT_ATTEMPTS = 3
+
+
+@dataclass
+class ImageMetadata:
+    """
+    The IPTC and EXIF meta data of an image, as returned by `parse_iptc` and `parse_exif`.
+    """
+
+    iptc: dict = field(default_factory=dict)
+    exif: dict = field(default_factory=dict)
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Whether the meta data came from the meta data cache.
+    cached: bool = field(default=False, compare=False)
+
 
 def imagefile_to_model(image_file: ImageFile):
     """
     Converts an ImageFile to our image model.
     """
+    return imagefiles_to_models([image_file])[0]
+
+
+def imagefiles_to_models(image_files: Iterable[ImageFile]) -> list:
+    """
+    Converts ImageFiles to our image model, returning the images in the order of the files.
+    All files are hashed first, existing images are found with a single query and only the
+    missing ones are created. Files with the same content resolve to the same image.
+
+    The missing images are built (see `build_image`) and their files stored first. Only
+    the check for existing images and the inserts are done in a transaction which locks the
+    file hashes (see `_lock_file_hashes`), so concurrent importers don't create the same
+    image twice, without holding the locks while files are parsed and stored. The stored
+    files of images created concurrently in the meantime are deleted again.
+    """
+    from .deferred import get_metadata_backend
+
+    image_files = list(image_files)
+    built = {}
+
+    try:
+        file_hashes = [hash_file(image_file.open(mode="rb")) for image_file in image_files]
+        images = find_images_by_hash(file_hashes)
+
+        missing = {h: f for h, f in zip(file_hashes, image_files) if h not in images}
+        # With a deferred backend, the meta data is extracted after saving as usual.
+        extract = get_metadata_backend() is None
+        for file_hash, image_file in missing.items():
+            image = built[file_hash] = build_image(image_file, file_hash, extract=extract)
+            image.file.save(basename(image_file.name), image_file, save=False)
+
+        if built:
+            images.update(_insert_images(built))
+    finally:
+        for image_file in image_files:
+            image_file.close()
+        for file_hash, image in built.items():
+            if images.get(file_hash) is not image:
+                image.file.delete(save=False)
+
+    return [images[file_hash] for file_hash in file_hashes]
+
+
+def build_image(image_file: ImageFile, file_hash: str, extract: bool = True):
+    """
+    Returns a new (unsaved) image of the file. With `extract`, its meta data (and perceptual
+    hash) is applied up front and flagged as such, so the `pre_save` signal doesn't parse
+    the file again.
+    """
     ImageModel = get_image_model()
+    image = ImageModel(title=basename(image_file.name), file=image_file, file_hash=file_hash)
+    if extract:
+        metadata = extract_metadata(image_file, exif=hasattr(image, "exif_data"), file_hash=file_hash)
+        apply_metadata(image, metadata)
+        set_perceptual_hash(image, image_file)
+        image._metadata_applied = True
+    return image
 
-    with image_file.open(mode="rb") as f:
-        file_hash = hashlib.sha1(f.read()).hexdigest()
 
+def _insert_images(images: dict) -> dict:
+    """
+    Saves the built images of a dict of file hash to image, unless an image with the same
+    hash exists by now, and returns a dict of file hash to the saved or existing images.
+
+    SQLite only allows one writer at a time and fails with "database is locked" when the
+    other writer takes too long: the insert is tried again then (up to `INSERT_ATTEMPTS`
+    times), which finds the image if the other writer created it.
+    """
+    for attempt in range(1, INSERT_ATTEMPTS + 1):
         try:
-            image, created = ImageModel.objects.get_or_create(
-                file_hash=file_hash,
-                defaults={"title": basename(image_file.name), "file": image_file},
-            )
-            return image
-        except ImageModel.MultipleObjectsReturned:
-            logger.error(
-                "Multiple versions of %s (%s) found. Returning the first one found.",
-                basename(image_file.name),
-                file_hash,
+            with transaction.atomic():
+                _lock_file_hashes(images)
+                existing = find_images_by_hash(images)
+                for file_hash, image in images.items():
+                    if file_hash not in existing:
+                        image.save()
+            return {**images, **existing}
+        except OperationalError as e:
+            if "database is locked" not in str(e) or attempt == INSERT_ATTEMPTS:
+                raise
+            logger.warning("The database is locked, trying again to save the images (%s).", e)
+            # The images saved before the error were rolled back, including the rows of any
+            # parent models.
+            for image in images.values():
+                for model in [type(image), *image._meta.get_parent_list()]:
+                    setattr(image, model._meta.pk.attname, None)
+                image._state.adding = True
+
+
+def find_images_by_hash(file_hashes: Iterable[str]) -> dict:
+    """
+    Returns a dict of file hash to image for the images matching any of the hashes, using
+    a single query. If there are several images with the same hash, the first one wins.
+    """
+    ImageModel = get_image_model()
+    images = {}
+    for image in ImageModel.objects.filter(file_hash__in=set(file_hashes)).order_by("pk"):
+        if image.file_hash in images:
+            logger.error("Multiple versions of %s found. Returning the first one found.", image.file_hash)
+            continue
+        images[image.file_hash] = image
+    return images
+
+
+def _lock_file_hashes(file_hashes: Iterable[str]):
+    """
+    Locks the file hashes for the rest of the transaction, so concurrent importers of the
+    same file wait for each other. The locks are taken in sorted order so importers can't
+    deadlock.
+
+    PostgreSQL takes an advisory lock per hash. Other databases with `SELECT ... FOR
+    UPDATE` (e.g. MySQL) lock the `FileHashLock` rows of the hashes' leading bytes, so
+    importers of different files may wait for each other as well. SQLite has no row locks,
+    but only allows one writer at a time, which `_insert_images` handles.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(h)) FROM unnest(%s::text[]) AS h ORDER BY h",
+                [sorted(file_hashes)],
             )
-            return ImageModel.objects.filter(file_hash=file_hash).first()
+    elif connection.features.has_select_for_update:
+        from .models import FileHashLock
+
+        buckets = sorted({file_hash[:2] for file_hash in file_hashes})
+        list(FileHashLock.objects.select_for_update().filter(bucket__in=buckets).order_by("bucket"))
+
+
+def hash_file(image_file, block_size: int = None) -> str:
+    """
+    Returns the SHA1 hex digest of a file (or path), read in chunks so the file is never loaded
+    into memory in full. The chunk size defaults to `WAGTIALIMAGECAPTIONS_HASH_BLOCK_SIZE`.
+
+    Nothing is remembered on the file object, which may be rewritten or reused: pass the
+    digest on instead of hashing the same file again, e.g. as the `file_hash` of the model
+    and of `extract_metadata`. Paths are opened (and closed) for hashing.
+    """
+    if isinstance(image_file, (str, os.PathLike)):
+        with open(image_file, "rb") as f:
+            return hash_file(f, block_size)
+
+    if block_size is None:
+        block_size = getattr(settings, "WAGTIALIMAGECAPTIONS_HASH_BLOCK_SIZE", HASH_BLOCK_SIZE)
+
+    position = image_file.tell()
+    image_file.seek(0)
+
+    sha1 = hashlib.sha1()
+    for chunk in iter(partial(image_file.read, block_size), b""):
+        sha1.update(chunk)
+    image_file.seek(position)
+
+    return sha1.hexdigest()
+
+
+def extract_metadata(
+    image_file: ImageFile, exif: bool = True, file_hash: str = None, use_cache: bool = True
+) -> ImageMetadata:
+    """
+    Extracts the IPTC and, optionally, the EXIF (including GPS) data from an image. Unlike
+    calling `parse_iptc` and `parse_exif` separately, the image headers are only read once.
+
+    JPEG and TIFF files are handled by the header-only `read_metadata`, other formats
+    are opened with Pillow.
+
+    With a meta data cache configured (see `wagtailimagecaptions.metadata_cache`), the
+    result is looked up by the content hash of the file first. Pass its `file_hash` if
+    known, to save hashing the file.
+    """
+    cache = get_metadata_cache() if use_cache else None
+    if cache is None:
+        metadata = _extract_metadata(image_file, exif)
+    else:
+        key = metadata_cache_key(file_hash or hash_file(image_file), exif)
+        with instrumentation.stage("cache"):
+            metadata = cache.get(key)
+
+        if metadata is not None:
+            metadata.cached = True
+        else:
+            metadata = _extract_metadata(image_file, exif)
+            # Files without meta data (or which couldn't be read) are cheap to parse again.
+            if metadata.iptc or metadata.exif:
+                cache.set(key, metadata)
+
+    if (report := instrumentation.current_report()) is not None:
+        report.iptc_tags = len(metadata.iptc)
+        report.exif_tags = len(metadata.exif)
+        if cache is not None:
+            report.cache = "hit" if metadata.cached else "miss"
+
+    return metadata
+
+
+def metadata_cache_key(file_hash: str, exif: bool) -> str:
+    """
+    Returns the meta data cache key of a file. Besides its hash, the key holds everything
+    the cached result depends on: the parser version, whether EXIF was extracted, the IPTC
+    dataset registry and the EXIF converters.
+    """
+    parsers = f"{PARSER_VERSION}.{get_iptc_fingerprint()}"
+    if exif:
+        parsers += f".{_converters_fingerprint(tuple(EXIF_CONVERTERS.items()))}"
+    return f"wagtailimagecaptions:metadata:{parsers}:{'exif' if exif else 'iptc'}:{file_hash}"
+
+
+def _extract_metadata(image_file: ImageFile, exif: bool) -> ImageMetadata:
+    try:
+        return read_metadata(image_file, exif=exif)
+    except UnsupportedFormat:
+        pass
+    except FileNotFoundError as fnfe:
+        logger.warning(fnfe)
+        instrumentation.failure(f"FileNotFoundError: {fnfe}")
+        return ImageMetadata()
+
+    try:
+        with instrumentation.stage("open"):
+            image = PILImage.open(instrumentation.count_reads(image_file))
+    except FileNotFoundError as fnfe:
+        logger.warning(fnfe)
+        instrumentation.failure(f"FileNotFoundError: {fnfe}")
+        return ImageMetadata()
+    except ValueError as ve:
+        logger.warning(ve)
+        instrumentation.failure(f"{type(ve).__name__}: {ve}")
+        return ImageMetadata()
+
+    with instrumentation.stage("iptc"):
+        iptc = _parse_iptc_image(image)
+    with instrumentation.stage("exif"):
+        exif_data = _parse_exif_image(image) if exif else {}
+
+    return ImageMetadata(iptc=iptc, exif=exif_data, width=image.width, height=image.height)
+
+
+def read_metadata(image_file, exif: bool = True) -> ImageMetadata:
+    """
+    Extracts the IPTC and EXIF data from a JPEG or TIFF without decoding the image or
+    reading it in full: only the APP1/APP13 segments or the TIFF IFDs are read, so the
+    memory used stays the same regardless of the size of the file. Accepts a path or any
+    seekable binary stream, including an `mmap`.
+
+    Raises `UnsupportedFormat` for any other kind of file.
+    """
+    if isinstance(image_file, (str, os.PathLike)):
+        with open(image_file, "rb") as f:
+            return read_metadata(f, exif=exif)
+
+    if isinstance(image_file, File) and image_file.closed:
+        image_file.open("rb")
+
+    with instrumentation.stage("read_headers"):
+        headers = read_headers(instrumentation.count_reads(image_file), exif=exif)
+    with instrumentation.stage("iptc"):
+        iptc = _iptc_to_dict(headers.iptc)
+    with instrumentation.stage("exif"):
+        exif_data = _exif_to_dict(headers.exif) if exif else {}
+
+    return ImageMetadata(iptc=iptc, exif=exif_data, width=headers.width, height=headers.height)
+
+
+@dataclass
+class ParseResult:
+    # The path, or the index of bytes, passed to `parse_many`.
+    source: Union[str, int]
+    metadata: Optional[ImageMetadata] = None
+    error: str = ""
+
+
+def parse_many(
+    files: Iterable[Union[str, os.PathLike, bytes]],
+    exif: bool = True,
+    executor: Executor = None,
+    workers: int = None,
+    chunksize: int = None,
+) -> list:
+    """
+    Extracts the meta data of many files in parallel, returning a `ParseResult` per file
+    in the order of `files`. A file that can't be parsed gets an `error` instead of failing
+    the others.
+
+    Files are given as paths, opened by the workers, or as bytes (e.g. just the leading
+    part of a file holding its headers), so no file objects cross process boundaries.
+    Without an `executor`, a process pool of `workers` processes (default: CPU count) is
+    used for the call. Files are submitted in chunks of `chunksize` per task, and in
+    batches, so only a few chunks per worker are in flight at a time.
+
+    The parsing keeps no shared state, so a `ThreadPoolExecutor` can be passed as well,
+    e.g. when reading the files is slower than parsing them.
+    """
+    files = list(files)
+    workers = workers or getattr(executor, "_max_workers", None) or os.cpu_count()
+    chunksize = chunksize or max(1, min(64, len(files) // (workers * 4)))
+    batch_size = chunksize * workers * 4
+
+    if executor is None:
+        # Don't share database connections with the forked workers.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker)
+    else:
+        pool = nullcontext(executor)
+
+    results = []
+    with pool as executor:
+        for start in range(0, len(files), batch_size):
+            batch = files[start : start + batch_size]
+            sources = [f if isinstance(f, bytes) else os.fspath(f) for f in batch]
+            chunks = [sources[i : i + chunksize] for i in range(0, len(sources), chunksize)]
+            parsed = chain.from_iterable(executor.map(partial(_parse_files, exif=exif), chunks))
+            for i, (f, (metadata, error)) in enumerate(zip(batch, parsed), start):
+                results.append(ParseResult(i if isinstance(f, bytes) else os.fspath(f), metadata, error))
+    return results
+
+
+def _parse_files(sources: list, exif: bool) -> list:
+    """
+    Extracts the meta data of a chunk of files for `parse_many`, sharing the conversion of
+    their EXIF values.
+    """
+    with exif_conversion_batch():
+        return [_parse_file(source, exif) for source in sources]
+
+
+def _parse_file(source: Union[str, bytes], exif: bool) -> tuple:
+    """
+    Extracts the meta data of a path or bytes for `parse_many`. Runs in the worker
+    processes, so errors are returned instead of raised.
+    """
+    try:
+        if isinstance(source, bytes):
+            return extract_metadata(io.BytesIO(source), exif=exif), ""
+        with open(source, "rb") as f:
+            return extract_metadata(f, exif=exif), ""
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+# The fields `apply_metadata` sets from the IPTC data which editors curate after the upload.
+EDITORIAL_FIELDS = ("title", "alt", "credit", "caption", "byline", "usage_terms", "copyright_notice")
+
+# The suffix `Storage.get_available_name` adds to file names already taken.
+STORAGE_SUFFIX_RE = re.compile(r"_[a-zA-Z0-9]{7}$")
+
+
+def keep_editorial_fields(instance, before: dict, fields: list, curated_only: bool = False) -> list:
+    """
+    Restores the `EDITORIAL_FIELDS` of an instance, after `apply_metadata`, to their values
+    in `before` and returns the names in `fields` of the other fields. With `curated_only`,
+    fields editors haven't filled in (blank, or a title that's still the file name) keep
+    the extracted value and stay in the names returned.
+    """
+    kept = []
+    for name in EDITORIAL_FIELDS:
+        if name in fields and not (curated_only and _is_default_editorial_value(instance, name, before[name])):
+            setattr(instance, name, before[name])
+            kept.append(name)
+    return [name for name in fields if name not in kept]
+
+
+def _is_default_editorial_value(instance, name: str, value) -> bool:
+    if not value:
+        return True
+    if name == "title" and instance.file:
+        # Uploads are titled after the file name, with or without its extension, before the
+        # storage adds a random suffix to a name already taken.
+        stem, extension = os.path.splitext(basename(instance.file.name))
+        stems = {stem, STORAGE_SUFFIX_RE.sub("", stem)}
+        return value in stems | {f"{s}{extension}" for s in stems}
+    return False
+
+
+def apply_metadata(instance, metadata: ImageMetadata) -> list:
+    """
+    Populates the fields of an image model instance from extracted meta data. Returns the
+    names of the fields that were set.
+    """
+    updated_fields = []
+    meta_dict = metadata.iptc
+
+    # Add the meta data to the fields.
+    if title := meta_dict.get("headline", ""):
+        trimmed_title = Truncator(title.strip()).chars(255)
+        instance.title = trimmed_title
+        instance.alt = trimmed_title
+        updated_fields += ["title", "alt"]
+
+    if credit := meta_dict.get("credit", ""):
+        trimmed_credit = Truncator(credit.strip()).chars(255)
+        instance.credit = trimmed_credit
+        updated_fields.append("credit")
+
+    if caption := meta_dict.get("caption", ""):
+        # Wrap plain-text in <p> tags for RichTextField values.
+        starts_with_tag = bool(re.search("^<[p|div].*?>", caption))
+
+        if starts_with_tag:
+            instance.caption = caption.strip()
+        else:
+            instance.caption = linebreaks(caption.strip())
+        updated_fields.append("caption")
+
+    if byline := meta_dict.get("byline", ""):
+        trimmed_byline = Truncator(byline.strip()).chars(255)
+        instance.byline = trimmed_byline
+        updated_fields.append("byline")
+
+    if instructions := meta_dict.get("instructions", ""):
+        trimmed_instructions = Truncator(instructions.strip()).chars(255)
+        instance.usage_terms = trimmed_instructions.strip()
+        updated_fields.append("usage_terms")
+
+    if copyright_notice := meta_dict.get("copyright_notice", ""):
+        trimmed_copyright = Truncator(copyright_notice.strip()).chars(255)
+        instance.copyright_notice = trimmed_copyright
+        updated_fields.append("copyright_notice")
+
+    instance.iptc_data = meta_dict
+    updated_fields.append("iptc_data")
+
+    if hasattr(instance, "exif_data"):
+        exif_data = metadata.exif
+
+        def string_clean_up(s: str) -> str:
+            return isinstance(s, str) and Truncator(s.strip().rstrip("\x00")).chars(255) or s
+
+        if camera_make := exif_data.get("Make", None):
+            instance.camera_make = string_clean_up(camera_make)
+            updated_fields.append("camera_make")
+
+        if camera_model := exif_data.get("Model", None):
+            instance.camera_model = string_clean_up(camera_model)
+            updated_fields.append("camera_model")
+
+        if lens_make := exif_data.get("LensMake", None):
+            instance.lens_make = string_clean_up(lens_make)
+            updated_fields.append("lens_make")
+
+        if lens_model := exif_data.get("LensModel", None):
+            instance.lens_model = string_clean_up(lens_model)
+            updated_fields.append("lens_model")
+
+        if focal_length := exif_data.get("FocalLength", None):
+            instance.focal_length = string_clean_up(focal_length)
+            updated_fields.append("focal_length")
+
+        if shutter_speed := exif_data.get("ExposureTime", None):
+            instance.shutter_speed = string_clean_up(shutter_speed)
+            updated_fields.append("shutter_speed")
+
+        if aperture := exif_data.get("ApertureValue", None):
+            aperture_float = float(aperture)
+            instance.aperture = f"f/{aperture_float:.2f}"
+            updated_fields.append("aperture")
+
+        if iso_rating := exif_data.get("ISOSpeedRatings", None):
+            instance.iso_rating = f"{iso_rating}ISO"
+            updated_fields.append("iso_rating")
+
+        for name, value in exif_numeric_values(exif_data).items():
+            if value is not None:
+                setattr(instance, name, value)
+                updated_fields.append(name)
+
+        if date_time_original := exif_datetime_original(exif_data):
+            instance.date_time_original = date_time_original
+            updated_fields.append("date_time_original")
+
+        # Coordinates on the equator or the prime meridian are 0.0, so compare with None.
+        if (latitude := exif_data.get("latitude")) is not None:
+            instance.latitude = latitude
+            updated_fields.append("latitude")
+
+        if (longitude := exif_data.get("longitude")) is not None:
+            instance.longitude = longitude
+            updated_fields.append("longitude")
+
+        if latitude is not None and longitude is not None:
+            instance.geohash = encode_geohash(latitude, longitude)
+            updated_fields.append("geohash")
+
+        instance.exif_data = filter_exif_data(exif_data)
+        updated_fields.append("exif_data")
+
+    return updated_fields
+
+
+def exif_numeric_values(exif_data: dict) -> dict:
+    """
+    Returns the numeric values of the exposure settings, for the indexed `f_number`,
+    `exposure_time` (in seconds), `iso` and `focal_length_mm` fields. Accepts the raw
+    numbers as well as the formatted strings stored in `exif_data` (e.g. "f2.8", "1/250"
+    and "23.0mm"). Values which are missing or can't be parsed are None.
+    """
+    f_number = _to_number(exif_data.get("FNumber"))
+    if f_number is None and (aperture_value := _to_number(exif_data.get("ApertureValue"))) is not None:
+        # ApertureValue is in APEX units: AV = 2 * log2(N).
+        f_number = round(2 ** (aperture_value / 2), 1)
+
+    iso = _to_number(exif_data.get("ISOSpeedRatings"))
+
+    return {
+        "f_number": f_number,
+        "exposure_time": _to_number(exif_data.get("ExposureTime")),
+        "iso": None if iso is None else int(iso),
+        "focal_length_mm": _to_number(exif_data.get("FocalLength")),
+    }
+
+
+def exif_datetime_original(exif_data: dict) -> Optional[datetime.datetime]:
+    """
+    Returns when the image was taken, from the DateTimeOriginal tag, as parsed or as stored
+    in `exif_data`. The time is in the UTC offset of OffsetTimeOriginal (or OffsetTime) if
+    present, else in the current time zone. With `USE_TZ` off, a naive local time is
+    returned.
+    """
+    value = exif_data.get("DateTimeOriginal")
+    if isinstance(value, str):
+        value = _parse_exif_datetime(value)
+    if not isinstance(value, datetime.datetime):
+        return None
+
+    if value.tzinfo is None and (
+        offset := _parse_utc_offset(exif_data.get("OffsetTimeOriginal") or exif_data.get("OffsetTime"))
+    ):
+        value = value.replace(tzinfo=offset)
+
+    if not settings.USE_TZ:
+        return timezone.make_naive(value) if timezone.is_aware(value) else value
+    return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+
+def _parse_exif_datetime(value: str) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.strptime(value.strip(), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        pass
+
+    # As stored in `exif_data` by the `DateTimeEncoder`.
+    try:
+        return datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def _parse_utc_offset(value) -> Optional[datetime.timezone]:
+    """
+    Parses an EXIF offset like "+02:00" or "-05:00".
+    """
+    if isinstance(value, str) and (match := re.fullmatch(r"\s*([+-])(\d{2}):(\d{2})\s*", value)):
+        sign, hours, minutes = match.groups()
+        offset = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+        return datetime.timezone(-offset if sign == "-" else offset)
+    return None
+
+
+NUMBER_RE = re.compile(r"(\d+(?:\.\d+)?)(?:\s*/\s*(\d+(?:\.\d+)?))?")
+
+
+def _to_number(value) -> Optional[float]:
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and (match := NUMBER_RE.search(value)):
+        numerator, denominator = match.groups()
+        if denominator is None:
+            return float(numerator)
+        if float(denominator):
+            return float(numerator) / float(denominator)
+    return None
 
 
 def parse_iptc(image_file: ImageFile) -> dict:
@@ -45,7 +649,6 @@ def parse_iptc(image_file: ImageFile) -> dict:
     """
     try:
         image = PILImage.open(image_file)
-        iptc = getiptcinfo(image)
     except FileNotFoundError as fnfe:
         logger.warning(fnfe)
         return {}
@@ -53,65 +656,44 @@ def parse_iptc(image_file: ImageFile) -> dict:
         logger.warning(ve)
         return {}
 
+    return _parse_iptc_image(image)
+
+
+def _parse_iptc_image(image: PILImage.Image) -> dict:
+    """
+    Extracts the IPTC data from an already opened Pillow image.
+    """
+    try:
+        iptc = getiptcinfo(image)
+    except ValueError as ve:
+        logger.warning(ve)
+        return {}
+
+    return _iptc_to_dict(iptc)
+
+
+def _iptc_to_dict(iptc: Optional[dict]) -> dict:
+    """
+    Maps the raw IPTC datasets, keyed by (record, dataset), to field names using the
+    registry in `wagtailimagecaptions.iptc`.
+    """
     iptc_dict = {}
 
     if not iptc:
         logger.info("Image did not contain IPTC data.")
         return iptc_dict
 
-    def decode(v):
-        if isinstance(v, bytes):
-            return bytes.decode(v)
-        elif isinstance(v, list):
-            return [decode(item) for item in v]
-        elif isinstance(v, str):
-            return v
+    datasets = get_iptc_datasets()
 
-    # fmt: off
     for k, v in iptc.items():
-        if k == (2, 5,):
-            iptc_dict["object_name"] = decode(v)
-        elif k == (2, 7,):
-            iptc_dict["edit_status"] = decode(v)
-        elif k == (2, 25,):
-            iptc_dict["keywords"] = decode(v)
-        elif k == (2, 30,):
-            iptc_dict["release_date"] = decode(v)
-        elif k == (2, 35,):
-            iptc_dict["release_time"] = decode(v)
-        elif k == (2, 37,):
-            iptc_dict["expiration_date"] = decode(v)
-        elif k == (2, 38,):
-            iptc_dict["expiration_time"] = decode(v)
-        elif k == (2, 40,):
-            iptc_dict["instructions"] = decode(v)
-        elif k == (2, 40,):
-            iptc_dict["instructions"] = decode(v)
-        elif k == (2, 42,):
-            iptc_dict["action_advised"] = decode(v)
-        elif k == (2, 80,):
-            iptc_dict["byline"] = decode(v)
-        elif k == (2, 85,):
-            iptc_dict["byline_title"] = decode(v)
-        elif k == (2, 90,):
-            iptc_dict["city"] = decode(v)
-        elif k == (2, 92,):
-            iptc_dict["sub_location"] = decode(v)
-        elif k == (2, 95,):
-            iptc_dict["province_state"] = decode(v)
-        elif k == (2, 100,):
-            iptc_dict["country"] = decode(v)
-        elif k == (2, 105,):
-            iptc_dict["headline"] = decode(v)
-        elif k == (2, 110,):
-            iptc_dict["credit"] = decode(v)
-        elif k == (2, 116,):
-            iptc_dict["copyright_notice"] = decode(v)
-        elif k == (2, 120,):
-            iptc_dict["caption"] = decode(v)
-        elif k == (2, 122,):
-            iptc_dict["writer_editor"] = decode(v)
-    # fmt: on
+        if (dataset := datasets.get(k)) is None:
+            continue
+
+        values = v if isinstance(v, list) else [v]
+        if dataset.repeatable:
+            iptc_dict[dataset.name] = [dataset.decoder(value) for value in values]
+        else:
+            iptc_dict[dataset.name] = dataset.decoder(values[0])
 
     return {k: v for k, v in iptc_dict.items() if v}
 
@@ -122,16 +704,35 @@ def parse_exif(image_file: ImageFile):
 
     Update 2024-03-11, by Thomas Weholt: this will no also return GPS related data.
 
-    Generate a dictionary of dictionaries.
-    The outer dictionary keys are the names
-    of individual items, eg Make, Model etc.
-    The outer dictionary values are themselves
-    dictionaries with the following keys:
-        tag: the numeric code for the item names
-        raw: the data as stored in the image, often
-        in a non-human-readable format
-        processed: the raw data if it is human-readable,
-        or a processed version if not.
+    Generate a dictionary of the EXIF tags found in the image.
+    The keys are the names of individual items, eg Make, Model etc.
+    The values are the data as stored in the image if it is
+    human-readable, or a processed version if not.
+    """
+    image = PILImage.open(image_file)
+    return _parse_exif_image(image)
+
+
+def _parse_exif_image(image: PILImage.Image) -> dict:
+    """
+    Extracts the EXIF (and GPS) data from an already opened Pillow image.
+    """
+    if hasattr(image, "_getexif"):
+        return _exif_to_dict(image._getexif())
+
+    # Other formats, like TIFF and PNG, only have `getexif()`, which keeps the EXIF and GPS
+    # IFDs apart, so merge them the same way `_getexif()` does.
+    exif = image.getexif()
+    exif_data = {**exif, **exif.get_ifd(PIL.ExifTags.IFD.Exif)}
+    if gps_info := exif.get_ifd(PIL.ExifTags.IFD.GPSInfo):
+        exif_data[GPS_INFO_TAG] = gps_info
+    return _exif_to_dict(exif_data)
+
+
+def _exif_to_dict(exif_data_PIL: Optional[dict]) -> dict:
+    """
+    Converts the raw EXIF tags, keyed by tag number, into a dict of processed values.
+    Only the tags present in the image are looked at.
     """
 
     def clean_up_exif_dict(exif_dict: dict) -> dict:
@@ -150,7 +751,7 @@ def parse_exif(image_file: ImageFile):
                 return v
             return v
 
-        return {k: cast(v.get("processed")) for k, v in exif_dict.items() if v.get("processed")}
+        return {k: cast(v) for k, v in exif_dict.items() if v}
 
     def get_lat_lon(exif_info):
         "Credit/source: https://gist.github.com/maxbellec/dbb60d136565e3c4b805931f5aad2c6d"
@@ -177,27 +778,62 @@ def parse_exif(image_file: ImageFile):
         except KeyError:
             return None, None
 
-    try:
-        image = PILImage.open(image_file)
-        exif_data_PIL = image._getexif()
-        if not exif_data_PIL:
-            return {}
+    if not exif_data_PIL:
+        return {}
 
-        tags = {**PIL.ExifTags.TAGS}
-        exif_data = {}
+    exif_data = {}
 
-        for k, v in tags.items():
-            value = k in exif_data_PIL and exif_data_PIL[k]
-            if len(str(value)) > 64:
-                value = str(value)[:65] + "..."
-            exif_data[v] = {"tag": k, "raw": value, "processed": value}
+    for k, value in exif_data_PIL.items():
+        if (name := EXIF_TAGS.get(k)) is None:
+            continue
+        if k == GPS_INFO_TAG and isinstance(value, dict):
+            exif_data[name] = {GPS_TAGS.get(gk, gk): _truncate(gv) for gk, gv in value.items()}
+        else:
+            exif_data[name] = _truncate(value)
 
-        lat, lon = get_lat_lon(exif_data_PIL)
-        exif_data.update({"latitude": {"processed": lat}, "longitude": {"processed": lon}})
+    with instrumentation.stage("gps"):
+        exif_data["latitude"], exif_data["longitude"] = get_lat_lon(exif_data_PIL)
+    with instrumentation.stage("process_exif"):
         exif_data = _process_exif_dict(exif_data)
-        return clean_up_exif_dict(exif_data)
-    except IOError as ioe:
-        raise ioe
+    return clean_up_exif_dict(exif_data)
+
+
+def _truncate(value):
+    """
+    Truncates long values, like maker notes and other binary blobs.
+    """
+    if not isinstance(value, (int, float)) and len(str_value := str(value)) > 64:
+        return str_value[:65] + "..."
+    return value
+
+
+def filter_exif_data(exif_data: dict) -> dict:
+    """
+    Drops the EXIF tags, and GPS sub-tags, which shouldn't be stored in `exif_data`, as
+    configured by the `WAGTIALIMAGECAPTIONS_EXIF_TAGS` / `WAGTIALIMAGECAPTIONS_GPS_TAGS`
+    allow-lists and the `WAGTIALIMAGECAPTIONS_EXIF_EXCLUDE_TAGS` /
+    `WAGTIALIMAGECAPTIONS_GPS_EXCLUDE_TAGS` deny-lists (all tag names).
+    """
+
+    def filter_tags(tags: dict, include, exclude) -> dict:
+        return {k: v for k, v in tags.items() if (include is None or k in include) and k not in exclude}
+
+    exif_data = filter_tags(
+        exif_data,
+        getattr(settings, "WAGTIALIMAGECAPTIONS_EXIF_TAGS", None),
+        getattr(settings, "WAGTIALIMAGECAPTIONS_EXIF_EXCLUDE_TAGS", ()),
+    )
+
+    if isinstance(gps_info := exif_data.get("GPSInfo"), dict):
+        exif_data["GPSInfo"] = filter_tags(
+            gps_info,
+            getattr(settings, "WAGTIALIMAGECAPTIONS_GPS_TAGS", None),
+            getattr(settings, "WAGTIALIMAGECAPTIONS_GPS_EXCLUDE_TAGS", ()),
+        )
+        if not exif_data["GPSInfo"]:
+            del exif_data["GPSInfo"]
+
+    return exif_data
 
 
 def _derationalize(rational):
@@ -245,33 +881,167 @@ def _create_lookups():
     return lookups
 
 
-def _process_exif_dict(exif_dict: dict, date_format: str = "%Y:%m:%d %H:%M:%S"):
+EXIF_TAGS = PIL.ExifTags.TAGS
+GPS_TAGS = PIL.ExifTags.GPSTAGS
+GPS_INFO_TAG = PIL.ExifTags.Base.GPSInfo
+LOOKUPS = _create_lookups()
+
+
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+
+def _exif_datetime(value) -> datetime.datetime:
+    # Slicing the fixed "YYYY:MM:DD HH:MM:SS" layout is several times faster than strptime,
+    # which handles the rest.
+    if len(value) == 19 and value[4] == value[7] == value[13] == value[16] == ":" and value[10] == " ":
+        return datetime.datetime(
+            int(value[:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]), int(value[14:16]), int(value[17:])
+        )
+    return datetime.datetime.strptime(value, EXIF_DATE_FORMAT)
+
+
+def _exposure_time(value) -> str:
+    # Building the fraction from the rational's own terms, rather than from a float, lets
+    # `limit_denominator` return right away for the shutter speeds of real cameras.
+    if isinstance(value, TiffImagePlugin.IFDRational):
+        fraction = Fraction(value.numerator, value.denominator)
+    else:
+        fraction = Fraction(_derationalize(value))
+    return str(fraction.limit_denominator(8000))
+
+
+def _lookup(table: tuple):
+    return table.__getitem__
+
+
+# The memo of the current `exif_conversion_batch`, if any.
+_conversion_memo = contextvars.ContextVar("wagtailimagecaptions_conversion_memo", default=None)
+
+# Tag name -> converter of its raw value into a more human readable form. Converters are
+# only applied to the tags present, and each on its own: a failing conversion leaves the
+# raw value of its tag, without affecting the others.
+EXIF_CONVERTERS = {
+    "DateTime": _exif_datetime,
+    "DateTimeOriginal": _exif_datetime,
+    "DateTimeDigitized": _exif_datetime,
+    "FNumber": lambda value: "f{}".format(_derationalize(value)),
+    "MaxApertureValue": lambda value: "f{:2.1f}".format(_derationalize(value)),
+    "FocalLength": lambda value: "{}mm".format(_derationalize(value)),
+    "FocalLengthIn35mmFilm": "{}mm".format,
+    "Orientation": _lookup(LOOKUPS["orientations"]),
+    "ResolutionUnit": _lookup(LOOKUPS["resolution_units"]),
+    "ExposureProgram": _lookup(LOOKUPS["exposure_programs"]),
+    "MeteringMode": _lookup(LOOKUPS["metering_modes"]),
+    "XResolution": lambda value: int(_derationalize(value)),
+    "YResolution": lambda value: int(_derationalize(value)),
+    "ExposureTime": _exposure_time,
+    "ExposureBiasValue": lambda value: "{} EV".format(_derationalize(value)),
+}
+
+
+def _callable_fingerprint(func) -> str:
+    # The names of lambdas aren't unique and the reprs of bound methods hold addresses, so
+    # add the code of functions and the object of (built-in) methods, like the format
+    # string of `"{}mm".format`.
+    name = f"{getattr(func, '__module__', None)}.{getattr(func, '__qualname__', type(func).__qualname__)}"
+    if (code := getattr(func, "__code__", None)) is not None:
+        return f"{name}:{_code_fingerprint(code)}"
+    if (owner := getattr(func, "__self__", None)) is not None and not isinstance(owner, types.ModuleType):
+        return f"{name}:{owner!r}"
+    return name
+
+
+def _code_fingerprint(code: types.CodeType) -> str:
+    # The byte code alone doesn't tell `value.upper()` from `value.lower()`, so add the names
+    # and constants it refers to. Nested functions are code objects among the constants,
+    # whose reprs hold addresses.
+    consts = [_code_fingerprint(c) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts]
+    return f"{code.co_code.hex()}:{code.co_names}:{consts}"
+
+
+@lru_cache(maxsize=8)
+def _converters_fingerprint(converters: tuple) -> str:
+    """
+    Returns a short digest of the `EXIF_CONVERTERS` items, the same across processes.
+    """
+    sha1 = hashlib.sha1()
+    for name, converter in sorted(converters, key=lambda item: item[0]):
+        sha1.update(f"{name}={_callable_fingerprint(converter)};".encode())
+    return sha1.hexdigest()[:12]
+
+
+def _process_exif_dict(exif_dict: dict) -> dict:
     """
     Internal method parsing the exif data info more human readable form.
     """
-    lookups = _create_lookups()
+    errors = convert_exif_values(exif_dict)
+    if errors:
+        logger.warning("Error processing EXIF-data: %s", errors)
+        if (report := instrumentation.current_report()) is not None:
+            report.conversion_errors = errors
+    return exif_dict
+
+
+def convert_exif_values(exif_dict: dict, memo: dict = None) -> dict:
+    """
+    Converts the values of the tags in `EXIF_CONVERTERS` present in `exif_dict`, in place,
+    and returns the errors of the tags which couldn't be converted (tag name -> message).
+
+    With a `memo` (by default the one of the current `exif_conversion_batch`), each distinct
+    string and integer is converted once per converter and the result shared by all dicts
+    converted with the memo.
+    """
+    if memo is None:
+        memo = _conversion_memo.get()
+
+    errors = {}
+    if memo is None:
+        for name, converter in EXIF_CONVERTERS.items():
+            if name in exif_dict:
+                try:
+                    exif_dict[name] = converter(exif_dict[name])
+                except Exception as e:
+                    errors[name] = f"{type(e).__name__}: {e}"
+        return errors
+
+    for name, converter in EXIF_CONVERTERS.items():
+        if name not in exif_dict:
+            continue
+        value = exif_dict[name]
+        try:
+            # Rationals are converted one by one, as hashing them costs about as much as
+            # converting them.
+            if type(value) in (str, int):
+                key = (converter, value)
+                if key not in memo:
+                    memo[key] = converter(value)
+                exif_dict[name] = memo[key]
+            else:
+                exif_dict[name] = converter(value)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+    return errors
+
 
+def convert_exif_batch(exif_dicts: list) -> list:
+    """
+    Like `convert_exif_values` for many dicts at once, returning the errors per dict. Each
+    distinct string and integer is converted once per converter: the three timestamps of a
+    photo are mostly the same, and lookups like orientations repeat a lot.
+    """
+    memo = {}
+    return [convert_exif_values(exif_dict, memo) for exif_dict in exif_dicts]
+
+
+@contextmanager
+def exif_conversion_batch():
+    """
+    Converts the EXIF values of all files parsed within like `convert_exif_batch`, with a
+    memo shared by the files. Used by the workers of the bulk paths (`parse_many`, the
+    importer and `reextract_metadata`) for each chunk of files they process.
+    """
+    token = _conversion_memo.set({})
     try:
-        exif_dict["DateTime"]["processed"] = datetime.datetime.strptime(exif_dict["DateTime"]["raw"], date_format)
-        exif_dict["DateTimeOriginal"]["processed"] = datetime.datetime.strptime(exif_dict["DateTimeOriginal"]["raw"], date_format)
-        exif_dict["DateTimeDigitized"]["processed"] = datetime.datetime.strptime(exif_dict["DateTimeDigitized"]["raw"], date_format)
-        exif_dict["FNumber"]["processed"] = _derationalize(exif_dict["FNumber"]["raw"])
-        exif_dict["FNumber"]["processed"] = "f{}".format(exif_dict["FNumber"]["processed"])
-        exif_dict["MaxApertureValue"]["processed"] = _derationalize(exif_dict["MaxApertureValue"]["raw"])
-        exif_dict["MaxApertureValue"]["processed"] = "f{:2.1f}".format(exif_dict["MaxApertureValue"]["processed"])
-        exif_dict["FocalLength"]["processed"] = _derationalize(exif_dict["FocalLength"]["raw"])
-        exif_dict["FocalLength"]["processed"] = "{}mm".format(exif_dict["FocalLength"]["processed"])
-        exif_dict["FocalLengthIn35mmFilm"]["processed"] = "{}mm".format(exif_dict["FocalLengthIn35mmFilm"]["raw"])
-        exif_dict["Orientation"]["processed"] = lookups["orientations"][exif_dict["Orientation"]["raw"]]
-        exif_dict["ResolutionUnit"]["processed"] = lookups["resolution_units"][exif_dict["ResolutionUnit"]["raw"]]
-        exif_dict["ExposureProgram"]["processed"] = lookups["exposure_programs"][exif_dict["ExposureProgram"]["raw"]]
-        exif_dict["MeteringMode"]["processed"] = lookups["metering_modes"][exif_dict["MeteringMode"]["raw"]]
-        exif_dict["XResolution"]["processed"] = int(_derationalize(exif_dict["XResolution"]["raw"]))
-        exif_dict["YResolution"]["processed"] = int(_derationalize(exif_dict["YResolution"]["raw"]))
-        exif_dict["ExposureTime"]["processed"] = _derationalize(exif_dict["ExposureTime"]["raw"])
-        exif_dict["ExposureTime"]["processed"] = str(Fraction(exif_dict["ExposureTime"]["processed"]).limit_denominator(8000))
-        exif_dict["ExposureBiasValue"]["processed"] = _derationalize(exif_dict["ExposureBiasValue"]["raw"])
-        exif_dict["ExposureBiasValue"]["processed"] = "{} EV".format(exif_dict["ExposureBiasValue"]["processed"])
-    except TypeError as ex:
-        logging.warning(f"Error processing EXIF-data: {ex}")
-    return exif_dict
+        yield
+    finally:
+        _conversion_memo.reset(token)
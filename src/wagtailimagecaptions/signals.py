@@ -1,12 +1,12 @@
-import re
-
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from django.utils.html import linebreaks
-from django.utils.text import Truncator
 from wagtail.images import get_image_model_string
 
-from .services import parse_exif, parse_iptc
+from . import instrumentation
+from .deferred import get_metadata_backend, process_image
+from .perceptual import set_perceptual_hash
+from .renditions import prewarm_renditions
+from .services import apply_metadata, extract_metadata
 
 IMAGE_MODEL = get_image_model_string()
 
@@ -23,76 +23,49 @@ def parse_image_meta(sender, **kwargs):
     if instance.id is not None:
         return
 
-    meta_dict = parse_iptc(instance.file)
-
-    # Add the meta data to the fields.
-    if title := meta_dict.get("headline", ""):
-        trimmed_title = Truncator(title.strip()).chars(255)
-        instance.title = trimmed_title
-        instance.alt = trimmed_title
-
-    if credit := meta_dict.get("credit", ""):
-        trimmed_credit = Truncator(credit.strip()).chars(255)
-        instance.credit = trimmed_credit
-
-    if caption := meta_dict.get("caption", ""):
-        # Wrap plain-text in <p> tags for RichTextField values.
-        starts_with_tag = bool(re.search("^<[p|div].*?>", caption))
-
-        if starts_with_tag:
-            instance.caption = caption.strip()
-        else:
-            instance.caption = linebreaks(caption.strip())
-
-    if byline := meta_dict.get("byline", ""):
-        trimmed_byline = Truncator(byline.strip()).chars(255)
-        instance.byline = trimmed_byline
-
-    if instructions := meta_dict.get("instructions", ""):
-        trimmed_instructions = Truncator(instructions.strip()).chars(255)
-        instance.usage_terms = trimmed_instructions.strip()
-
-    if copyright_notice := meta_dict.get("copyright_notice", ""):
-        trimmed_copyright = Truncator(copyright_notice.strip()).chars(255)
-        instance.copyright_notice = trimmed_copyright
-
-    instance.iptc_data = meta_dict
-
-    if hasattr(instance, "exif_data"):
-        exif_data = parse_exif(instance.file)
+    # The meta data may have been applied before saving already, which `aimagefile_to_model`
+    # flags on the instance.
+    metadata_applied = getattr(instance, "_metadata_applied", False)
 
-        def string_clean_up(s: str) -> str:
-            return isinstance(s, str) and Truncator(s.strip().rstrip("\x00")).chars(255) or s
-
-        if camera_make := exif_data.get("Make", None):
-            instance.camera_make = string_clean_up(camera_make)
-
-        if camera_model := exif_data.get("Model", None):
-            instance.camera_model = string_clean_up(camera_model)
-
-        if lens_make := exif_data.get("LensMake", None):
-            instance.lens_make = string_clean_up(lens_make)
+    # With a deferred backend configured, the meta data (and perceptual hash) is extracted
+    # after saving.
+    if not metadata_applied and get_metadata_backend() is not None:
+        instance.metadata_pending = True
+        return
 
-        if lens_model := exif_data.get("LensModel", None):
-            instance.lens_model = string_clean_up(lens_model)
+    if getattr(instance, "perceptual_hash", None) is None:
+        set_perceptual_hash(instance)
 
-        if focal_length := exif_data.get("FocalLength", None):
-            instance.focal_length = string_clean_up(focal_length)
+    if metadata_applied:
+        return
 
-        if shutter_speed := exif_data.get("ExposureTime", None):
-            instance.shutter_speed = string_clean_up(shutter_speed)
+    with instrumentation.record(instance.file.name):
+        # Read the IPTC and EXIF data in a single pass over the image headers.
+        metadata = extract_metadata(instance.file, exif=hasattr(instance, "exif_data"), file_hash=instance.file_hash)
+        with instrumentation.stage("apply"):
+            apply_metadata(instance, metadata)
 
-        if aperture := exif_data.get("ApertureValue", None):
-            aperture_float = float(aperture)
-            instance.aperture = f"f/{aperture_float:.2f}"
 
-        if iso_rating := exif_data.get("ISOSpeedRatings", None):
-            instance.iso_rating = f"{iso_rating}ISO"
+@receiver(post_save, sender=IMAGE_MODEL)
+def queue_image_meta(sender, **kwargs):
+    """
+    Hands new images awaiting meta data extraction to the deferred backend.
+    """
+    instance = kwargs["instance"]
 
-        if latitude := exif_data.get("latitude"):
-            instance.latitude = latitude
+    if kwargs["created"] and instance.metadata_pending:
+        if (backend := get_metadata_backend()) is not None:
+            backend.enqueue(instance.pk)
+        else:
+            # The backend was unset since `pre_save` (e.g. by `override_settings`), so extract
+            # on save as without one, instead of leaving the image pending.
+            instance.refresh_from_db(fields=["metadata_pending", *process_image(instance.pk)])
 
-        if longitude := exif_data.get("longitude"):
-            instance.longitude = longitude
 
-        instance.exif_data = exif_data
+@receiver(post_save, sender=IMAGE_MODEL)
+def prewarm_image_renditions(sender, **kwargs):
+    """
+    Generates the renditions listed in WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS of new images.
+    """
+    if kwargs["created"]:
+        prewarm_renditions(kwargs["instance"].pk)
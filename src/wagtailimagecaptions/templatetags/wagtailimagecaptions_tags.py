@@ -0,0 +1,21 @@
+from django import template
+
+from ..renditions import get_image_bundles
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_bundles(images, *filter_specs, **named_specs):
+    """
+    Fetches the renditions of a list of images in one query, with their captions:
+
+        {% load wagtailimagecaptions_tags wagtailcore_tags %}
+        {% image_bundles page.images "fill-300x200" large="width-1200" as bundles %}
+        {% for bundle in bundles %}
+            <img src="{{ bundle.rendition.url }}" alt="{{ bundle.alt }}">
+            <a href="{{ bundle.renditions.large.url }}">{{ bundle.caption|richtext }}</a>
+            {{ bundle.credit }}
+        {% endfor %}
+    """
+    return get_image_bundles(images, *filter_specs, **named_specs)
@@ -0,0 +1,159 @@
+"""
+Upload paths of images and renditions.
+
+Files go into Wagtail's "original_images" and "images" folders, optionally spread over
+sub folders so a single directory doesn't end up with millions of files, which local and
+NFS storage handle poorly. The sub folders are set by `WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING`:
+
+    # The upload date, formatted with WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH (default "%Y/%m").
+    WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING = "date"
+
+    # A fan-out on the hash of the file name, e.g. "ab/cd/photo.jpg", with
+    # WAGTIALIMAGECAPTIONS_UPLOAD_SHARD_DEPTH levels (default 2).
+    WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING = "hash"
+
+    # Buckets of WAGTIALIMAGECAPTIONS_UPLOAD_ID_BUCKET_SIZE image IDs (default 1000), e.g.
+    # "12/photo.fill-300x200.jpg" for the renditions of image 12345. Originals get their ID
+    # after the file is written, so they're spread by hash instead.
+    WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING = "id"
+
+    # A function of the instance and file name returning the sub folder.
+    WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING = "myproject.uploads.shard_by_collection"
+
+For backwards compatibility, setting only `WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH` selects
+"date". The settings are looked up once (and again when changed in tests).
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from wagtail.coreutils import string_to_ascii
+
+ORIGINALS_FOLDER = "original_images"
+RENDITIONS_FOLDER = "images"
+
+# Wagtail keeps the paths of originals below the 100 character limit of the file field.
+MAX_PATH_LENGTH = 95
+
+# Date formats using any of these change within a day, so can't be cached by date.
+TIME_DIRECTIVES_RE = re.compile(r"%[-#]?[HIMSpfzZXcsT]")
+
+
+@dataclass(frozen=True)
+class UploadSettings:
+    shard: Optional[Callable]
+    date_format: str
+    shard_depth: int
+    id_bucket_size: int
+
+
+@lru_cache(maxsize=None)
+def get_upload_settings() -> UploadSettings:
+    date_format = getattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH", None)
+    sharding = getattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING", "date" if date_format else None)
+
+    if sharding is None or callable(sharding):
+        shard = sharding
+    elif sharding in SHARDING_STRATEGIES:
+        shard = SHARDING_STRATEGIES[sharding]
+    else:
+        try:
+            shard = import_string(sharding)
+        except ImportError as e:
+            raise ImproperlyConfigured(f"Unknown WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING {sharding!r}: {e}")
+
+    return UploadSettings(
+        shard=shard,
+        date_format=date_format or "%Y/%m",
+        shard_depth=getattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_SHARD_DEPTH", 2),
+        id_bucket_size=getattr(settings, "WAGTIALIMAGECAPTIONS_UPLOAD_ID_BUCKET_SIZE", 1000),
+    )
+
+
+@receiver(setting_changed)
+def reset_upload_settings(setting, **kwargs):
+    if setting.startswith("WAGTIALIMAGECAPTIONS_UPLOAD_"):
+        get_upload_settings.cache_clear()
+
+
+@lru_cache(maxsize=16)
+def _format_date(date_format: str, day: date) -> str:
+    return day.strftime(date_format)
+
+
+def shard_by_date(instance, filename: str) -> str:
+    date_format = get_upload_settings().date_format
+    now = timezone.now()
+    if TIME_DIRECTIVES_RE.search(date_format):
+        return now.strftime(date_format)
+    return _format_date(date_format, now.date())
+
+
+def shard_by_hash(instance, filename: str) -> str:
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return os.path.join(*(digest[i * 2 : i * 2 + 2] for i in range(get_upload_settings().shard_depth)))
+
+
+def shard_by_image_id(instance, filename: str) -> str:
+    # Renditions are bucketed by the ID of their image, originals by their own.
+    image_id = getattr(instance, "image_id", None) or instance.pk
+    if image_id is None:
+        return shard_by_hash(instance, filename)
+    return str(image_id // get_upload_settings().id_bucket_size)
+
+
+SHARDING_STRATEGIES = {
+    "date": shard_by_date,
+    "hash": shard_by_hash,
+    "id": shard_by_image_id,
+}
+
+
+def get_folder(instance, filename: str, folder: str) -> str:
+    if (shard := get_upload_settings().shard) is None:
+        return folder
+    return os.path.join(folder, shard(instance, filename))
+
+
+def get_image_upload_to(instance, filename: str) -> str:
+    """
+    Returns the upload path of an original image, with the file name converted to ASCII and
+    truncated like Wagtail does.
+    """
+    filename = instance.file.field.storage.get_valid_name(filename)
+
+    # convert the filename to simple ascii characters and then
+    # replace non-ascii characters in filename with _ , to sidestep issues with filesystem encoding
+    filename = "".join((i if ord(i) < 128 else "_") for i in string_to_ascii(filename))
+
+    folder_name = get_folder(instance, filename, ORIGINALS_FOLDER)
+
+    # Truncate filename so it fits in the 100 character limit
+    # https://code.djangoproject.com/ticket/9893
+    full_path = os.path.join(folder_name, filename)
+    if len(full_path) >= MAX_PATH_LENGTH:
+        chars_to_trim = len(full_path) - MAX_PATH_LENGTH + 1
+        prefix, extension = os.path.splitext(filename)
+        full_path = os.path.join(folder_name, prefix[:-chars_to_trim] + extension)
+
+    return full_path
+
+
+def get_rendition_upload_to(instance, filename: str) -> str:
+    """
+    Returns the upload path of a rendition. Its file name is derived from the (already
+    ASCII) name of the original.
+    """
+    filename = instance.file.field.storage.get_valid_name(filename)
+    return os.path.join(get_folder(instance, filename, RENDITIONS_FOLDER), filename)
@@ -0,0 +1,22 @@
+"""
+Set up of worker processes. Processes started with "spawn" import the pool's initializer
+before Django is set up, so this module mustn't import models.
+"""
+
+import django
+from django.db import connections
+
+
+def setup_worker():
+    django.setup()
+
+
+def start_workers(executor):
+    """
+    Starts the processes of a `ProcessPoolExecutor` right away, rather than on the first
+    submit, with the database connections closed, so forked workers don't inherit an open
+    connection. Call it before running queries whose results are iterated while submitting.
+    """
+    connections.close_all()
+    for future in [executor.submit(int) for _ in range(executor._max_workers)]:
+        future.result()
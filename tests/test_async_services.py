@@ -0,0 +1,90 @@
+import asyncio
+from unittest import mock
+
+from django.test import override_settings
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions import async_services, services, signals
+from wagtailimagecaptions.async_services import aextract_metadata, aimagefile_to_model
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, ImageTransactionTestCase, create_image, image_file
+
+
+class AsyncImageFileToModelTestCase(ImageTransactionTestCase):
+    async def test_creates_image_with_metadata(self):
+        with mock.patch.object(signals, "extract_metadata", wraps=signals.extract_metadata) as signal_extract:
+            image = await aimagefile_to_model(image_file())
+
+        self.assertEqual(image.title, "A synthetic headline")
+        self.assertEqual(image.camera_make, "Fujifilm")
+        self.assertAlmostEqual(image.latitude, 38.889817, places=6)
+        self.assertEqual(image.iptc_data["byline"], "Jane Photographer")
+        # The meta data was applied up front, so the pre_save signal didn't parse again.
+        signal_extract.assert_not_called()
+
+    async def test_concurrent_uploads_share_creation(self):
+        data = make_jpeg()
+        with mock.patch.object(services, "extract_metadata", wraps=services.extract_metadata) as extract_metadata:
+            images = await asyncio.gather(*(aimagefile_to_model(image_file(data)) for _ in range(5)))
+
+        self.assertEqual(len({image.pk for image in images}), 1)
+        self.assertEqual(await get_image_model().objects.acount(), 1)
+        extract_metadata.assert_called_once()
+
+    async def test_existing_image(self):
+        image = await aimagefile_to_model(image_file())
+        again = await aimagefile_to_model(image_file(name="copy.jpg"))
+        self.assertEqual(again.pk, image.pk)
+
+        other = await aimagefile_to_model(image_file(make_jpeg(color=(0, 0, 0))))
+        self.assertNotEqual(other.pk, image.pk)
+
+    async def test_closes_files(self):
+        upload = image_file()
+        await aimagefile_to_model(upload)
+        self.assertTrue(upload.closed)
+
+    async def test_extract_metadata(self):
+        metadata = await aextract_metadata(image_file())
+        self.assertEqual(metadata.iptc["credit"], "Test Wire")
+        self.assertEqual(metadata.exif["Model"], "X100V")
+
+    async def test_concurrency_limit(self):
+        running = peak = 0
+        extract_metadata = async_services.extract_metadata
+
+        def slow_extract(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                return extract_metadata(*args, **kwargs)
+            finally:
+                running -= 1
+
+        with override_settings(WAGTIALIMAGECAPTIONS_ASYNC_WORKERS=4, WAGTIALIMAGECAPTIONS_ASYNC_CONCURRENCY=2):
+            with mock.patch.object(async_services, "extract_metadata", slow_extract):
+                await asyncio.gather(*(aextract_metadata(image_file()) for _ in range(8)))
+        self.assertLessEqual(peak, 2)
+
+
+class PreSaveTestCase(ImageTestCase):
+    def test_empty_iptc_data_is_extracted(self):
+        # Setting iptc_data before saving doesn't skip the extraction, only the flag does.
+        image = create_image(iptc_data={})
+        self.assertEqual(image.iptc_data["headline"], "A synthetic headline")
+        self.assertEqual(image.title, "A synthetic headline")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_METADATA_BACKEND="wagtailimagecaptions.deferred.DatabaseQueueBackend")
+    def test_empty_iptc_data_is_deferred(self):
+        image = create_image(iptc_data={})
+        self.assertTrue(image.metadata_pending)
+
+    def test_applied_metadata_flag(self):
+        image = get_image_model()(title="photo.jpg", file=image_file())
+        image._metadata_applied = True
+        with mock.patch.object(signals, "extract_metadata") as extract_metadata:
+            image.save()
+        extract_metadata.assert_not_called()
+        self.assertIsNone(image.iptc_data)
@@ -0,0 +1,68 @@
+from django.template import Context, Template
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.renditions import get_image_bundles
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+
+class ImageBundlesTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        create_image()
+        create_image(make_jpeg(color=(0, 0, 0), iptc=False), name="plain.jpg")
+        self.images = list(get_image_model().objects.order_by("pk"))
+
+    def test_bundles(self):
+        bundles = get_image_bundles(self.images, "fill-32x24", large="width-48")
+        self.assertEqual([bundle.image for bundle in bundles], self.images)
+        self.assertEqual(list(bundles[0].renditions), ["fill-32x24", "large"])
+        self.assertEqual(bundles[0].rendition, bundles[0].renditions["fill-32x24"])
+        self.assertEqual((bundles[0].renditions["large"].width, bundles[0].rendition.height), (48, 24))
+
+        self.assertEqual(bundles[0].alt, "A synthetic headline")
+        self.assertEqual(bundles[0].credit, "Test Wire")
+        self.assertEqual(bundles[0].byline, "Jane Photographer")
+        self.assertIn("It has two paragraphs.", bundles[0].caption)
+        # Without meta data, the title is the alt text.
+        self.assertEqual((bundles[1].alt, bundles[1].caption), ("plain.jpg", ""))
+
+    def test_existing_renditions_single_query(self):
+        get_image_bundles(self.images, "fill-32x24", "width-48")
+
+        images = list(get_image_model().objects.order_by("pk"))
+        with self.assertNumQueries(1):
+            bundles = get_image_bundles(images, "fill-32x24", "width-48")
+            # The renditions are prefetched for later lookups, and link back to their image.
+            self.assertEqual(images[0].get_rendition("width-48"), bundles[0].renditions["width-48"])
+            self.assertIs(bundles[0].rendition.image, images[0])
+
+    def test_missing_renditions_created(self):
+        self.images[0].get_rendition("fill-32x24")
+        get_image_bundles(self.images, "fill-32x24", "width-48")
+        self.assertEqual(self.images[0].renditions.count(), 2)
+        self.assertEqual(self.images[1].renditions.count(), 2)
+
+    def test_repeated_and_empty_images(self):
+        bundles = get_image_bundles([self.images[0], None, self.images[0]], "width-48")
+        self.assertEqual(len(bundles), 2)
+        self.assertEqual(bundles[0].rendition, bundles[1].rendition)
+        self.assertEqual(self.images[0].renditions.count(), 1)
+
+    def test_without_specs(self):
+        with self.assertNumQueries(0):
+            bundles = get_image_bundles(self.images)
+        self.assertEqual([bundle.renditions for bundle in bundles], [{}, {}])
+        self.assertIsNone(bundles[0].rendition)
+
+    def test_template_tag(self):
+        template = Template(
+            "{% load wagtailimagecaptions_tags %}"
+            '{% image_bundles images "width-48" as bundles %}'
+            "{% for bundle in bundles %}<img src='{{ bundle.rendition.url }}' alt='{{ bundle.alt }}'>{% endfor %}"
+        )
+        html = template.render(Context({"images": self.images}))
+        self.assertEqual(html.count("<img"), 2)
+        self.assertIn("alt='A synthetic headline'", html)
+        self.assertIn(self.images[0].renditions.get().url, html)
@@ -0,0 +1,96 @@
+import io
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import override_settings
+from wagtail.images import get_image_model
+from wagtail.templatetags.wagtailcore_tags import richtext
+
+from wagtailimagecaptions import captions
+from wagtailimagecaptions.captions import caption_cache_key, get_caption_cache, warm_captions
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+CAPTIONS_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "captions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "captions"},
+}
+
+
+class CaptionCacheTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        get_caption_cache().clear()
+        self.image = create_image()
+        self.rendering = mock.patch.object(captions, "richtext", wraps=richtext)
+
+    def test_cached(self):
+        with self.rendering as render:
+            rendered = self.image.rendered_caption
+            self.assertEqual(get_image_model().objects.get(pk=self.image.pk).rendered_caption, rendered)
+
+        render.assert_called_once()
+        self.assertEqual(rendered, richtext(self.image.caption))
+        self.assertIn("<p>It has two paragraphs.</p>", rendered)
+
+    def test_edited_caption(self):
+        self.image.rendered_caption
+        # Another process's edit changes the key, so the stale entry isn't used.
+        get_image_model().objects.filter(pk=self.image.pk).update(caption="<p>Edited</p>")
+        self.assertEqual(get_image_model().objects.get(pk=self.image.pk).rendered_caption, "<p>Edited</p>")
+
+    def test_save_invalidates(self):
+        self.image.rendered_caption
+        self.image.save()
+        self.assertIsNone(get_caption_cache().get(caption_cache_key(self.image)))
+
+    def test_unsaved_and_empty(self):
+        image = get_image_model()(caption="<p>Unsaved</p>")
+        self.assertEqual(image.rendered_caption, "<p>Unsaved</p>")
+        image.caption = ""
+        self.assertEqual(image.rendered_caption, "")
+
+    @override_settings(
+        CACHES=CAPTIONS_CACHE,
+        WAGTIALIMAGECAPTIONS_CAPTION_CACHE="captions",
+        WAGTIALIMAGECAPTIONS_CAPTION_CACHE_TIMEOUT=60,
+    )
+    def test_settings(self):
+        with mock.patch.object(caches["captions"], "set", wraps=caches["captions"].set) as cache_set:
+            rendered = self.image.rendered_caption
+        cache_set.assert_called_once_with(caption_cache_key(self.image), rendered, 60)
+        self.assertIsNone(caches["default"].get(caption_cache_key(self.image)))
+
+
+class WarmCaptionsTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        get_caption_cache().clear()
+        self.images = [
+            create_image(),
+            create_image(make_jpeg(color=(0, 0, 0)), name="other.jpg"),
+            create_image(make_jpeg(color=(255, 0, 0), iptc=False), name="uncaptioned.jpg"),
+        ]
+
+    def test_warm(self):
+        self.images[0].rendered_caption
+        self.assertEqual(warm_captions(self.images), 1)
+        self.assertEqual(warm_captions(self.images), 0)
+        self.assertEqual(warm_captions(self.images, force=True), 2)
+
+        with mock.patch.object(captions, "richtext") as render:
+            self.images[1].rendered_caption
+        render.assert_not_called()
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command("warm_captions", str(self.images[0].pk), stdout=stdout)
+        self.assertIn("Rendered 1 of 1 captions.", stdout.getvalue())
+
+        call_command("warm_captions", stdout=stdout)
+        self.assertIn("Rendered 1 of 2 captions.", stdout.getvalue())
+
+        call_command("warm_captions", "--recent", "1", "--force", stdout=stdout)
+        self.assertIn("Rendered 1 of 1 captions.", stdout.getvalue().splitlines()[-1])
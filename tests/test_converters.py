@@ -0,0 +1,132 @@
+import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL.TiffImagePlugin import IFDRational
+
+from wagtailimagecaptions import services
+from wagtailimagecaptions.services import (
+    convert_exif_batch,
+    convert_exif_values,
+    exif_conversion_batch,
+    metadata_cache_key,
+)
+
+
+def raw_exif(**overrides) -> dict:
+    return {
+        "DateTime": "2023:03:14 15:09:26",
+        "DateTimeOriginal": "2023:03:14 15:09:26",
+        "FNumber": IFDRational(28, 10),
+        "MaxApertureValue": IFDRational(297, 100),
+        "FocalLength": IFDRational(23, 1),
+        "FocalLengthIn35mmFilm": 35,
+        "Orientation": 6,
+        "ResolutionUnit": 2,
+        "ExposureProgram": 3,
+        "MeteringMode": 5,
+        "XResolution": IFDRational(72, 1),
+        "ExposureTime": IFDRational(1, 250),
+        "ExposureBiasValue": IFDRational(0, 1),
+        "Make": "Fujifilm",
+        **overrides,
+    }
+
+
+class ConvertExifValuesTestCase(SimpleTestCase):
+    def test_converts(self):
+        exif = raw_exif()
+        self.assertEqual(convert_exif_values(exif), {})
+        self.assertEqual(
+            exif,
+            {
+                "DateTime": datetime.datetime(2023, 3, 14, 15, 9, 26),
+                "DateTimeOriginal": datetime.datetime(2023, 3, 14, 15, 9, 26),
+                "FNumber": "f2.8",
+                "MaxApertureValue": "f3.0",
+                "FocalLength": "23.0mm",
+                "FocalLengthIn35mmFilm": "35mm",
+                "Orientation": "Rotate 90 CW",
+                "ResolutionUnit": "Inches",
+                "ExposureProgram": "Aperture-priority AE",
+                "MeteringMode": "Multi-segment",
+                "XResolution": 72,
+                "ExposureTime": "1/250",
+                "ExposureBiasValue": "0.0 EV",
+                "Make": "Fujifilm",
+            },
+        )
+
+    def test_datetime_fallback(self):
+        exif = {"DateTime": "2023:3:14 15:09:26"}
+        convert_exif_values(exif)
+        self.assertEqual(exif["DateTime"], datetime.datetime(2023, 3, 14, 15, 9, 26))
+
+    def test_failures_are_isolated(self):
+        exif = {"DateTime": "yesterday", "Orientation": 99, "FNumber": IFDRational(28, 10)}
+        errors = convert_exif_values(exif)
+        self.assertEqual(set(errors), {"DateTime", "Orientation"})
+        self.assertTrue(errors["Orientation"].startswith("IndexError"))
+        self.assertEqual(exif, {"DateTime": "yesterday", "Orientation": 99, "FNumber": "f2.8"})
+
+
+class ConvertExifBatchTestCase(SimpleTestCase):
+    def test_same_as_one_by_one(self):
+        dicts = [raw_exif(), raw_exif(Orientation=1, DateTime="2024:01:01 00:00:00"), raw_exif(DateTime="bad"), {}]
+        expected = [dict(exif) for exif in dicts]
+        expected_errors = [convert_exif_values(exif) for exif in expected]
+
+        self.assertEqual(convert_exif_batch(dicts), expected_errors)
+        self.assertEqual(dicts, expected)
+
+    def test_shares_conversions(self):
+        first, second = raw_exif(), raw_exif()
+        convert_exif_batch([first, second])
+        self.assertIs(first["DateTime"], second["DateTime"])
+        self.assertIs(first["DateTime"], first["DateTimeOriginal"])
+
+    def test_memo_keyed_by_converter(self):
+        # The same value means something else to each converter.
+        exif = {"Orientation": 3, "ExposureProgram": 3, "MeteringMode": 3}
+        convert_exif_batch([exif])
+        self.assertEqual(
+            exif, {"Orientation": "Rotate 180", "ExposureProgram": "Aperture-priority AE", "MeteringMode": "Spot"}
+        )
+
+    def test_context(self):
+        first, second = raw_exif(), raw_exif()
+        with exif_conversion_batch():
+            convert_exif_values(first)
+            convert_exif_values(second)
+        self.assertIs(first["DateTime"], second["DateTime"])
+
+        third = raw_exif()
+        convert_exif_values(third)
+        self.assertEqual(third["DateTime"], first["DateTime"])
+        self.assertIsNot(third["DateTime"], first["DateTime"])
+
+    def test_context_reset_on_error(self):
+        with self.assertRaises(RuntimeError), exif_conversion_batch():
+            raise RuntimeError
+        self.assertIsNone(services._conversion_memo.get())
+
+
+class ConverterFingerprintTestCase(SimpleTestCase):
+    def test_part_of_cache_key(self):
+        key = metadata_cache_key("abc", exif=True)
+        self.assertEqual(metadata_cache_key("abc", exif=True), key)
+        self.assertNotEqual(metadata_cache_key("abc", exif=False), key)
+
+        for converter in (str, "{} mm".format, lambda value: value):
+            with self.subTest(converter=converter):
+                with mock.patch.dict(services.EXIF_CONVERTERS, {"FocalLength": converter}):
+                    self.assertNotEqual(metadata_cache_key("abc", exif=True), key)
+        self.assertEqual(metadata_cache_key("abc", exif=True), key)
+
+    def test_converter_code_in_cache_key(self):
+        keys = set()
+        # The same byte code, with other constants.
+        for converter in (lambda value: "{}mm".format(value), lambda value: "{} mm".format(value)):
+            with mock.patch.dict(services.EXIF_CONVERTERS, {"FocalLength": converter}):
+                keys.add(metadata_cache_key("abc", exif=True))
+        self.assertEqual(len(keys), 2)
@@ -0,0 +1,59 @@
+from datetime import date, datetime, timezone
+
+from django.test import override_settings
+from wagtail.images import get_image_model
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+# DateTimeOriginal, OffsetTimeOriginal
+DATES = [
+    ("2023:03:14 15:09:26", "-05:00"),
+    ("2023:03:31 23:30:00", "+02:00"),
+    ("2023:04:01 09:00:00", None),
+    ("2022:12:24 18:00:00", "+00:00"),
+]
+
+
+class DateTimeOriginalTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.images = []
+        for i, (taken, offset) in enumerate(DATES):
+            exif_tags = {0x9003: taken, 0x9011: offset or ""}
+            self.images.append(create_image(make_jpeg(color=(0, 0, i), exif_tags=exif_tags), name=f"{i}.jpg"))
+        create_image(make_jpeg(color=(255, 0, 0), exif=False), name="undated.jpg")
+
+    def pks(self, queryset) -> list:
+        return [self.images.index(image) for image in queryset.order_by("date_time_original")]
+
+    def test_offsets(self):
+        taken = [get_image_model().objects.get(pk=image.pk).date_time_original for image in self.images]
+        self.assertEqual(taken[0], datetime(2023, 3, 14, 20, 9, 26, tzinfo=timezone.utc))
+        self.assertEqual(taken[1], datetime(2023, 3, 31, 21, 30, tzinfo=timezone.utc))
+        # Without an offset, the time is in the current time zone.
+        self.assertEqual(taken[2], datetime(2023, 4, 1, 9, tzinfo=timezone.utc))
+
+    def test_taken_between(self):
+        ImageModel = get_image_model()
+        march = ImageModel.objects.taken_between(
+            datetime(2023, 3, 1, tzinfo=timezone.utc), datetime(2023, 4, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(self.pks(march), [0, 1])
+        self.assertEqual(self.pks(ImageModel.objects.taken_between(end=datetime(2023, 1, 1, tzinfo=timezone.utc))), [3])
+        self.assertEqual(
+            self.pks(ImageModel.objects.taken_between(start=datetime(2023, 4, 1, 9, tzinfo=timezone.utc))), [2]
+        )
+
+    def test_histogram(self):
+        ImageModel = get_image_model()
+        self.assertEqual(
+            ImageModel.objects.taken_histogram("month"),
+            [(date(2022, 12, 1), 1), (date(2023, 3, 1), 2), (date(2023, 4, 1), 1)],
+        )
+        self.assertEqual(ImageModel.objects.taken_histogram("year"), [(date(2022, 1, 1), 1), (date(2023, 1, 1), 3)])
+
+    @override_settings(TIME_ZONE="Asia/Tokyo")
+    def test_histogram_time_zone(self):
+        # 23:30 on March 31st at UTC+2 is in April in Tokyo (UTC+9).
+        self.assertIn((date(2023, 4, 1), 2), get_image_model().objects.taken_histogram("month"))
@@ -0,0 +1,53 @@
+import io
+
+from django.core.management import call_command
+from django.test import override_settings
+from wagtail.images import get_image_model
+
+from .utils import ImageTestCase, create_image
+
+
+class DeferMetadataTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pk = create_image().pk
+
+    def test_deferred(self):
+        image = get_image_model().objects.get(pk=self.pk)
+        self.assertEqual(image.get_deferred_fields(), {"iptc_data", "exif_data"})
+
+        # Accessing a deferred field loads it.
+        with self.assertNumQueries(1):
+            self.assertEqual(image.iptc_data["headline"], "A synthetic headline")
+
+    def test_with_metadata(self):
+        image = get_image_model().objects.with_metadata().get(pk=self.pk)
+        self.assertEqual(image.get_deferred_fields(), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(image.exif_data["Model"], "X100V")
+
+    def test_save_keeps_metadata(self):
+        image = get_image_model().objects.get(pk=self.pk)
+        image.title = "Edited"
+        image.save()
+
+        image = get_image_model().objects.with_metadata().get(pk=self.pk)
+        self.assertEqual(image.title, "Edited")
+        self.assertEqual(image.iptc_data["credit"], "Test Wire")
+        self.assertEqual(image.exif_data["Make"], "Fujifilm")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_DEFER_METADATA=False)
+    def test_disabled(self):
+        self.assertEqual(get_image_model().objects.get(pk=self.pk).get_deferred_fields(), set())
+
+    def test_only_with_metadata(self):
+        # The backfill command combines `with_metadata()` with `only()`, which needs the EXIF data.
+        get_image_model().objects.filter(pk=self.pk).update(iso=None, date_time_original=None)
+        stdout = io.StringIO()
+        with self.assertNumQueries(2):
+            call_command("backfill_exif_fields", stdout=stdout)
+
+        self.assertIn("Updated 1 of 1 images.", stdout.getvalue())
+        image = get_image_model().objects.get(pk=self.pk)
+        self.assertEqual(image.iso, 400)
+        self.assertIsNotNone(image.date_time_original)
@@ -0,0 +1,127 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions import deferred, signals
+from wagtailimagecaptions.deferred import DatabaseQueueBackend, ThreadPoolBackend, process_image, process_queue
+from wagtailimagecaptions.models import MetadataExtractionTask
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+QUEUE_BACKEND = "wagtailimagecaptions.deferred.DatabaseQueueBackend"
+
+
+@override_settings(WAGTIALIMAGECAPTIONS_METADATA_BACKEND=QUEUE_BACKEND)
+class DatabaseQueueTestCase(ImageTestCase):
+    def test_queued(self):
+        image = create_image(name="queued.jpg")
+        self.assertTrue(image.metadata_pending)
+        self.assertIsNone(image.iptc_data)
+        self.assertEqual(image.title, "queued.jpg")
+        self.assertTrue(MetadataExtractionTask.objects.filter(image_id=image.pk).exists())
+
+    def test_process_queue(self):
+        image = create_image(name="processed.jpg")
+        self.assertEqual(process_queue(), 1)
+
+        image.refresh_from_db()
+        self.assertFalse(image.metadata_pending)
+        self.assertEqual(image.title, "A synthetic headline")
+        self.assertEqual(image.credit, "Test Wire")
+        self.assertEqual(image.camera_model, "X100V")
+        self.assertTrue(image.geohash.startswith("dqcj"))
+        self.assertIsNotNone(image.date_time_original)
+        self.assertFalse(MetadataExtractionTask.objects.exists())
+
+    def test_command(self):
+        create_image(name="command.jpg")
+        call_command("process_metadata_queue", stdout=mock.Mock())
+        self.assertFalse(MetadataExtractionTask.objects.exists())
+        self.assertFalse(get_image_model().objects.filter(metadata_pending=True).exists())
+
+    def test_editorial_changes_kept(self):
+        image = create_image(name="edited.jpg")
+        # An editor changes the image before the queue is processed.
+        get_image_model().objects.filter(pk=image.pk).update(title="Editor title", caption="<p>Editor caption</p>")
+        process_queue()
+
+        image.refresh_from_db()
+        self.assertEqual(image.title, "Editor title")
+        self.assertEqual(image.caption, "<p>Editor caption</p>")
+        # Fields left blank are filled in.
+        self.assertEqual(image.alt, "A synthetic headline")
+        self.assertEqual(image.byline, "Jane Photographer")
+        self.assertEqual(image.camera_make, "Fujifilm")
+        self.assertFalse(image.metadata_pending)
+
+    def test_editorial_changes_while_parsing_kept(self):
+        image = create_image(name="parsing.jpg")
+        extract_metadata = deferred.extract_metadata
+
+        def edit_and_extract(*args, **kwargs):
+            get_image_model().objects.filter(pk=image.pk).update(title="Editor title")
+            return extract_metadata(*args, **kwargs)
+
+        with mock.patch.object(deferred, "extract_metadata", edit_and_extract):
+            fields = process_image(image.pk)
+
+        image.refresh_from_db()
+        self.assertEqual(image.title, "Editor title")
+        self.assertNotIn("title", fields)
+        self.assertIn("credit", fields)
+
+    def test_default_title_after_rename(self):
+        # The second upload of a name is stored under another name, the title stays the same.
+        create_image(name="same.jpg")
+        image = create_image(make_jpeg(color=(0, 0, 0)), name="same.jpg")
+        self.assertNotEqual(image.file.name.rsplit("/", 1)[-1], "same.jpg")
+        process_image(image.pk)
+
+        image.refresh_from_db()
+        self.assertEqual(image.title, "A synthetic headline")
+
+    def test_failures_retried(self):
+        image = create_image(name="failing.jpg")
+        with mock.patch.object(deferred, "extract_metadata", side_effect=OSError("unreadable")):
+            # The task is retried until it failed `max_attempts` times.
+            self.assertEqual(process_queue(max_attempts=2), 2)
+            self.assertEqual(process_queue(max_attempts=2), 0)
+
+        task = MetadataExtractionTask.objects.get(image_id=image.pk)
+        self.assertEqual(task.attempts, 2)
+        self.assertEqual(task.last_error, "OSError: unreadable")
+
+        self.assertEqual(process_queue(max_attempts=3), 1)
+        self.assertFalse(MetadataExtractionTask.objects.exists())
+
+    def test_backend_unset_before_post_save(self):
+        with mock.patch.object(signals, "get_metadata_backend", side_effect=[DatabaseQueueBackend(), None]):
+            image = create_image(name="unset.jpg")
+
+        self.assertFalse(image.metadata_pending)
+        self.assertEqual(image.title, "A synthetic headline")
+        self.assertFalse(MetadataExtractionTask.objects.exists())
+        image.refresh_from_db()
+        self.assertEqual(image.credit, "Test Wire")
+
+
+@override_settings(WAGTIALIMAGECAPTIONS_METADATA_BACKEND="wagtailimagecaptions.deferred.ThreadPoolBackend")
+class ThreadPoolBackendTestCase(ImageTestCase):
+    def test_submitted_on_commit(self):
+        with mock.patch.object(ThreadPoolBackend, "run") as run:
+            with self.captureOnCommitCallbacks(execute=True):
+                image = create_image(name="threaded.jpg")
+                run.assert_not_called()
+            deferred.get_metadata_backend().executor.shutdown(wait=True)
+        run.assert_called_once_with(image.pk)
+
+
+class ExtractOnSaveTestCase(ImageTestCase):
+    def test_without_backend(self):
+        image = create_image(name="inline.jpg")
+        self.assertFalse(image.metadata_pending)
+        self.assertEqual(image.title, "A synthetic headline")
+        self.assertFalse(MetadataExtractionTask.objects.exists())
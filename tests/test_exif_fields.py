@@ -0,0 +1,55 @@
+from PIL.TiffImagePlugin import IFDRational
+from wagtail.images import get_image_model
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+
+class ExifFieldsTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.images = [
+            create_image(make_jpeg(color=(0, 0, i), exif_tags=tags), name=f"{i}.jpg")
+            for i, tags in enumerate(
+                [
+                    {},
+                    {0x8827: 1600, 0x829D: IFDRational(14, 10)},
+                    {0x8827: 3200, 0x829D: IFDRational(56, 10), 0x829A: IFDRational(1, 1000)},
+                ]
+            )
+        ]
+        self.images.append(create_image(make_jpeg(color=(255, 0, 0), exif=False), name="plain.jpg"))
+
+    def test_numeric_fields(self):
+        image = get_image_model().objects.get(pk=self.images[0].pk)
+        self.assertEqual((image.f_number, image.exposure_time, image.iso), (2.8, 0.004, 400))
+        self.assertEqual(image.focal_length_mm, 23.0)
+
+        plain = get_image_model().objects.get(pk=self.images[3].pk)
+        self.assertEqual((plain.f_number, plain.exposure_time, plain.iso), (None, None, None))
+
+    def test_range(self):
+        ImageModel = get_image_model()
+        self.assertEqual(
+            {image.pk for image in ImageModel.objects.exif_range(iso=(1600, None))},
+            {self.images[1].pk, self.images[2].pk},
+        )
+        self.assertEqual(
+            [image.pk for image in ImageModel.objects.exif_range(iso=(1600, None), f_number=(None, 2))],
+            [self.images[1].pk],
+        )
+        self.assertEqual(ImageModel.objects.exif_range(exposure_time=(0.001, 0.001)).get().pk, self.images[2].pk)
+
+    def test_range_unknown_field(self):
+        with self.assertRaises(ValueError):
+            get_image_model().objects.exif_range(camera_make=("A", "Z"))
+
+    def test_facets(self):
+        ImageModel = get_image_model()
+        self.assertEqual(ImageModel.objects.exif_facets("iso"), [(400, 1), (1600, 1), (3200, 1)])
+        self.assertEqual(ImageModel.objects.exif_facets("camera_model"), [("X100V", 3)])
+
+    def test_bucketed_facets(self):
+        with self.assertNumQueries(1):
+            facets = get_image_model().objects.exif_facets("f_number", buckets=[1, 2, 4, 8])
+        self.assertEqual(facets, [((1, 2), 1), ((2, 4), 1), ((4, 8), 1)])
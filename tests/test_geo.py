@@ -0,0 +1,132 @@
+from collections import Counter
+
+from django.test import SimpleTestCase, TestCase
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.geo import bounding_box, encode_geohash, geohash_range
+from wagtailimagecaptions.services import ImageMetadata, apply_metadata
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, create_image
+
+# Name -> (latitude, longitude)
+LOCATIONS = {
+    "washington": (38.8977, -77.0365),
+    "arlington": (38.8816, -77.0910),
+    "baltimore": (39.2904, -76.6122),
+    "fiji": (-17.7134, 178.0650),
+    "samoa": (-13.7590, -172.1046),
+}
+
+
+class EncodeGeohashTestCase(SimpleTestCase):
+    def test_known_values(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(encode_geohash(38.8977, -77.0365, 5), "dqcjq")
+        self.assertEqual(len(encode_geohash(38.8977, -77.0365)), 12)
+
+    def test_equator_and_prime_meridian(self):
+        self.assertEqual(encode_geohash(0, 0, 6), "s00000")
+        self.assertEqual(encode_geohash(-1e-9, -1e-9, 6), "7zzzzz")
+        self.assertEqual(encode_geohash(1e-9, -1e-9, 6), "ebpbpb")
+        self.assertEqual(encode_geohash(-1e-9, 1e-9, 6), "kpbpbp")
+
+    def test_bounds(self):
+        self.assertEqual(encode_geohash(90, 180, 4), "zzzz")
+        self.assertEqual(encode_geohash(-90, -180, 4), "0000")
+
+    def test_nearby_locations_share_prefix(self):
+        self.assertEqual(encode_geohash(38.8977, -77.0365, 5), encode_geohash(38.8970, -77.0370, 5))
+
+
+class GeohashRangeTestCase(SimpleTestCase):
+    def test_range(self):
+        self.assertEqual(geohash_range("dqcj"), ("dqcj", "dqck"))
+        self.assertEqual(geohash_range("dqcz"), ("dqcz", "dqd"))
+        self.assertEqual(geohash_range("zz"), ("zz", None))
+
+    def test_contains_cell(self):
+        low, high = geohash_range("dqcj")
+        self.assertTrue(low <= encode_geohash(38.8977, -77.0365) < high)
+
+
+class BoundingBoxTestCase(SimpleTestCase):
+    def test_box(self):
+        south, west, north, east = bounding_box(38.8977, -77.0365, 10)
+        self.assertAlmostEqual(north - 38.8977, 0.0899, places=4)
+        self.assertAlmostEqual(38.8977 - south, 0.0899, places=4)
+        self.assertTrue(west < -77.0365 < east)
+        self.assertGreater(east - west, north - south)
+
+    def test_antimeridian(self):
+        south, west, north, east = bounding_box(0, 179.99, 10)
+        self.assertGreater(west, east)
+        self.assertLess(east, -179)
+
+    def test_poles(self):
+        self.assertEqual(bounding_box(89.99, 10, 10)[1::2], (-180.0, 180.0))
+        self.assertEqual(bounding_box(-89.99, 10, 10)[1::2], (-180.0, 180.0))
+
+
+class ApplyLocationTestCase(TestCase):
+    def test_zero_coordinates(self):
+        image = get_image_model()()
+        fields = apply_metadata(image, ImageMetadata(exif={"latitude": 0.0, "longitude": 0.0}))
+        self.assertIn("geohash", fields)
+        self.assertEqual((image.latitude, image.longitude), (0.0, 0.0))
+        self.assertEqual(image.geohash, encode_geohash(0.0, 0.0))
+
+    def test_no_coordinates(self):
+        image = get_image_model()()
+        fields = apply_metadata(image, ImageMetadata(exif={"latitude": None, "longitude": None}))
+        self.assertNotIn("geohash", fields)
+
+
+class LocationQueriesTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        ImageModel = get_image_model()
+        self.images = {}
+        for i, (name, (latitude, longitude)) in enumerate(LOCATIONS.items()):
+            image = create_image(make_jpeg(color=(0, 0, i)), name=f"{name}.jpg")
+            ImageModel.objects.filter(pk=image.pk).update(
+                latitude=latitude, longitude=longitude, geohash=encode_geohash(latitude, longitude)
+            )
+            self.images[image.pk] = name
+        create_image(make_jpeg(color=(255, 0, 0), gps=False), name="unlocated.jpg")
+
+    def names(self, queryset) -> list:
+        return [self.images[image.pk] for image in queryset]
+
+    def test_location_extracted(self):
+        image = create_image(make_jpeg(color=(0, 255, 0)), name="located.jpg")
+        self.assertAlmostEqual(image.latitude, 38.889817, places=6)
+        self.assertAlmostEqual(image.longitude, -77.037811, places=6)
+        self.assertEqual(image.geohash, encode_geohash(image.latitude, image.longitude))
+
+    def test_within_bbox(self):
+        queryset = get_image_model().objects.within_bbox(38.8, -77.1, 39.0, -77.0).order_by("pk")
+        self.assertEqual(self.names(queryset), ["washington", "arlington"])
+
+    def test_within_bbox_antimeridian(self):
+        queryset = get_image_model().objects.within_bbox(-20, 175, -10, -170).order_by("pk")
+        self.assertEqual(self.names(queryset), ["fiji", "samoa"])
+
+    def test_near(self):
+        queryset = get_image_model().objects.near(38.8977, -77.0365, radius_km=60)
+        self.assertEqual(self.names(queryset), ["washington", "arlington", "baltimore"])
+        distances = [image.distance for image in queryset]
+        self.assertAlmostEqual(distances[0], 0, places=3)
+        self.assertAlmostEqual(distances[2], 56, delta=1)
+
+    def test_in_geohash(self):
+        queryset = get_image_model().objects.in_geohash("dqcj").order_by("pk")
+        self.assertEqual(self.names(queryset), ["washington", "arlington"])
+        self.assertEqual(get_image_model().objects.in_geohash("dqc").count(), 3)
+        self.assertEqual(get_image_model().objects.in_geohash("zz").count(), 0)
+
+    def test_geohash_facets(self):
+        expected = Counter(encode_geohash(latitude, longitude, 2) for latitude, longitude in LOCATIONS.values())
+        # Images without a location are left out.
+        self.assertEqual(get_image_model().objects.geohash_facets(2), sorted(expected.items()))
+        self.assertEqual(dict(get_image_model().objects.geohash_facets(4))["dqcj"], 2)
@@ -0,0 +1,45 @@
+import hashlib
+import io
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from wagtailimagecaptions.services import hash_file
+
+from .fixtures import CountingFile, make_jpeg
+
+
+class HashFileTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = make_jpeg()
+        self.expected = hashlib.sha1(self.data).hexdigest()
+
+    def test_stream(self):
+        buffer = io.BytesIO(self.data)
+        buffer.seek(5)
+        self.assertEqual(hash_file(buffer, block_size=100), self.expected)
+        self.assertEqual(buffer.tell(), 5)
+
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "image.jpg"
+            path.write_bytes(self.data)
+            self.assertEqual(hash_file(path), self.expected)
+            self.assertEqual(hash_file(str(path)), self.expected)
+
+    @override_settings(WAGTIALIMAGECAPTIONS_HASH_BLOCK_SIZE=1000)
+    def test_block_size(self):
+        buffer = CountingFile(self.data)
+        self.assertEqual(hash_file(buffer), self.expected)
+        self.assertEqual(buffer.bytes_read, len(self.data))
+
+    def test_rewritten_file(self):
+        buffer = io.BytesIO(self.data)
+        self.assertEqual(hash_file(buffer), self.expected)
+
+        other = make_jpeg(color=(0, 0, 0))
+        buffer.seek(0)
+        buffer.truncate()
+        buffer.write(other)
+        self.assertEqual(hash_file(buffer), hashlib.sha1(other).hexdigest())
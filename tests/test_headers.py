@@ -0,0 +1,100 @@
+import io
+
+from django.test import SimpleTestCase
+from PIL import Image as PILImage
+from PIL.IptcImagePlugin import getiptcinfo
+
+from wagtailimagecaptions.headers import UnsupportedFormat, read_headers
+from wagtailimagecaptions.services import _parse_exif_image, _parse_iptc_image, read_metadata
+
+from .fixtures import DENSE_IPTC_FIELDS, CountingFile, build_iptc, insert_segment, make_jpeg, make_tiff
+
+XMP_PAYLOAD = (
+    b"http://ns.adobe.com/xap/1.0/\x00"
+    b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+    b"</rdf:RDF></x:xmpmeta>"
+)
+
+
+class PillowParityTestCase(SimpleTestCase):
+    """
+    The header-only reader must return what the Pillow based parsers return.
+    """
+
+    def assertParity(self, data: bytes):
+        image = PILImage.open(io.BytesIO(data))
+        metadata = read_metadata(io.BytesIO(data))
+        self.assertEqual(metadata.iptc, _parse_iptc_image(image))
+        self.assertEqual(metadata.exif, _parse_exif_image(image))
+        self.assertEqual((metadata.width, metadata.height), image.size)
+        return metadata
+
+    def test_jpeg(self):
+        metadata = self.assertParity(make_jpeg())
+        self.assertEqual(metadata.iptc["headline"], "A synthetic headline")
+        self.assertEqual(metadata.exif["Make"], "Fujifilm")
+        self.assertAlmostEqual(metadata.exif["latitude"], 38.889817, places=6)
+        self.assertAlmostEqual(metadata.exif["longitude"], -77.037811, places=6)
+
+    def test_jpeg_variants(self):
+        for options in (
+            {"gps": False},
+            {"iptc": False},
+            {"exif": False},
+            {"exif": False, "iptc": False},
+            {"iptc_fields": DENSE_IPTC_FIELDS},
+        ):
+            with self.subTest(**options):
+                self.assertParity(make_jpeg(**options))
+
+    def test_jpeg_raw_headers(self):
+        data = make_jpeg(iptc_fields=DENSE_IPTC_FIELDS)
+        image = PILImage.open(io.BytesIO(data))
+        headers = read_headers(io.BytesIO(data))
+        self.assertEqual(headers.exif, image._getexif())
+        self.assertEqual(headers.iptc, getiptcinfo(image))
+
+    def test_tiff(self):
+        metadata = self.assertParity(make_tiff())
+        self.assertEqual(metadata.iptc["keywords"], ["news", "politics", "test"])
+        self.assertEqual(metadata.exif["Model"], "X100V")
+
+    def test_tiff_variants(self):
+        for options in ({"gps": False}, {"iptc": False}, {"exif": False}, {"iptc_fields": DENSE_IPTC_FIELDS}):
+            with self.subTest(**options):
+                self.assertParity(make_tiff(**options))
+
+    def test_app13_iptc_after_exif(self):
+        data = insert_segment(make_jpeg(iptc=False), 0xED, build_iptc(), after=(0xE0, 0xE1))
+        metadata = self.assertParity(data)
+        self.assertEqual(metadata.iptc["credit"], "Test Wire")
+
+    def test_xmp_before_exif(self):
+        data = insert_segment(make_jpeg(), 0xE1, XMP_PAYLOAD, after=(0xED,))
+        metadata = self.assertParity(data)
+        self.assertEqual(metadata.exif["LensModel"], "23mm f/2")
+        self.assertEqual(metadata.iptc["byline"], "Jane Photographer")
+
+
+class ReadHeadersTestCase(SimpleTestCase):
+    def test_unsupported_format(self):
+        buffer = io.BytesIO()
+        PILImage.new("RGB", (8, 8)).save(buffer, "PNG")
+        with self.assertRaises(UnsupportedFormat):
+            read_headers(buffer)
+
+    def test_truncated_file(self):
+        with self.assertRaises(UnsupportedFormat):
+            read_headers(io.BytesIO(make_jpeg()[:100]))
+
+    def test_stream_position_restored(self):
+        buffer = io.BytesIO(make_jpeg())
+        buffer.seek(10)
+        read_headers(buffer)
+        self.assertEqual(buffer.tell(), 10)
+
+    def test_pixel_data_not_read(self):
+        data = make_jpeg(1024, 768)
+        buffer = CountingFile(data)
+        read_headers(buffer)
+        self.assertLess(buffer.bytes_read, len(data) // 4)
@@ -0,0 +1,137 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions import importer
+from wagtailimagecaptions.importer import ImageImporter, ImportResult, bulk_create_images, find_image_files, scan_files
+from wagtailimagecaptions.models import CaptionedImage
+
+from .fixtures import make_jpeg, make_tiff
+from .utils import ImageTestCase, ImageTransactionTestCase, create_image
+
+
+def thread_pool(max_workers, initializer):
+    # Threads see the test database, unlike worker processes.
+    return ThreadPoolExecutor(max_workers=1)
+
+
+class ImportFilesMixin:
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+class FindImageFilesTestCase(ImportFilesMixin, ImageTestCase):
+    def test_directory(self):
+        b = self.write("b/photo.JPG", b"")
+        a = self.write("a.tif", b"")
+        self.write("notes.txt", b"")
+        self.assertEqual(find_image_files(self.directory), [a, b])
+
+    def test_manifest(self):
+        a = self.write("a.jpg", b"")
+        manifest = self.write("manifest.txt", f"# Photos\na.jpg\n\n{a}\n".encode())
+        self.assertEqual(find_image_files(manifest), [a, a])
+
+
+class BulkCreateImagesTestCase(ImageTestCase):
+    def build(self, title: str, file_hash: str):
+        image = get_image_model()(title=title, file="original_images/photo.jpg", width=64, height=48)
+        image.file_hash, image.camera_make = file_hash, "Fujifilm"
+        return image
+
+    def check_created(self, images):
+        self.assertTrue(all(image.pk for image in images))
+        self.assertEqual(len({image.pk for image in images}), 3)
+        # Both the rows of the parent and of the child model are created.
+        self.assertEqual(CaptionedImage.objects.count(), 3)
+        created = get_image_model().objects.get(pk=images[1].pk)
+        self.assertEqual((created.title, created.file_hash, created.camera_make), ("b", "2", "Fujifilm"))
+
+    def test_multi_table_inheritance(self):
+        images = [self.build(title, str(i)) for i, title in enumerate("abc", 1)]
+        with self.assertNumQueries(2):
+            bulk_create_images(images)
+        self.check_created(images)
+
+    def test_without_returned_rows(self):
+        images = [self.build(title, str(i)) for i, title in enumerate("abc", 1)]
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", new_callable=mock.PropertyMock) as feature:
+            feature.return_value = False
+            bulk_create_images(images, batch_size=2)
+        self.check_created(images)
+
+
+class ImageImporterTestCase(ImportFilesMixin, ImageTestCase):
+    def test_import_batch(self):
+        create_image(make_jpeg(color=(0, 0, 0)))
+        paths = [
+            self.write("photo.jpg", make_jpeg()),
+            self.write("copy.jpg", make_jpeg()),
+            self.write("existing.jpg", make_jpeg(color=(0, 0, 0))),
+            self.write("scan.tif", make_tiff()),
+            self.write("broken.jpg", b"not an image"),
+        ]
+        state_file = os.path.join(self.directory, "state.txt")
+
+        result = ImportResult()
+        ImageImporter(state_file=state_file).import_batch(scan_files(paths), result)
+
+        self.assertEqual((result.created, result.skipped), (2, 2))
+        self.assertEqual(result.failed, [paths[4]])
+        image = get_image_model().objects.get(file_hash=hashlib.sha1(make_jpeg()).hexdigest())
+        self.assertEqual(image.camera_model, "X100V")
+        self.assertTrue(image.file.storage.exists(image.file.name))
+        with open(state_file) as f:
+            self.assertEqual(f.read().splitlines(), paths[:4])
+
+    def test_failed_batch(self):
+        paths = [self.write("photo.jpg", make_jpeg())]
+        image_importer = ImageImporter()
+        with mock.patch.object(importer, "bulk_create_images", side_effect=RuntimeError("Database gone")):
+            with self.assertRaises(RuntimeError):
+                image_importer.import_batch(scan_files(paths), ImportResult())
+
+        # The stored files are deleted again, and the files are imported when retried.
+        self.assertEqual([files for _, _, files in os.walk(self.media_root) if files], [])
+        result = ImportResult()
+        image_importer.import_batch(scan_files(paths), result)
+        self.assertEqual(result.created, 1)
+
+
+class ImportImagesCommandTestCase(ImportFilesMixin, ImageTransactionTestCase):
+    def test_resume(self):
+        self.write("a.jpg", make_jpeg())
+        self.write("b/b.jpg", make_jpeg(color=(0, 0, 0)))
+        state_file = os.path.join(self.directory, "state.txt")
+
+        stdout = io.StringIO()
+        with mock.patch.object(importer, "ProcessPoolExecutor", thread_pool):
+            call_command(
+                "import_images", self.directory, "--batch-size", "1", "--state-file", state_file, stdout=stdout
+            )
+            self.assertIn("Imported 2 images.", stdout.getvalue())
+            self.assertEqual(get_image_model().objects.count(), 2)
+
+            self.write("c.jpg", make_jpeg(color=(255, 0, 0)))
+            call_command("import_images", self.directory, "--state-file", state_file, stdout=stdout)
+            self.assertIn("Imported 1 images.", stdout.getvalue())
+
+        self.assertEqual(get_image_model().objects.count(), 3)
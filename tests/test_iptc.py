@@ -0,0 +1,114 @@
+import io
+
+from django.test import SimpleTestCase, override_settings
+
+from wagtailimagecaptions.iptc import IptcDataset, decode_text, get_iptc_datasets, get_iptc_fingerprint
+from wagtailimagecaptions.services import _iptc_to_dict, metadata_cache_key, read_metadata
+
+from .fixtures import make_jpeg
+
+
+def decode_upper(value):
+    return decode_text(value).upper()
+
+
+def decode_lower(value):
+    return decode_text(value).lower()
+
+
+class IptcRegistryTestCase(SimpleTestCase):
+    def test_builtin_datasets(self):
+        iptc = _iptc_to_dict(
+            {
+                (2, 5): b"Object",
+                (2, 25): [b"news", b"politics"],
+                (2, 105): [b"First headline", b"Second headline"],
+                (2, 15): b"Not registered",
+                (2, 120): b"",
+            }
+        )
+        self.assertEqual(
+            iptc, {"object_name": "Object", "keywords": ["news", "politics"], "headline": "First headline"}
+        )
+
+    def test_single_repeatable_value_is_a_list(self):
+        self.assertEqual(_iptc_to_dict({(2, 25): b"news"}), {"keywords": ["news"]})
+
+    def test_stored_format(self):
+        # Repeatable datasets are lists even with a single value, others keep their first value.
+        data = make_jpeg(iptc_fields={(2, 25): "news", (2, 80): ["Jane Photographer", "John Photographer"]})
+        self.assertEqual(read_metadata(io.BytesIO(data)).iptc, {"keywords": ["news"], "byline": "Jane Photographer"})
+
+    def test_no_iptc(self):
+        self.assertEqual(_iptc_to_dict(None), {})
+
+    @override_settings(
+        WAGTIALIMAGECAPTIONS_IPTC_DATASETS={
+            (2, 15): "category",
+            (2, 20): {"name": "supplemental_categories", "repeatable": True},
+            (2, 101): {"name": "country_code", "decoder": "tests.test_iptc.decode_upper"},
+            (2, 105): "title",
+        }
+    )
+    def test_registered_datasets(self):
+        datasets = get_iptc_datasets()
+        self.assertEqual(datasets[(2, 15)], IptcDataset("category"))
+        self.assertEqual(datasets[(2, 101)].decoder, decode_upper)
+        self.assertEqual(datasets[(2, 105)].name, "title")
+
+        iptc = _iptc_to_dict(
+            {(2, 15): b"POL", (2, 20): [b"Elections", b"Senate"], (2, 101): b"usa", (2, 105): b"Headline"}
+        )
+        self.assertEqual(
+            iptc,
+            {
+                "category": "POL",
+                "supplemental_categories": ["Elections", "Senate"],
+                "country_code": "USA",
+                "title": "Headline",
+            },
+        )
+
+    def test_registry_reset_with_setting(self):
+        builtin = get_iptc_datasets()
+        with override_settings(WAGTIALIMAGECAPTIONS_IPTC_DATASETS={(2, 15): "category"}):
+            self.assertIn((2, 15), get_iptc_datasets())
+        self.assertEqual(get_iptc_datasets(), builtin)
+        self.assertNotIn((2, 15), get_iptc_datasets())
+
+
+class IptcFingerprintTestCase(SimpleTestCase):
+    def test_stable(self):
+        fingerprint = get_iptc_fingerprint()
+        get_iptc_fingerprint.cache_clear()
+        self.assertEqual(get_iptc_fingerprint(), fingerprint)
+
+    def test_changes_with_registry(self):
+        builtin = get_iptc_fingerprint()
+        for datasets in (
+            {(2, 15): "category"},
+            {(2, 5): "title"},
+            {(2, 5): {"name": "object_name", "repeatable": True}},
+            {(2, 5): {"name": "object_name", "decoder": "tests.test_iptc.decode_upper"}},
+        ):
+            with self.subTest(datasets=datasets), override_settings(WAGTIALIMAGECAPTIONS_IPTC_DATASETS=datasets):
+                self.assertNotEqual(get_iptc_fingerprint(), builtin)
+        self.assertEqual(get_iptc_fingerprint(), builtin)
+
+    @override_settings(WAGTIALIMAGECAPTIONS_IPTC_DATASETS={(2, 101): {"name": "country_code", "decoder": decode_upper}})
+    def test_changes_with_decoder_code(self):
+        fingerprint = get_iptc_fingerprint()
+        code, decode_upper.__code__ = decode_upper.__code__, decode_lower.__code__
+        try:
+            get_iptc_fingerprint.cache_clear()
+            self.assertNotEqual(get_iptc_fingerprint(), fingerprint)
+        finally:
+            decode_upper.__code__ = code
+        get_iptc_fingerprint.cache_clear()
+        self.assertEqual(get_iptc_fingerprint(), fingerprint)
+
+    def test_part_of_cache_key(self):
+        key = metadata_cache_key("abc", exif=False)
+        with override_settings(WAGTIALIMAGECAPTIONS_IPTC_DATASETS={(2, 15): "category"}):
+            self.assertNotEqual(metadata_cache_key("abc", exif=False), key)
+        self.assertEqual(metadata_cache_key("abc", exif=False), key)
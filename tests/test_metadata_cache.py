@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from wagtailimagecaptions.metadata_cache import LRUBackend, SQLiteBackend, get_metadata_cache
+from wagtailimagecaptions.services import extract_metadata
+
+from .utils import image_file
+
+
+@override_settings(WAGTIALIMAGECAPTIONS_METADATA_CACHE="wagtailimagecaptions.metadata_cache.LRUBackend")
+class ExtractMetadataCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        # Each test starts with an empty cache.
+        get_metadata_cache.cache_clear()
+
+    def test_hit(self):
+        metadata = extract_metadata(image_file())
+        self.assertFalse(metadata.cached)
+
+        cached = extract_metadata(image_file())
+        self.assertTrue(cached.cached)
+        self.assertEqual(cached, metadata)
+        stats = get_metadata_cache().stats
+        self.assertEqual((stats.hits, stats.misses, stats.errors), (1, 1, 0))
+
+    def test_lookup_error(self):
+        cache = get_metadata_cache()
+        with mock.patch.object(LRUBackend, "_get", side_effect=ConnectionError("cache down")):
+            with self.assertLogs("wagtailimagecaptions.metadata_cache", "WARNING"):
+                metadata = extract_metadata(image_file())
+
+        self.assertFalse(metadata.cached)
+        self.assertEqual(metadata.iptc["headline"], "A synthetic headline")
+        self.assertEqual((cache.stats.hits, cache.stats.misses, cache.stats.errors), (0, 0, 1))
+
+    def test_store_error(self):
+        cache = get_metadata_cache()
+        with mock.patch.object(LRUBackend, "_set", side_effect=ConnectionError("cache down")):
+            with self.assertLogs("wagtailimagecaptions.metadata_cache", "WARNING"):
+                metadata = extract_metadata(image_file())
+
+        self.assertEqual(metadata.iptc["headline"], "A synthetic headline")
+        self.assertEqual((cache.stats.misses, cache.stats.errors), (1, 1))
+
+
+class SQLiteBackendTestCase(SimpleTestCase):
+    def test_path_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SQLiteBackend()
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SQLiteBackend(os.path.join(directory, "metadata.sqlite3"))
+            cache.set("key", {"headline": "A synthetic headline"})
+            self.assertEqual(cache.get("key"), {"headline": "A synthetic headline"})
+            self.assertIsNone(cache.get("missing"))
+
+    def test_unwritable_path(self):
+        cache = SQLiteBackend(os.path.join(tempfile.gettempdir(), "missing", "directory", "metadata.sqlite3"))
+        with self.assertLogs("wagtailimagecaptions.metadata_cache", "WARNING") as logs:
+            cache.set("key", {})
+            self.assertIsNone(cache.get("key"))
+
+        self.assertIn(sqlite3.OperationalError.__name__, "\n".join(logs.output))
+        self.assertEqual(cache.stats.errors, 2)
+
+
+class LRUBackendTestCase(SimpleTestCase):
+    def test_eviction(self):
+        cache = LRUBackend(max_bytes=200)
+        cache.set("a", "a" * 80)
+        cache.set("b", "b" * 80)
+        cache.get("a")
+        cache.set("c", "c" * 80)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "a" * 80)
+        self.assertLessEqual(cache.size, 200)
@@ -0,0 +1,65 @@
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from wagtailimagecaptions.services import _parse_file, parse_many, read_metadata
+
+from .fixtures import make_jpeg, make_tiff
+
+
+class ReadMetadataTestCase(SimpleTestCase):
+    def test_path(self):
+        data = make_tiff()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.tif")
+            with open(path, "wb") as f:
+                f.write(data)
+            self.assertEqual(read_metadata(path), read_metadata(io.BytesIO(data)))
+            self.assertEqual(read_metadata(Path(path)), read_metadata(io.BytesIO(data)))
+
+
+class ParseManyTestCase(SimpleTestCase):
+    def setUp(self):
+        self.files = [make_jpeg(), make_tiff(), make_jpeg(exif=False), b"not an image"]
+
+    def write_files(self, directory: str) -> list:
+        paths = []
+        for i, data in enumerate(self.files):
+            paths.append(Path(directory) / f"{i}.img")
+            paths[-1].write_bytes(data)
+        return paths
+
+    def test_same_as_one_by_one(self):
+        # A thread pool keeps the test fast, the workers are the same as with processes.
+        with ThreadPoolExecutor(2) as executor:
+            results = parse_many(self.files, executor=executor, chunksize=2)
+
+        self.assertEqual([result.source for result in results], [0, 1, 2, 3])
+        for result, data in zip(results[:3], self.files):
+            self.assertEqual(result.metadata, _parse_file(data, True)[0])
+            self.assertEqual(result.error, "")
+        self.assertIsNone(results[3].metadata)
+        self.assertTrue(results[3].error)
+
+    def test_batches_keep_order(self):
+        files = self.files * 10
+        with ThreadPoolExecutor(2) as executor:
+            results = parse_many(files, exif=False, executor=executor, chunksize=1)
+
+        self.assertEqual([result.source for result in results], list(range(len(files))))
+        self.assertEqual([bool(result.error) for result in results], [False, False, False, True] * 10)
+        self.assertEqual(results[0].metadata.exif, {})
+
+    def test_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.write_files(directory)
+            results = parse_many(paths, workers=2)
+
+        self.assertEqual([result.source for result in results], [os.fspath(path) for path in paths])
+        self.assertEqual(results[0].metadata.iptc["headline"], "A synthetic headline")
+        self.assertEqual(results[1].metadata.exif["Model"], "X100V")
+        self.assertTrue(results[3].error)
@@ -0,0 +1,227 @@
+import io
+import json
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+from PIL import Image as PILImage
+from PIL import ImageFilter
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions.perceptual import (
+    ALGORITHMS,
+    HASH_BITS,
+    group_duplicates,
+    hamming_distance,
+    perceptual_hash,
+    to_signed,
+)
+
+from .utils import ImageTestCase, ImageTransactionTestCase, create_image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    from wagtailimagecaptions.perceptual import HammingIndex
+
+
+def gradient_jpeg(blur: float = 0, linear: bool = False) -> bytes:
+    """
+    Returns a JPEG of a radial (or linear) gradient, which, unlike a plain colour, has a
+    perceptual hash of its own. Blurring it makes a near-duplicate.
+    """
+    image = (PILImage.linear_gradient if linear else PILImage.radial_gradient)("L").resize((320, 240)).convert("RGB")
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def random_hashes(count: int, seed: int = 0) -> list:
+    """
+    Returns signed 64 bit hashes, as stored in the database, with clusters of near
+    duplicates: every third hash is a copy of an earlier one with a few bits flipped.
+    """
+    rng = random.Random(seed)
+    hashes = []
+    for i in range(count):
+        if i % 3 == 2:
+            value = hashes[rng.randrange(i)] & ((1 << HASH_BITS) - 1)
+            for bit in rng.sample(range(HASH_BITS), rng.randrange(12)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(HASH_BITS)
+        hashes.append(to_signed(value))
+    return hashes
+
+
+# Thresholds per number of parts: lookups flip up to `threshold // chunks` bits of a part,
+# so few parts are only fast for small thresholds.
+THRESHOLDS = {2: (0, 3), 4: (0, 4, 8, 11), 8: (0, 8, 12)}
+
+
+def brute_force_pairs(hashes: list, ids: list, threshold: int) -> list:
+    return sorted(
+        (ids[i], ids[j], hamming_distance(hashes[i], hashes[j]))
+        for i in range(len(hashes))
+        for j in range(i + 1, len(hashes))
+        if hamming_distance(hashes[i], hashes[j]) <= threshold
+    )
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class HammingIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        self.hashes = random_hashes(600)
+        self.ids = list(range(1000, 1600))
+
+    def test_query(self):
+        for chunks, thresholds in THRESHOLDS.items():
+            index = HammingIndex(self.hashes, self.ids, chunks=chunks)
+            for threshold in thresholds:
+                for value in self.hashes[:40]:
+                    with self.subTest(chunks=chunks, threshold=threshold, value=value):
+                        expected = sorted(
+                            (id, hamming_distance(value, other))
+                            for id, other in zip(self.ids, self.hashes)
+                            if hamming_distance(value, other) <= threshold
+                        )
+                        result = index.query(value, threshold)
+                        self.assertEqual(sorted(result), expected)
+                        self.assertEqual([distance for _, distance in result], sorted(d for _, d in expected))
+
+    def test_query_without_matches(self):
+        index = HammingIndex([0, 0b1111], chunks=4)
+        self.assertEqual(index.query(-1, 8), [])
+
+    def test_pairs(self):
+        for chunks, thresholds in THRESHOLDS.items():
+            index = HammingIndex(self.hashes, self.ids, chunks=chunks)
+            for threshold in thresholds:
+                with self.subTest(chunks=chunks, threshold=threshold):
+                    first, second, distances = index.pairs(threshold)
+                    pairs = sorted(
+                        (min(a, b), max(a, b), distance)
+                        for a, b, distance in zip(first.tolist(), second.tolist(), distances.tolist())
+                    )
+                    self.assertEqual(pairs, brute_force_pairs(self.hashes, self.ids, threshold))
+
+    def test_pairs_in_blocks(self):
+        # Identical hashes put every candidate pair in the same range of a part.
+        hashes = [self.hashes[0]] * 50 + self.hashes[:50]
+        index = HammingIndex(hashes)
+        expected = index.pairs(6)
+        with mock.patch("wagtailimagecaptions.perceptual.PAIR_BLOCK_SIZE", 7):
+            result = index.pairs(6)
+        for a, b in zip(result, expected):
+            self.assertEqual(a.tolist(), b.tolist())
+
+    def test_extreme_values(self):
+        hashes = [-(1 << 63), (1 << 63) - 1, -1, 0]
+        index = HammingIndex(hashes)
+        self.assertEqual(index.query(-1, 0), [(2, 0)])
+        # Unsigned values are accepted too.
+        self.assertEqual(index.query((1 << 64) - 1, 1), [(2, 0), (1, 1)])
+        self.assertEqual(sorted(index.query(0, 1)), [(0, 1), (3, 0)])
+
+    def test_from_rows(self):
+        rows = list(zip(self.ids, self.hashes))
+        index = HammingIndex.from_rows(iter(rows))
+        self.assertEqual(len(index), len(rows))
+        self.assertEqual(index.query(self.hashes[5], 0)[0], (self.ids[5], 0))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            HammingIndex(self.hashes, chunks=5)
+        with self.assertRaises(ValueError):
+            HammingIndex(self.hashes, self.ids[:-1])
+
+
+class HammingDistanceTestCase(SimpleTestCase):
+    def test_signed_values(self):
+        self.assertEqual(hamming_distance(0, -1), HASH_BITS)
+        self.assertEqual(hamming_distance(-1, to_signed((1 << HASH_BITS) - 2)), 1)
+
+    def test_group_duplicates(self):
+        self.assertEqual(group_duplicates([1, 5, 3, 8], [2, 1, 4, 9]), [[1, 2, 5], [3, 4], [8, 9]])
+        self.assertEqual(group_duplicates([], []), [])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class PerceptualHashTestCase(SimpleTestCase):
+    def image(self, blur: float = 0) -> io.BytesIO:
+        return io.BytesIO(gradient_jpeg(blur))
+
+    def test_near_duplicates(self):
+        for algorithm in ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                value = perceptual_hash(self.image(), algorithm)
+                self.assertTrue(-(1 << 63) <= value < 1 << 63)
+                self.assertLessEqual(hamming_distance(value, perceptual_hash(self.image(blur=1), algorithm)), 8)
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            perceptual_hash(self.image(), "md5")
+
+
+def thread_pool(max_workers, initializer):
+    # Threads see the test database, unlike worker processes.
+    return ThreadPoolExecutor(max_workers=2)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class SetPerceptualHashTestCase(ImageTestCase):
+    def test_disabled(self):
+        image = create_image(gradient_jpeg())
+        self.assertEqual((image.perceptual_hash, image.perceptual_hash_algorithm), (None, ""))
+
+    @override_settings(WAGTIALIMAGECAPTIONS_PERCEPTUAL_HASH="phash")
+    def test_upload(self):
+        image = create_image(gradient_jpeg())
+        self.assertEqual(image.perceptual_hash, perceptual_hash(io.BytesIO(gradient_jpeg()), "phash"))
+        self.assertEqual(image.perceptual_hash_algorithm, "phash")
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+@mock.patch("wagtailimagecaptions.management.commands.find_duplicates.ProcessPoolExecutor", thread_pool)
+class FindDuplicatesTestCase(ImageTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.images = [
+            create_image(gradient_jpeg(), name="original.jpg"),
+            create_image(gradient_jpeg(blur=1), name="blurred.jpg"),
+            create_image(gradient_jpeg(linear=True), name="other.jpg"),
+        ]
+
+    def find_duplicates(self, *args) -> tuple:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("find_duplicates", *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_compute_missing(self):
+        stdout, stderr = self.find_duplicates("--compute-missing", "--json")
+        self.assertEqual(json.loads(stdout), [[self.images[0].pk, self.images[1].pk]])
+        self.assertIn("Hashed 3 images with dhash (0 failed).", stderr)
+        self.assertFalse(get_image_model().objects.filter(perceptual_hash__isnull=True).exists())
+
+    def test_without_hashes(self):
+        with self.assertRaisesMessage(CommandError, "run with --compute-missing"):
+            self.find_duplicates()
+
+    def test_other_algorithm(self):
+        self.find_duplicates("--compute-missing", "--algorithm", "ahash")
+
+        stderr = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command("find_duplicates", stdout=io.StringIO(), stderr=stderr)
+        self.assertIn("Left out 3 images hashed with another algorithm than dhash", stderr.getvalue())
+
+        stdout, stderr = self.find_duplicates("--recompute")
+        self.assertIn("Found 1 groups of near-duplicates (2 images) among 3 images.", stdout)
@@ -0,0 +1,87 @@
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import call_command
+from wagtail.images import get_image_model
+
+from .fixtures import make_jpeg
+from .utils import ImageTransactionTestCase, create_image
+
+
+def thread_pool(max_workers, initializer):
+    # Threads see the test database, unlike worker processes.
+    return ThreadPoolExecutor(max_workers=2)
+
+
+@mock.patch("wagtailimagecaptions.management.commands.reextract_metadata.ProcessPoolExecutor", thread_pool)
+class ReextractMetadataTestCase(ImageTransactionTestCase):
+    def reextract(self, *args) -> str:
+        stdout = io.StringIO()
+        call_command("reextract_metadata", *args, stdout=stdout, stderr=io.StringIO())
+        return stdout.getvalue()
+
+    def test_unchanged(self):
+        create_image()
+        self.assertIn("Updated 0 of 1 images.", self.reextract())
+
+    def test_editorial_fields_kept(self):
+        image = create_image()
+        get_image_model().objects.filter(pk=image.pk).update(
+            title="Editor title", credit="", camera_make="", exif_data=None, geohash=""
+        )
+
+        self.assertIn("Updated 1 of 1 images.", self.reextract())
+        image.refresh_from_db()
+        self.assertEqual(image.title, "Editor title")
+        # Editorial fields are kept, even if blank.
+        self.assertEqual(image.credit, "")
+        self.assertEqual(image.camera_make, "Fujifilm")
+        self.assertEqual(image.exif_data["Model"], "X100V")
+        self.assertTrue(image.geohash.startswith("dqcj"))
+
+    def test_overwrite_editorial(self):
+        image = create_image()
+        get_image_model().objects.filter(pk=image.pk).update(title="Editor title", credit="")
+
+        self.reextract("--overwrite-editorial")
+        image.refresh_from_db()
+        self.assertEqual((image.title, image.credit), ("A synthetic headline", "Test Wire"))
+
+    def test_only_missing(self):
+        image = create_image()
+        other = create_image(make_jpeg(color=(0, 0, 0)), name="other.jpg")
+        get_image_model().objects.filter(pk__in=[image.pk, other.pk]).update(camera_make="")
+        get_image_model().objects.filter(pk=other.pk).update(exif_data=None)
+
+        self.assertIn("Updated 1 of 1 images.", self.reextract("--only-missing"))
+        image.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((image.camera_make, other.camera_make), ("", "Fujifilm"))
+
+    def test_checkpoint(self):
+        image = create_image()
+        other = create_image(make_jpeg(color=(0, 0, 0)), name="other.jpg")
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_file = os.path.join(directory, "checkpoint")
+            self.assertIn(
+                "Updated 0 of 2 images.", self.reextract("--chunk-size", "1", "--checkpoint-file", checkpoint_file)
+            )
+            with open(checkpoint_file) as f:
+                self.assertEqual(f.read(), str(other.pk))
+
+            with open(checkpoint_file, "w") as f:
+                f.write(str(image.pk))
+            output = self.reextract("--checkpoint-file", checkpoint_file)
+        self.assertIn(f"Resuming after image {image.pk}.", output)
+        self.assertIn("Updated 0 of 1 images.", output)
+
+    def test_unreadable(self):
+        image = create_image()
+        image.file.storage.delete(image.file.name)
+
+        stderr = io.StringIO()
+        call_command("reextract_metadata", stdout=io.StringIO(), stderr=stderr)
+        self.assertIn(f"Image {image.pk} ({image.file.name}): FileNotFoundError", stderr.getvalue())
@@ -0,0 +1,109 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+
+from wagtailimagecaptions import renditions
+from wagtailimagecaptions.renditions import find_missing_renditions, generate_renditions, get_rendition_pool
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, ImageTransactionTestCase, create_image
+
+SPECS = ["fill-32x24", "width-16"]
+
+
+class RenditionsTestCase(ImageTestCase):
+    def test_find_missing(self):
+        image = create_image()
+        other = create_image(make_jpeg(color=(0, 0, 0)), name="other.jpg")
+        image.get_rendition("fill-32x24")
+
+        with self.assertNumQueries(1):
+            missing = find_missing_renditions([image, other], SPECS)
+        self.assertEqual(missing, {image.pk: ["width-16"], other.pk: SPECS})
+
+        other.get_renditions(*SPECS)
+        self.assertNotIn(other.pk, find_missing_renditions([image, other], SPECS))
+
+    def test_generate(self):
+        image = create_image()
+        image.get_rendition("width-16")
+        self.assertEqual(generate_renditions(image.pk, SPECS), (1, ""))
+        self.assertEqual(generate_renditions(image.pk, SPECS), (0, ""))
+        self.assertEqual(image.renditions.count(), 2)
+
+    def test_generate_error(self):
+        count, error = generate_renditions(0, SPECS)
+        self.assertEqual(count, 0)
+        self.assertTrue(error.startswith("DoesNotExist"))
+
+    def test_default_in_process(self):
+        self.assertIsNone(get_rendition_pool())
+
+
+@override_settings(WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS=SPECS)
+class PrewarmTestCase(ImageTestCase):
+    def test_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = create_image()
+            self.assertEqual(image.renditions.count(), 0)
+
+        self.assertEqual(sorted(image.renditions.values_list("filter_spec", flat=True)), sorted(SPECS))
+
+    def test_only_new_images(self):
+        image = create_image()
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.save()
+        self.assertEqual(callbacks, [])
+
+    @override_settings(WAGTIALIMAGECAPTIONS_PREWARM_RENDITIONS=[])
+    def test_disabled(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_image()
+        self.assertEqual(callbacks, [])
+
+    @override_settings(WAGTIALIMAGECAPTIONS_RENDITION_WORKERS=2)
+    def test_pool(self):
+        pool = mock.Mock()
+        with mock.patch.object(renditions, "get_rendition_pool", return_value=pool):
+            with self.captureOnCommitCallbacks(execute=True):
+                image = create_image()
+
+        pool.submit.assert_called_once_with(generate_renditions, image.pk, SPECS)
+        self.assertEqual(image.renditions.count(), 0)
+
+    @override_settings(WAGTIALIMAGECAPTIONS_RENDITION_WORKERS=2)
+    def test_broken_pool(self):
+        pool = get_rendition_pool()
+        with mock.patch.object(pool, "submit", side_effect=BrokenProcessPool("A worker died.")):
+            with self.assertLogs("wagtailimagecaptions.renditions", "WARNING"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    create_image()
+
+        # The next image gets a new pool.
+        self.assertIsNot(get_rendition_pool(), pool)
+        get_rendition_pool().shutdown()
+
+
+class WarmRenditionsTestCase(ImageTransactionTestCase):
+    def test_command(self):
+        image = create_image()
+        other = create_image(make_jpeg(color=(0, 0, 0)), name="other.jpg")
+        image.get_rendition("width-16")
+
+        stdout = io.StringIO()
+        # Threads see the test database, unlike worker processes.
+        executor = lambda max_workers, initializer: ThreadPoolExecutor(max_workers=1)  # noqa: E731
+        with mock.patch("wagtailimagecaptions.management.commands.warm_renditions.ProcessPoolExecutor", executor):
+            call_command("warm_renditions", "--spec", "fill-32x24", "--spec", "width-16", stdout=stdout)
+
+        self.assertIn("Generated 3 renditions of 2 images, 1 already existed, 0 images failed.", stdout.getvalue())
+        self.assertEqual(image.renditions.count(), 2)
+        self.assertEqual(other.renditions.count(), 2)
+
+    def test_invalid_spec(self):
+        with self.assertRaises(CommandError):
+            call_command("warm_renditions", "--spec", "nonsense-1")
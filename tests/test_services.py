@@ -0,0 +1,132 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import override_settings
+from wagtail.images import get_image_model
+
+from wagtailimagecaptions import services
+from wagtailimagecaptions.models import MetadataExtractionTask
+from wagtailimagecaptions.services import imagefile_to_model, imagefiles_to_models
+
+from .fixtures import make_jpeg
+from .utils import ImageTestCase, ImageTransactionTestCase, create_image, image_file
+
+
+class ImageFilesToModelsTestCase(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        # Keeps track of the images built, to check what became of their files.
+        self.built = []
+        build_image = services.build_image
+
+        def track(*args, **kwargs):
+            self.built.append(build_image(*args, **kwargs))
+            return self.built[-1]
+
+        patcher = mock.patch.object(services, "build_image", side_effect=track)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create(self):
+        image = imagefile_to_model(image_file(name="new.jpg"))
+        self.assertIsNotNone(image.pk)
+        self.assertEqual(image.title, "A synthetic headline")
+        self.assertEqual(image.camera_model, "X100V")
+        self.assertTrue(image.file.storage.exists(image.file.name))
+
+    def test_order_and_duplicates(self):
+        other = make_jpeg(color=(0, 0, 0))
+        images = imagefiles_to_models([image_file(), image_file(other), image_file()])
+        self.assertIs(images[0], images[2])
+        self.assertNotEqual(images[0].pk, images[1].pk)
+        self.assertEqual(get_image_model().objects.count(), 2)
+        self.assertEqual(len(self.built), 2)
+
+    def test_existing(self):
+        existing = create_image()
+        with self.assertNumQueries(1):
+            (image,) = imagefiles_to_models([image_file(name="again.jpg")])
+        self.assertEqual(image.pk, existing.pk)
+        self.assertEqual(self.built, [])
+
+    def test_files_closed(self):
+        files = [image_file(), image_file(make_jpeg(color=(0, 0, 0)))]
+        imagefiles_to_models(files)
+        self.assertTrue(all(f.closed for f in files))
+
+    def test_created_concurrently(self):
+        lock_file_hashes = services._lock_file_hashes
+        stored = []
+
+        def create_concurrently(file_hashes):
+            # The file is stored before the file hashes are locked.
+            stored.append(self.built[0].file.name)
+            self.assertTrue(self.built[0].file.storage.exists(stored[0]))
+            create_image(name="concurrent.jpg")
+            lock_file_hashes(file_hashes)
+
+        with mock.patch.object(services, "_lock_file_hashes", side_effect=create_concurrently):
+            (image,) = imagefiles_to_models([image_file(name="import.jpg")])
+
+        self.assertEqual(image.file.name.rsplit("/", 1)[-1], "concurrent.jpg")
+        self.assertEqual(get_image_model().objects.count(), 1)
+        # The file stored for the image which wasn't created is deleted again.
+        self.assertFalse(image.file.storage.exists(stored[0]))
+        self.assertTrue(image.file.storage.exists(image.file.name))
+
+    def test_database_locked(self):
+        ImageModel = get_image_model()
+        save = ImageModel.save
+        failed = []
+
+        def save_then_fail_once(image, *args, **kwargs):
+            save(image, *args, **kwargs)
+            if not failed:
+                failed.append(image.pk)
+                raise OperationalError("database is locked")
+
+        files = [image_file(), image_file(make_jpeg(color=(0, 0, 0)))]
+        with mock.patch.object(ImageModel, "save", autospec=True, side_effect=save_then_fail_once):
+            images = imagefiles_to_models(files)
+
+        # The image saved before the error is saved again.
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(ImageModel.objects.count(), 2)
+        self.assertEqual({image.pk for image in images}, set(ImageModel.objects.values_list("pk", flat=True)))
+        self.assertTrue(all(image.file.storage.exists(image.file.name) for image in images))
+
+    def test_other_errors_raised(self):
+        with mock.patch.object(services, "_lock_file_hashes", side_effect=OperationalError("no such table")):
+            with self.assertRaises(OperationalError):
+                imagefiles_to_models([image_file()])
+
+        (built,) = self.built
+        self.assertFalse(built.file)
+        self.assertFalse(get_image_model().objects.exists())
+
+    @override_settings(WAGTIALIMAGECAPTIONS_METADATA_BACKEND="wagtailimagecaptions.deferred.DatabaseQueueBackend")
+    def test_deferred(self):
+        (image,) = imagefiles_to_models([image_file(name="deferred.jpg")])
+        self.assertTrue(image.metadata_pending)
+        self.assertEqual(image.title, "deferred.jpg")
+        self.assertTrue(MetadataExtractionTask.objects.filter(image_id=image.pk).exists())
+
+
+class ImageFilesToModelsLockingTestCase(ImageTransactionTestCase):
+    def test_files_parsed_and_stored_before_locking(self):
+        extract_metadata = services.extract_metadata
+        in_transaction = []
+
+        def extract(*args, **kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return extract_metadata(*args, **kwargs)
+
+        def lock_file_hashes(file_hashes):
+            in_transaction.append(connection.in_atomic_block)
+
+        with mock.patch.object(services, "extract_metadata", side_effect=extract):
+            with mock.patch.object(services, "_lock_file_hashes", side_effect=lock_file_hashes):
+                (image,) = imagefiles_to_models([image_file()])
+
+        self.assertEqual(in_transaction, [False, True])
+        self.assertEqual(image.camera_make, "Fujifilm")
@@ -0,0 +1,75 @@
+import hashlib
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.utils import timezone
+
+from wagtailimagecaptions import uploads
+from wagtailimagecaptions.uploads import MAX_PATH_LENGTH, get_upload_settings
+
+from .utils import ImageTestCase, create_image
+
+
+def shard_by_collection(instance, filename):
+    return f"collection-{instance.collection_id}"
+
+
+class UploadShardingTestCase(ImageTestCase):
+    def test_date(self):
+        with override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="date"):
+            image = create_image(name="photo.jpg")
+        self.assertEqual(image.file.name, f"original_images/{timezone.now():%Y/%m}/photo.jpg")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="date", WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH="%Y/%H")
+    def test_date_with_time(self):
+        now = timezone.now()
+        with mock.patch.object(timezone, "now", return_value=now.replace(hour=3)):
+            first = create_image(name="photo.jpg")
+        with mock.patch.object(timezone, "now", return_value=now.replace(hour=4)):
+            second = create_image(name="photo.jpg")
+        self.assertEqual(first.file.name, f"original_images/{now:%Y}/03/photo.jpg")
+        self.assertEqual(second.file.name, f"original_images/{now:%Y}/04/photo.jpg")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING=None, WAGTIALIMAGECAPTIONS_UPLOAD_TO_DATE_PATH=None)
+    def test_unsharded(self):
+        self.assertEqual(create_image(name="photo.jpg").file.name, "original_images/photo.jpg")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="hash", WAGTIALIMAGECAPTIONS_UPLOAD_SHARD_DEPTH=3)
+    def test_hash(self):
+        digest = hashlib.md5(b"photo.jpg").hexdigest()
+        image = create_image(name="photo.jpg")
+        self.assertEqual(image.file.name, f"original_images/{digest[:2]}/{digest[2:4]}/{digest[4:6]}/photo.jpg")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="id", WAGTIALIMAGECAPTIONS_UPLOAD_ID_BUCKET_SIZE=10)
+    def test_id(self):
+        image = create_image(name="photo.jpg")
+        # The original has no ID yet when it's stored.
+        digest = hashlib.md5(b"photo.jpg").hexdigest()
+        self.assertEqual(image.file.name, f"original_images/{digest[:2]}/{digest[2:4]}/photo.jpg")
+
+        rendition = image.get_rendition("width-16")
+        self.assertTrue(rendition.file.name.startswith(f"images/{image.pk // 10}/photo."))
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING=f"{__name__}.shard_by_collection")
+    def test_import_path(self):
+        image = create_image(name="photo.jpg")
+        self.assertEqual(image.file.name, f"original_images/collection-{image.collection_id}/photo.jpg")
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="tests.test_uploads.missing")
+    def test_unknown(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_upload_settings()
+
+    @override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="hash")
+    def test_file_name(self):
+        image = create_image(name=f"{'ü' * 120}.jpg")
+        self.assertLess(len(image.file.name), MAX_PATH_LENGTH)
+        self.assertTrue(image.file.name.endswith("u.jpg"))
+        self.assertTrue(image.file.name.isascii())
+
+    def test_settings_cached(self):
+        with override_settings(WAGTIALIMAGECAPTIONS_UPLOAD_SHARDING="hash"):
+            self.assertIs(get_upload_settings().shard, uploads.shard_by_hash)
+            self.assertIs(get_upload_settings(), get_upload_settings())
+        self.assertIsNot(get_upload_settings().shard, uploads.shard_by_hash)
@@ -0,0 +1,58 @@
+import hashlib
+import io
+import shutil
+import tempfile
+
+from django.core.files.images import ImageFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from wagtail.images import get_image_model
+
+from .fixtures import make_jpeg
+
+
+class TemporaryMediaMixin:
+    """
+    Stores the files saved by the tests in a temporary MEDIA_ROOT, removed afterwards. The
+    renditions cached by Wagtail are cleared before each test, as image IDs are reused.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        get_image_model().get_rendition_model().cache_backend.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class ImageTestCase(TemporaryMediaMixin, TestCase):
+    pass
+
+
+class ImageTransactionTestCase(TemporaryMediaMixin, TransactionTestCase):
+    # Flushing the tables would remove the root collection created by Wagtail's migrations.
+    serialized_rollback = True
+
+
+def image_file(data: bytes = None, name: str = "photo.jpg") -> ImageFile:
+    return ImageFile(io.BytesIO(make_jpeg() if data is None else data), name=name)
+
+
+def create_image(data: bytes = None, name: str = "photo.jpg", **kwargs):
+    """
+    Saves an image of `data` (by default a JPEG with EXIF, GPS and IPTC data), as a plain
+    `create()` does, i.e. through the `pre_save` signal. The file hash is set, as Wagtail's
+    upload views do.
+    """
+    data = make_jpeg() if data is None else data
+    kwargs.setdefault("file_hash", hashlib.sha1(data).hexdigest())
+    return get_image_model().objects.create(title=name, file=image_file(data, name), **kwargs)